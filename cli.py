@@ -0,0 +1,120 @@
+import os
+import sys
+import argparse
+
+# --- COMANDOS SIN INTERFAZ ---
+# Uso: python cli.py lecturas ruta.csv [--tecnico NOMBRE] [--validar]
+#      python cli.py alarmas [--completo]
+#      python cli.py escrituras [--vaciar] [--reintentar]
+#      python cli.py exportar registro.xlsx
+#      python cli.py bench [--escalas 1k,10k] [--lecturas N] [--fotos] [--imports] [--paginas monitoreo,almacen] [--salida base.csv]
+# El backend se elige igual que en la app (secrets.toml o CMMS_BACKEND / CMMS_SQLITE_PATH / CMMS_LECTURAS_PATH).
+
+
+def cmd_lecturas(args):
+    from utils.ingesta_lecturas import IngestaLecturas
+    ing = IngestaLecturas(tecnico=args.tecnico).analizar(args.archivo)
+    res = ing.resumen()
+    print(f"Leídas: {res['leidas']} | válidas: {res['validas']} | errores: {res['errores']} | "
+          f"{res['segundos']} s ({res['filas_por_seg']} filas/s)")
+    if res["errores"]:
+        ruta = args.errores or os.path.splitext(args.archivo)[0] + "_errores.csv"
+        ing.df_errores().to_csv(ruta, index=False)
+        print(f"Reporte de errores: {ruta}")
+    if args.validar: return 0
+    if res["validas"]:
+        ing.confirmar()
+        res = ing.resumen()
+        print(f"Guardadas: {res['guardadas']} ({res['escritura_filas_por_seg']} filas/s)")
+        cmd_alarmas(argparse.Namespace(completo=False))
+    return 0
+
+
+def cmd_alarmas(args):
+    from utils.alarmas import evaluar_alarmas
+    res = evaluar_alarmas(completo=args.completo)
+    print(f"Alarmas: {res['lecturas']} lecturas evaluadas, {res['eventos']} cambios de nivel, "
+          f"{res['activas']} activas, {res['equipos_actualizados']} equipos actualizados ({res['segundos']} s)")
+    return 0
+
+
+def cmd_escrituras(args):
+    from utils.db_con import get_cola
+    cola = get_cola()
+    if cola is None:
+        print("Write-behind desactivado (storage.write_behind / CMMS_WRITE_BEHIND).")
+        return 0
+    if args.reintentar: print(f"Reencoladas: {cola.reintentar_fallidas()}")
+    if args.vaciar and not cola.vaciar(args.timeout): print("Tiempo agotado: quedan escrituras pendientes (siguen en disco).")
+    est = cola.estado()
+    print(" | ".join(f"{k}: {v}" for k, v in est.items()))
+    fallidas = cola.fallidas()
+    if not fallidas.empty: print(fallidas.to_string(index=False))
+    return 1 if est["profundidad"] or not fallidas.empty else 0
+
+
+def cmd_exportar(args):
+    from utils.exportacion import exportar_activos
+    res = exportar_activos(args.archivo)
+    print(f"Exportado {args.archivo}: {res['activos']} filas de activos ({res['campos']} campos técnicos), "
+          f"{res['almacen']} repuestos, {res['lecturas']} series de lecturas ({res['segundos']} s)")
+    return 0
+
+
+def cmd_bench(args):
+    if args.imports:
+        from utils.benchmark import medir_imports
+        print(medir_imports().to_string(index=False))
+        return 0
+    from utils.benchmark import correr
+    res = correr(args.escalas.split(","), lecturas=args.lecturas, paginas=args.paginas.split(",") if args.paginas else None,
+                 latencia=args.latencia, memoria=not args.sin_memoria, fotos=args.fotos)
+    print(res.to_string(index=False))
+    if args.salida:
+        res.to_csv(args.salida, index=False)
+        print(f"Resultados: {args.salida}")
+    return 1 if res["errores"].sum() else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="cli.py", description="Comandos del CMMS sin interfaz.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("lecturas", help="Importa lecturas de un CSV de colector")
+    p.add_argument("archivo")
+    p.add_argument("--tecnico", default="", help="Técnico por defecto si el CSV no lo trae")
+    p.add_argument("--errores", help="Ruta del reporte de errores (por defecto <archivo>_errores.csv)")
+    p.add_argument("--validar", action="store_true", help="Solo validar, sin guardar")
+    p.set_defaults(func=cmd_lecturas)
+
+    p = sub.add_parser("alarmas", help="Evalúa las lecturas nuevas contra los límites")
+    p.add_argument("--completo", action="store_true", help="Reevaluar toda la historia (tras cambiar límites)")
+    p.set_defaults(func=cmd_alarmas)
+
+    p = sub.add_parser("escrituras", help="Estado de la cola de escrituras diferidas")
+    p.add_argument("--vaciar", action="store_true", help="Subir lo pendiente y esperar")
+    p.add_argument("--timeout", type=float, default=300, help="Segundos máximos de espera con --vaciar")
+    p.add_argument("--reintentar", action="store_true", help="Volver a encolar las escrituras fallidas")
+    p.set_defaults(func=cmd_escrituras)
+
+    p = sub.add_parser("exportar", help="Exporta el registro de activos, almacén y lecturas a Excel")
+    p.add_argument("archivo", nargs="?", default="registro_activos.xlsx")
+    p.set_defaults(func=cmd_exportar)
+
+    p = sub.add_parser("bench", help="Mide las páginas sobre plantas sintéticas (sin Google Sheets)")
+    p.add_argument("--escalas", default="1k", help="Equipos por escenario: 1k, 10k, 100k o un número (separados por coma)")
+    p.add_argument("--lecturas", type=int, default=0, help="Lecturas sintéticas en el store (hasta 10M)")
+    p.add_argument("--paginas", help="gestion_activos, monitoreo, almacen, configurador (por defecto todas)")
+    p.add_argument("--latencia", type=float, default=0.0, help="Segundos por llamada simulada a Sheets")
+    p.add_argument("--fotos", action="store_true", help="Arranque en frío desde la foto local de las hojas")
+    p.add_argument("--sin-memoria", action="store_true", help="No medir el pico de memoria (más rápido)")
+    p.add_argument("--imports", action="store_true", help="Solo medir el import de cada página en un proceso nuevo (ms y RSS)")
+    p.add_argument("--salida", help="CSV con los resultados (línea base para comparar)")
+    p.set_defaults(func=cmd_bench)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,32 @@
 import streamlit as st
-from modules import gestion_activos, almacen, monitoreo, configurador
+from utils.paginas import PAGINAS, cargar
+from utils.perfil import iniciar_traza, terminar_traza
+from utils.db_con import estado_escrituras, origen_datos
 
 st.set_page_config(page_title="CMMS SAP-Style", layout="wide", page_icon="🏭")
 st.sidebar.title("CMMS Rendering")
 
-menu = ["Gestión de Activos", "Maestro de Clases", "Almacén", "Monitoreo"]
-opcion = st.sidebar.radio("Ir a:", menu)
+# Las páginas se importan al abrirlas por primera vez (utils/paginas.py)
+opcion = st.sidebar.radio("Ir a:", list(PAGINAS))
+ver_perfil = st.sidebar.toggle("⏱️ Perfil del rerun", key="ver_perfil")
 
-if opcion == "Gestión de Activos":
-    gestion_activos.render_gestion_activos()
-elif opcion == "Maestro de Clases":
-    configurador.render_configurador()
-elif opcion == "Almacén":
-    almacen.render_almacen_view()
-elif opcion == "Monitoreo":
-    monitoreo.render_monitoreo_view()
+# Una traza por rerun: cada llamada a db_con y cada sección de la página queda medida
+traza = iniciar_traza(opcion)
+try:
+    cargar(opcion)()
+finally:
+    terminar_traza(traza)
+
+# Escrituras diferidas (write-behind): lo que falta subir a la planilla
+cola = estado_escrituras()
+if cola is not None:
+    if cola["profundidad"]: st.sidebar.caption(f"⏳ {cola['profundidad']} escrituras pendientes" + (f" (reintento en {cola['espera_s']} s)" if cola["espera_s"] else ""))
+    if cola["fallidas"]: st.sidebar.error(f"{cola['fallidas']} escrituras fallaron: {cola['ultimo_error']}")
+
+# Backend caído: las hojas salen de la foto local
+sin_red = {h: edad for h, (origen, edad) in origen_datos().items() if origen == "sin_red"}
+if sin_red: st.sidebar.warning(f"📴 Sin conexión con la planilla: datos guardados hace {max(sin_red.values()) / 60:.0f} min ({', '.join(sorted(sin_red))}).")
+
+if ver_perfil:
+    from modules.perfil import render_panel_perfil
+    render_panel_perfil(traza)
@@ -0,0 +1,88 @@
+import streamlit as st
+import pandas as pd
+from utils.db_con import get_data, append_rows, update_rows, next_id
+from utils.jerarquia import indice_activos
+from utils.alarmas import evaluar_alarmas, alarmas_activas, historial_alarmas, LIMITES_DEFECTO, CLASE_ISO
+from utils.ingesta_lecturas import PARAMETROS
+from utils.perfil import span
+
+COLS_ACTIVAS = ["nivel", "planta", "area", "equipo_tag", "equipo", "componente", "parametro", "valor", "alerta", "peligro", "desde", "ts"]
+COLS_HISTORIAL = ["ts", "equipo_tag", "componente", "parametro", "nivel_anterior", "nivel", "valor"]
+
+
+def _color_nivel(v):
+    return {"PELIGRO": "background-color: #8B0000; color: white", "ALERTA": "background-color: #B8860B; color: white"}.get(v, "")
+
+
+def render_limites():
+    st.caption(f"Por defecto (vibración según ISO 10816 clase {CLASE_ISO}): " +
+               " | ".join(f"{p}: alerta {a}, peligro {d}" for p, (a, d) in LIMITES_DEFECTO.items()) +
+               ". Un límite por componente tiene prioridad sobre el de la familia.")
+    df_lim = get_data("limites_alarma")
+    if not df_lim.empty:
+        st.dataframe(df_lim, use_container_width=True, hide_index=True)
+
+    idx = indice_activos()
+    df_fam = get_data("familias_config")
+    familias = sorted(set(df_fam["nombre_familia"].str.upper())) if not df_fam.empty else []
+
+    with st.form("form_limite"):
+        c1, c2 = st.columns(2)
+        ambito = c1.radio("Aplica a", ["Familia", "Componente"], horizontal=True)
+        param = c2.selectbox("Parámetro", list(PARAMETROS))
+        familia = st.selectbox("Familia", familias)
+        comp_txt = st.text_input("ID de componente (si aplica a un componente)")
+        c3, c4 = st.columns(2)
+        alerta = c3.number_input("Alerta", min_value=0.0, step=0.1)
+        peligro = c4.number_input("Peligro", min_value=0.0, step=0.1)
+
+        if st.form_submit_button("Guardar límite"):
+            comp_id = pd.to_numeric(comp_txt, errors="coerce") if ambito == "Componente" else None
+            if ambito == "Componente" and (pd.isna(comp_id) or idx.df_comp["id"].eq(comp_id).sum() == 0):
+                st.error("ID de componente no existe.")
+            elif peligro < alerta:
+                st.error("El límite de peligro debe ser mayor o igual al de alerta.")
+            else:
+                fila = {"familia": "" if ambito == "Componente" else familia, "componente_id": int(comp_id) if ambito == "Componente" else None,
+                        "parametro": param, "alerta": alerta, "peligro": peligro}
+                # Si ya hay un límite para el mismo ámbito/parámetro se actualiza
+                previo = df_lim[(df_lim["parametro"] == param) & (
+                    (df_lim["componente_id"] == fila["componente_id"]) if ambito == "Componente"
+                    else (df_lim["componente_id"].isna() & (df_lim["familia"] == familia)))] if not df_lim.empty else df_lim
+                if not previo.empty:
+                    update_rows(pd.DataFrame([{"id": previo["id"].iloc[-1], **fila}]), "limites_alarma")
+                else:
+                    append_rows(pd.DataFrame([{"id": next_id("limites_alarma"), **fila}]), "limites_alarma")
+                # Límites nuevos -> se reevalúa toda la historia
+                res = evaluar_alarmas(completo=True)
+                st.success(f"Límite guardado. Reevaluadas {res['lecturas']} lecturas ({res['activas']} alarmas activas).")
+
+
+def render_alarmas_view():
+    st.header("🚨 Alarmas de Condición")
+
+    # Evaluación incremental: solo lecturas nuevas desde la última pasada
+    res = evaluar_alarmas()
+    activas = alarmas_activas()
+    n_peligro = int((activas["nivel"] == "PELIGRO").sum()) if not activas.empty else 0
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("En PELIGRO", n_peligro)
+    m2.metric("En ALERTA", len(activas) - n_peligro)
+    m3.metric("Lecturas evaluadas ahora", res["lecturas"])
+
+    t1, t2, t3 = st.tabs(["🔔 Activas", "📜 Historial", "⚙️ Límites"])
+    with t1, span("alarmas.activas"):
+        if activas.empty:
+            st.success("Sin alarmas activas.")
+        else:
+            st.dataframe(activas[COLS_ACTIVAS].style.map(_color_nivel, subset=["nivel"]), use_container_width=True, hide_index=True)
+    with t2, span("alarmas.historial"):
+        hist = historial_alarmas()
+        if hist.empty: st.info("Sin cambios de nivel registrados.")
+        else: st.dataframe(hist[COLS_HISTORIAL].style.map(_color_nivel, subset=["nivel_anterior", "nivel"]), use_container_width=True, hide_index=True)
+    with t3, span("alarmas.limites"):
+        render_limites()
+        if st.button("🔄 Reevaluar toda la historia"):
+            res = evaluar_alarmas(completo=True)
+            st.success(f"{res['lecturas']} lecturas evaluadas en {res['segundos']} s; {res['equipos_actualizados']} equipos actualizados.")
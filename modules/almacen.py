@@ -1,34 +1,39 @@
 import streamlit as st
 import pandas as pd
-from utils.db_con import get_data, save_data
+from utils.db_con import get_data, append_rows
+from utils.busqueda import indice_almacen
+from utils.inventario import registrar_movimiento, kardex, saldo, conciliar, TIPOS
+from utils.bom import indice_bom
+from utils.perfil import span
 
 def render_almacen_view():
     st.header("📦 Gestión de Almacén y Repuestos")
     
     # Pestañas internas del módulo
-    tab1, tab2 = st.tabs(["📋 Inventario", "➕ Nuevo Repuesto"])
+    tab1, tab2, tab3, tab4 = st.tabs(["📋 Inventario", "➕ Nuevo Repuesto", "🔁 Movimientos", "🧩 Dónde se usa"])
 
     # --- TAB 1: VER INVENTARIO ---
-    with tab1:
-        df_almacen = get_data("almacen")
+    with tab1, span("almacen.inventario"):
+        indice = indice_almacen()  # se reconstruye solo si la hoja cambió
         
-        if not df_almacen.empty:
-            # Buscador rápido
-            filtro = st.text_input("🔍 Buscar por SKU o Descripción", "")
-            if filtro:
-                # Filtra si el texto coincide con SKU o Descripción
-                df_almacen = df_almacen[
-                    df_almacen['descripcion'].str.contains(filtro, case=False, na=False) |
-                    df_almacen['sku'].str.contains(filtro, case=False, na=False)
-                ]
+        if len(indice):
+            # Buscador rápido (SKU, descripción, marca, ubicación; por prefijo o fragmento)
+            c1, c2 = st.columns([4, 1])
+            filtro = c1.text_input("🔍 Buscar por SKU, Descripción, Marca o Ubicación", "")
+            por_pagina = c2.selectbox("Filas por página", [25, 50, 100, 200], index=1)
+            pos = indice.buscar(filtro)
             
-            st.dataframe(df_almacen, use_container_width=True)
-            st.caption(f"Total de items en inventario: {len(df_almacen)}")
+            # Paginación: solo viaja al navegador la página visible
+            paginas = max(1, -(-len(pos) // por_pagina))
+            pagina = st.number_input("Página", min_value=1, max_value=paginas, value=1, step=1) if paginas > 1 else 1
+            inicio = (pagina - 1) * por_pagina
+            st.dataframe(indice.df.iloc[pos[inicio:inicio + por_pagina]].drop(columns=["en_kardex"], errors="ignore"), use_container_width=True, hide_index=True)
+            st.caption(f"{len(pos)} de {len(indice)} items · página {pagina} de {paginas}")
         else:
             st.info("El almacén está vacío. Agrega items en la pestaña 'Nuevo Repuesto'.")
 
     # --- TAB 2: AGREGAR REPUESTO ---
-    with tab2:
+    with tab2, span("almacen.nuevo"):
         st.subheader("Dar de alta Material")
         with st.form("form_almacen"):
             c1, c2 = st.columns(2)
@@ -36,10 +41,11 @@ def render_almacen_view():
             sku = c1.text_input("SKU / Código (Único)", placeholder="Ej: ROD-6302").strip().upper()
             desc = c2.text_input("Descripción", placeholder="Ej: Rodamiento Rígido")
             
-            c3, c4, c5 = st.columns(3)
+            c3, c4, c5, c6 = st.columns(4)
             marca = c3.text_input("Marca")
             stock = c4.number_input("Stock Inicial", min_value=0, step=1)
-            unidad = c5.selectbox("Unidad", ["UND", "JGO", "LT", "MT", "KG"])
+            costo = c5.number_input("Costo Unitario", min_value=0.0, step=0.1)
+            unidad = c6.selectbox("Unidad", ["UND", "JGO", "LT", "MT", "KG"])
             
             ubicacion = st.text_input("Ubicación Física", placeholder="Ej: Pasillo A-2")
             
@@ -57,19 +63,78 @@ def render_almacen_view():
                     if not df_actual.empty and sku in df_actual['sku'].values:
                         st.error(f"⚠️ El SKU '{sku}' ya existe en el sistema.")
                     else:
-                        # 3. Crear el nuevo registro
+                        # 3. Crear el nuevo registro (el saldo lo llevan los movimientos)
                         new_item = pd.DataFrame([{
                             "sku": sku, 
                             "descripcion": desc, 
                             "marca": marca,
-                            "stock_actual": stock, 
+                            "stock_actual": 0, 
                             "unidad": unidad,
                             "ubicacion_fisica": ubicacion,
-                            "precio_promedio": 0.0 # Campo reservado para futuro
+                            "precio_promedio": 0.0
                         }])
                         
-                        # 4. Guardar
-                        df_final = pd.concat([df_actual, new_item], ignore_index=True)
-                        save_data(df_final, "almacen")
+                        # 4. Guardar (solo la fila nueva) + stock inicial como primera entrada del kardex
+                        append_rows(new_item, "almacen")
+                        if stock > 0: registrar_movimiento(sku, "ENTRADA", stock, costo, responsable="SALDO INICIAL")
                         st.success(f"✅ Repuesto {sku} registrado correctamente.")
-                        st.cache_data.clear() # Limpia memoria para ver el cambio inmediato
+
+    # --- TAB 3: MOVIMIENTOS (KARDEX) ---
+    with tab3, span("almacen.movimientos"):
+        with st.form("form_movimiento"):
+            c1, c2, c3, c4 = st.columns(4)
+            m_sku = c1.text_input("SKU").strip().upper()
+            m_tipo = c2.selectbox("Tipo", list(TIPOS))
+            m_cant = c3.number_input("Cantidad (ajustes: negativa para bajar)", step=1.0)
+            m_costo = c4.number_input("Costo Unitario (entradas)", min_value=0.0, step=0.1)
+            c5, c6, c7 = st.columns(3)
+            m_comp = c5.text_input("ID Componente (salidas)")
+            m_ot = c6.text_input("Orden de Trabajo")
+            m_resp = c7.text_input("Responsable")
+
+            if st.form_submit_button("Registrar Movimiento"):
+                try:
+                    comp_id = int(float(m_comp)) if m_comp.strip() else None
+                    mov = registrar_movimiento(m_sku, m_tipo, m_cant, m_costo if m_tipo == "ENTRADA" else None,
+                                               componente_id=comp_id, orden_trabajo=m_ot, responsable=m_resp)
+                    fila = mov.iloc[-1]
+                    st.success(f"✅ {m_tipo} registrada. Saldo {m_sku}: {fila['saldo']:g} · costo promedio {fila['costo_promedio']:.2f}")
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+
+        sku_ver = st.text_input("🔍 Kardex de SKU", "").strip().upper()
+        if sku_ver:
+            s = saldo(sku_ver)
+            if s is None:
+                st.warning("SKU no existe.")
+            else:
+                m1, m2 = st.columns(2)
+                m1.metric("Stock actual", f"{s[0]:g}")
+                m2.metric("Costo promedio", f"{s[1]:.2f}")
+                st.dataframe(kardex(sku_ver).head(200), use_container_width=True, hide_index=True)
+
+        if st.button("🧮 Conciliar saldos con el kardex"):
+            dif = conciliar()
+            if dif.empty: st.success("Saldos conciliados: sin diferencias.")
+            else:
+                st.warning(f"{len(dif)} SKUs corregidos.")
+                st.dataframe(dif, use_container_width=True, hide_index=True)
+
+    # --- TAB 4: DÓNDE SE USA / COBERTURA ---
+    with tab4, span("almacen.donde_se_usa"):
+        bom = indice_bom()
+        c1, c2 = st.columns(2)
+        sku_uso = c1.text_input("SKU (¿qué equipos lo usan?)").strip().upper()
+        tag_uso = c2.text_input("TAG de equipo (lista de repuestos)").strip().upper()
+        if sku_uso:
+            uso = bom.donde_se_usa(sku_uso)
+            st.caption(f"{len(uso)} componentes · {uso['equipo_tag'].nunique()} equipos · {uso['cantidad'].sum():g} unidades requeridas")
+            st.dataframe(uso, use_container_width=True, hide_index=True)
+        if tag_uso:
+            st.dataframe(bom.repuestos_equipo(tag_uso), use_container_width=True, hide_index=True)
+
+        st.subheader("Cobertura de repuestos (planta completa)")
+        solo_faltantes = st.toggle("Solo SKUs con faltante", value=True)
+        dem = bom.faltantes() if solo_faltantes else bom.demanda_total()
+        st.dataframe(dem.head(500), use_container_width=True, hide_index=True)
+        st.caption(f"{len(dem)} SKUs" + (" con stock menor a lo instalado." if solo_faltantes else "."))
@@ -2,7 +2,7 @@ import streamlit as st
 import pandas as pd
 import json
 from datetime import datetime
-from utils.db_con import get_data, save_data
+from utils.db_con import get_data, append_rows, next_id
 
 def render_componentes_view():
     st.header("🛠️ Gestión de Componentes (Niveles 4-5)")
@@ -55,12 +55,12 @@ def render_componentes_view():
             new_sys_name = st.text_input("Nombre Nuevo Sistema", placeholder="Ej: Sist. Hidráulico")
             if st.button("Crear Sistema"):
                 if new_sys_name:
-                    new_id_sys = 1 if df_sistemas.empty else df_sistemas['id'].max() + 1
+                    new_id_sys = next_id("sistemas")
                     new_sys_row = pd.DataFrame([{
                         "id": new_id_sys, "equipo_tag": tag_equipo, 
                         "nombre": new_sys_name, "descripcion": "Alta manual"
                     }])
-                    save_data(pd.concat([df_sistemas, new_sys_row], ignore_index=True), "sistemas")
+                    append_rows(new_sys_row, "sistemas")
                     st.success("Sistema creado. Seleccionalo de la lista.")
                     st.rerun()
     else:
@@ -104,8 +104,7 @@ def render_componentes_view():
             
             if st.form_submit_button("💾 Guardar Componente"):
                 if nombre_comp:
-                    df_comps = get_data("componentes")
-                    new_id_c = 1 if df_comps.empty else df_comps['id'].max() + 1
+                    new_id_c = next_id("componentes")
                     
                     new_comp = pd.DataFrame([{
                         "id": new_id_c,
@@ -119,5 +118,5 @@ def render_componentes_view():
                         "specs_json": json.dumps(specs)
                     }])
                     
-                    save_data(pd.concat([df_comps, new_comp], ignore_index=True), "componentes")
+                    append_rows(new_comp, "componentes")
                     st.success("✅ Componente guardado con éxito")
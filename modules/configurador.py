@@ -1,7 +1,9 @@
 import streamlit as st
 import pandas as pd
 import json
-from utils.db_con import get_data, save_data
+from utils.db_con import get_data, append_rows, update_rows, save_data, next_id, reserve_ids
+from utils.familias import CampoSpec, TIPOS_CAMPO, invalidar_registro
+from utils.perfil import span
 
 def render_configurador():
     st.header("⚙️ Maestros de Configuración (Estándares)")
@@ -12,7 +14,7 @@ def render_configurador():
     # ==========================================
     # TAB 1: MAESTRO DE SISTEMAS
     # ==========================================
-    with tab_sys:
+    with tab_sys, span("configurador.sistemas"):
         st.subheader("Catálogo de Sistemas")
         
         # Cargar datos
@@ -38,13 +40,9 @@ def render_configurador():
                     if not df_sys_conf.empty and new_sys in df_sys_conf['nombre_sistema'].values:
                         st.error("Ya existe.")
                     else:
-                        nid = 1
-                        if not df_sys_conf.empty:
-                            try: nid = int(pd.to_numeric(df_sys_conf['id']).max()) + 1
-                            except: nid = len(df_sys_conf) + 1
-                        
+                        nid = next_id("sistemas_config")
                         row = pd.DataFrame([{"id": nid, "nombre_sistema": new_sys, "descripcion": new_desc}])
-                        save_data(pd.concat([df_sys_conf, row], ignore_index=True), "sistemas_config")
+                        append_rows(row, "sistemas_config")
                         st.success(f"Sistema '{new_sys}' creado."); st.rerun()
                 else:
                     st.error("Nombre obligatorio.")
@@ -52,7 +50,7 @@ def render_configurador():
     # ==========================================
     # TAB 2: MAESTRO DE COMPONENTES (VINCULADO)
     # ==========================================
-    with tab_comp:
+    with tab_comp, span("configurador.familias"):
         # Cargar Sistemas para el filtro
         lista_sistemas = df_sys_conf["nombre_sistema"].tolist() if not df_sys_conf.empty else []
         
@@ -108,19 +106,35 @@ def render_configurador():
                     if campos:
                         for i, cp in enumerate(campos):
                             ca, cb, cc = st.columns([3, 2, 1])
-                            ca.text(f"🔹 {cp['nombre']}")
-                            cb.caption(f"Unidad: {cp.get('unidad','-')}")
+                            ca.text(f"🔹 {cp['nombre']}" + (" *" if cp.get("requerido") else ""))
+                            c_campo = CampoSpec(cp)
+                            detalle = f"Unidad: {cp.get('unidad') or '-'} · {TIPOS_CAMPO[c_campo.tipo]}"
+                            if c_campo.min is not None or c_campo.max is not None: detalle += f" [{'' if c_campo.min is None else f'{c_campo.min:g}'} … {'' if c_campo.max is None else f'{c_campo.max:g}'}]"
+                            if c_campo.opciones: detalle += f": {', '.join(c_campo.opciones)}"
+                            cb.caption(detalle)
                             if cc.button("🗑️", key=f"del_{i}"):
                                 campos.pop(i); st.rerun()
                     else: st.info("Agrega variables técnicas abajo.")
 
                     with st.form("add_var"):
-                        n1, n2 = st.columns([2,1])
+                        n1, n2, n3 = st.columns([2,1,1])
                         v_nom = n1.text_input("Nombre Variable", placeholder="Ej: Caudal Máximo")
                         v_uni = n2.text_input("Unidad", placeholder="L/min")
+                        v_tipo = n3.selectbox("Tipo", list(TIPOS_CAMPO), format_func=TIPOS_CAMPO.get, index=0)
+                        n4, n5, n6 = st.columns(3)
+                        v_min = n4.text_input("Mínimo (números)")
+                        v_max = n5.text_input("Máximo (números)")
+                        v_ops = n6.text_input("Opciones (lista, separadas por coma)")
+                        v_req = st.checkbox("Obligatorio")
                         if st.form_submit_button("Agregar Variable"):
                             if v_nom: 
-                                st.session_state["campos_temp"].append({"nombre": v_nom, "unidad": v_uni})
+                                campo = {"nombre": v_nom, "unidad": v_uni, "tipo": v_tipo}
+                                if v_tipo == "numero":
+                                    if v_min.strip(): campo["min"] = v_min.strip()
+                                    if v_max.strip(): campo["max"] = v_max.strip()
+                                if v_tipo == "opcion": campo["opciones"] = [o.strip() for o in v_ops.split(",") if o.strip()]
+                                if v_req: campo["requerido"] = True
+                                st.session_state["campos_temp"].append(campo)
                                 st.rerun()
 
                     st.divider()
@@ -130,18 +144,25 @@ def render_configurador():
                         if modo == "Crear Nueva":
                             if nombre_fam in fams_del_sistema: st.error("Ya existe.")
                             else:
-                                nid = 1
-                                if not df_fam.empty:
-                                    try: nid = int(pd.to_numeric(df_fam['id']).max()) + 1
-                                    except: nid = len(df_fam) + 1
-                                
+                                nid = next_id("familias_config")
                                 row = pd.DataFrame([{
                                     "id": nid, "nombre_familia": nombre_fam, 
                                     "sistema_asociado": sistema_padre, "config_json": js_final
                                 }])
-                                save_data(pd.concat([df_fam, row], ignore_index=True), "familias_config")
+                                append_rows(row, "familias_config")
+                                invalidar_registro()
                                 st.success("Guardado!"); st.rerun()
-                        else:
+                        elif pd.isna(df_fam.at[idx_fam, "id"]):
+                            # Filas antiguas sin id: el upsert no las encontraría y duplicaría la familia.
+                            # Se numeran todas las que falten y la hoja se reescribe una vez.
+                            sin_id = df_fam["id"].isna()
+                            df_fam.loc[sin_id, "id"] = list(reserve_ids("familias_config", int(sin_id.sum())))
                             df_fam.at[idx_fam, "config_json"] = js_final
                             save_data(df_fam, "familias_config")
+                            invalidar_registro()
+                            st.success("Actualizado!")
+                        else:
+                            row = pd.DataFrame([{"id": df_fam.at[idx_fam, "id"], "config_json": js_final}])
+                            update_rows(row, "familias_config")
+                            invalidar_registro()
                             st.success("Actualizado!")
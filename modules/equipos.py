@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-from utils.db_con import get_data, save_data
+from utils.db_con import get_data, append_rows, next_id
 
 def render_equipos_view():
     st.header("🏭 Maestro de Equipos (Niveles 1-3)")
@@ -29,13 +29,13 @@ def render_equipos_view():
                 if not df.empty and tag in df['tag'].values:
                     st.error("⚠️ Ese TAG ya existe.")
                 else:
-                    new_id = 1 if df.empty else df['id'].max() + 1
+                    new_id = next_id("equipos")
                     new_row = pd.DataFrame([{
                         "id": new_id, "tag": tag, "nombre": nombre,
                         "planta": planta, "area": area, 
                         "tipo": tipo, "criticidad": crit, "estado": "Operativo"
                     }])
-                    save_data(pd.concat([df, new_row], ignore_index=True), "equipos")
+                    append_rows(new_row, "equipos")
                     st.success(f"✅ Equipo '{nombre}' registrado en {area}.")
                     st.cache_data.clear()
 
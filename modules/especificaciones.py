@@ -0,0 +1,46 @@
+import streamlit as st
+from utils.jerarquia import indice_activos
+from utils.especificaciones import indice_specs
+
+
+def render_especificaciones_view():
+    st.header("🔎 Búsqueda por Especificaciones Técnicas")
+    ix = indice_specs()  # se reconstruye solo si cambió la jerarquía o las familias
+    if not len(ix):
+        st.info("Aún no hay componentes con especificaciones cargadas.")
+        return
+    idx = indice_activos()
+
+    # --- ÁMBITO ---
+    c1, c2, c3 = st.columns(3)
+    familias = sorted(set(ix.tabla["familia"]) - {""})
+    familia = c1.selectbox("Familia", ["(Todas)"] + familias)
+    planta = c2.selectbox("Planta", ["(Todas)"] + idx.plantas())
+    area = c3.selectbox("Área", ["(Todas)"] + (idx.areas(planta) if planta != "(Todas)" else []))
+    familia = None if familia == "(Todas)" else familia
+
+    # --- CONDICIONES (una por campo elegido) ---
+    df_campos = ix.campos(familia)
+    etiquetas = {r.campo: (f"{r.campo} ({r.unidad})" if r.unidad else r.campo) for r in df_campos.itertuples()}
+    elegidos = st.multiselect("Filtrar por", list(etiquetas), format_func=etiquetas.get)
+    condiciones = []
+    for r in df_campos[df_campos["campo"].isin(elegidos)].itertuples():
+        if r.numericos:
+            a, b = st.columns(2)
+            lo = a.number_input(f"{etiquetas[r.campo]} desde", value=float(r.min), key=f"spec_lo_{r.campo}")
+            hi = b.number_input(f"{etiquetas[r.campo]} hasta", value=float(r.max), key=f"spec_hi_{r.campo}")
+            condiciones.append((r.campo, "entre", (lo, hi)))
+        else:
+            valor = st.selectbox(etiquetas[r.campo], ix.valores(r.campo), key=f"spec_eq_{r.campo}")
+            condiciones.append((r.campo, "=", valor))
+
+    # --- RESULTADOS ---
+    ids = ix.filtrar(condiciones, familia=familia, planta=None if planta == "(Todas)" else planta,
+                     area=None if area == "(Todas)" else area)
+    st.caption(f"{len(ids)} componentes cumplen los filtros.")
+    if len(ids):
+        res = ix.resultados(ids[:500], campos=elegidos or None)
+        st.dataframe(res, use_container_width=True, hide_index=True)
+        if len(ids) > 500: st.caption("Se muestran los primeros 500.")
+        st.download_button("⬇️ Descargar CSV", ix.resultados(ids).to_csv(index=False).encode("utf-8"),
+                           "especificaciones.csv", "text/csv")
@@ -1,23 +1,22 @@
+import os
+import time
+import tempfile
 import streamlit as st
 import pandas as pd
 import json
-from utils.db_con import get_data, save_data
-
-# --- CONFIGURACIÓN ---
-COLS_EQUIPOS = ["id", "tag", "nombre", "planta", "area", "tipo", "criticidad", "estado"]
-COLS_SISTEMAS = ["id", "equipo_tag", "nombre", "descripcion"]
-COLS_COMPONENTES = ["id", "sistema_id", "nombre", "marca", "modelo", "cantidad", "categoria", "repuesto_sku", "specs_json"]
+from html import escape
+from utils.db_con import get_many, append_rows, update_rows, next_id
+from utils.jerarquia import indice_activos
+from utils.bom import actualizar_componente
+from utils.especificaciones import actualizar_specs
+from utils.perfil import span
+from utils.familias import registro_familias
+from utils.specs import parse_specs, tarjeta_html
+from utils.carga_masiva import ImportacionActivos, COLS_IMPORT
+from utils.exportacion import exportar_activos
 
 # --- HELPERS ---
-def asegurar_df(df, columnas_base):
-    if df is None or df.empty: return pd.DataFrame(columns=columnas_base)
-    for c in columnas_base:
-        if c not in df.columns: df[c] = None
-    return df
-
-def limpiar_id(serie):
-    return serie.astype(str).str.replace(r"\.0$", "", regex=True).str.strip()
-
+# Columnas, tipos y normalización (IDs Int64, TAGs en mayúsculas) los aplica utils.esquemas al cargar.
 def limpiar_dato(dato):
     if pd.isna(dato) or str(dato).lower() in ['nan', 'none', ''] or str(dato).strip() == "": return "-"
     return str(dato)
@@ -25,11 +24,12 @@ def limpiar_dato(dato):
 def formatear_specs_html_ejecutivo(json_str):
     try:
         if not json_str or json_str == "{}": return "<span style='color:#777; font-style:italic;'>-</span>"
-        data = json.loads(json_str)
+        data = parse_specs(json_str)
+        if data is None: return ""
         items = ""
         for k, v in data.items():
             if v and str(v).lower() not in ['nan', 'none', '']:
-                items += f"<div style='background:rgba(255,255,255,0.08);padding:3px 6px;border-radius:3px;'><span style='color:#aaa;font-size:0.7em;display:block;'>{k}</span><span style='color:#fff;font-weight:600;font-size:0.85em;'>{v}</span></div>"
+                items += f"<div style='background:rgba(255,255,255,0.08);padding:3px 6px;border-radius:3px;'><span style='color:#aaa;font-size:0.7em;display:block;'>{escape(str(k))}</span><span style='color:#fff;font-weight:600;font-size:0.85em;'>{escape(str(v))}</span></div>"
         return f"<div style='display:grid;grid-template-columns:repeat(auto-fill,minmax(90px,1fr));gap:4px;margin-top:4px;'>{items}</div>"
     except: return ""
 
@@ -64,104 +64,194 @@ def gestionar_filtro_dinamico_persistente(label, opciones_existentes, key_unique
 
 # --- RENDERIZADOR CAMPOS ---
 def render_campos_dinamicos(categoria, sistema_asociado, valores_actuales={}, key_prefix="new"):
+    # Esquema ya compilado (registro en memoria): sin lectura de hoja ni json.loads por render
     specs = {}
     st.markdown("---")
+    familia = registro_familias().get(categoria, sistema_asociado)
     
-    df_fam = get_data("familias_config")
-    campos = []
-    
-    if not df_fam.empty:
-        mask = (df_fam["nombre_familia"] == categoria) & (df_fam["sistema_asociado"] == sistema_asociado)
-        row = df_fam[mask]
-        if not row.empty:
-            try: campos = json.loads(row.iloc[0]["config_json"])
-            except: pass
-            
-    if campos:
+    if familia is not None and familia.campos:
         st.caption(f"⚙️ Datos Técnicos: {categoria}")
         cols = st.columns(2)
-        for i, campo in enumerate(campos):
-            nom = campo['nombre']
-            uni = campo.get('unidad','')
-            lbl = f"{nom} ({uni})" if uni else nom
-            specs[nom] = cols[i%2].text_input(lbl, value=valores_actuales.get(nom,""), key=f"{key_prefix}_{nom}_{i}")
+        for i, campo in enumerate(familia.campos):
+            nom = campo.nombre
+            actual = valores_actuales.get(nom, "")
+            key = f"{key_prefix}_{nom}_{i}"
+            if campo.tipo == "opcion" and campo.opciones:
+                ops = [""] + campo.opciones
+                specs[nom] = cols[i%2].selectbox(campo.etiqueta, ops, index=ops.index(str(actual)) if str(actual) in ops else 0, key=key)
+            else:
+                ayuda = None
+                if campo.tipo == "numero" and (campo.min is not None or campo.max is not None):
+                    ayuda = f"Rango: {'-∞' if campo.min is None else f'{campo.min:g}'} a {'∞' if campo.max is None else f'{campo.max:g}'}"
+                specs[nom] = cols[i%2].text_input(campo.etiqueta + (" *" if campo.requerido else ""), value=str(actual), key=key, help=ayuda)
     else:
         st.info("Sin variables configuradas.")
         specs["General"] = st.text_area("Detalles", value=valores_actuales.get("General",""), key=f"{key_prefix}_gen")
     return specs
 
+# --- ARBOL (HTML POR LOTES) ---
+EQUIPOS_POR_PAGINA = 25
+
+def html_componente(c):
+    # Memorizado por contenido: si el componente no cambió, no hay json.loads ni armado de HTML
+    clave = tuple(str(c[k]) for k in ("nombre", "categoria", "marca", "modelo", "specs_json"))
+    return tarjeta_html(clave, lambda: _html_componente(c))
+
+def _html_componente(c):
+    specs = formatear_specs_html_ejecutivo(c['specs_json'])
+    return f"<div class='component-card'><div style='display:flex;justify-content:space-between;font-weight:bold;color:white;'><span>🔧 {escape(str(c['nombre']))}</span><span style='background:#444;padding:2px 5px;font-size:0.7em;border-radius:3px;'>{escape(str(c['categoria']))}</span></div><div style='font-size:0.85em;color:#aaa;margin-bottom:5px;'>Marca: {escape(limpiar_dato(c['marca']))} | Mod: {escape(limpiar_dato(c['modelo']))}</div>{specs}</div>"
+
+def html_equipo(idx, eq):
+    partes = [f"<h3>🔹 {escape(str(eq['nombre']))} <small>({escape(str(eq['tag']))})</small></h3>"]
+    for sys in idx.sistemas(eq['tag']).to_dict("records"):
+        partes.append(f"<p style='font-weight:bold;margin:10px 0 0 0;'>🎛️ {escape(str(sys['nombre']))}</p>")
+        partes.extend(html_componente(c) for c in idx.componentes(sys['id']).to_dict("records"))
+    partes.append("<hr>")
+    return "".join(partes)
+
+def render_area_arbol(idx, planta, area):
+    eqs = idx.equipos(planta, area)
+    key_lim = f"lim_arbol_{planta}_{area}"
+    limite = st.session_state.get(key_lim, EQUIPOS_POR_PAGINA)
+    visibles = eqs.iloc[:limite].to_dict("records")
+    # Un solo st.markdown para toda la página de equipos (no uno por tarjeta)
+    with span("gestion.arbol_html", equipos=len(visibles)) as s:
+        html = "".join(html_equipo(idx, eq) for eq in visibles)
+        s["bytes"] = len(html)
+        st.markdown(html, unsafe_allow_html=True)
+    if len(eqs) > limite:
+        def _mas(): st.session_state[key_lim] = limite + EQUIPOS_POR_PAGINA
+        st.button(f"Mostrar más ({limite} de {len(eqs)} equipos)", key=f"mas_{key_lim}", on_click=_mas)
+
+# --- CARGA MASIVA ---
+def render_carga_masiva():
+    st.caption("Excel con hojas 'equipos', 'sistemas' y 'componentes'. Columnas: " +
+               " | ".join(f"**{h}**: {', '.join(c)}" for h, c in COLS_IMPORT.items()) +
+               ". En componentes, las columnas adicionales se guardan como datos técnicos.")
+    archivo = st.file_uploader("Carga Masiva", type=["xlsx"])
+    if archivo is None: return
+
+    # El análisis se guarda por archivo: los reruns no vuelven a leer el Excel
+    key_imp = f"imp_{archivo.file_id}"
+    if key_imp not in st.session_state:
+        with st.spinner("Validando archivo..."):
+            st.session_state[key_imp] = ImportacionActivos().analizar(archivo)
+    imp = st.session_state[key_imp]
+    res = imp.resumen()
+
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Equipos válidos", f"{res['validas']['equipos']} / {res['leidas']['equipos']}")
+    m2.metric("Sistemas válidos", f"{res['validas']['sistemas']} / {res['leidas']['sistemas']}")
+    m3.metric("Componentes válidos", f"{res['validas']['componentes']} / {res['leidas']['componentes']}")
+    m4.metric("Filas/s", res["filas_por_seg"])
+
+    if res["errores"]:
+        df_err = imp.df_errores()
+        st.warning(f"{res['errores']} errores (las filas con error no se importan).")
+        st.dataframe(df_err.head(1000), use_container_width=True, hide_index=True)
+        st.download_button("⬇️ Reporte de errores (CSV)", df_err.to_csv(index=False).encode("utf-8"), "errores_carga.csv", "text/csv")
+
+    if sum(res["validas"].values()) and st.button("✅ Importar filas válidas", type="primary"):
+        with st.spinner("Importando..."):
+            n = imp.confirmar()
+        del st.session_state[key_imp]
+        st.success(f"Importados: {n['equipos']} equipos, {n['sistemas']} sistemas, {n['componentes']} componentes.")
+
+# Los Excel exportados van a una carpeta propia y se borran al generar uno nuevo en la sesión o,
+# si la sesión se abandonó, cuando otra exporta y ya pasaron VIDA_EXPORT segundos.
+DIR_EXPORT = os.path.join(tempfile.gettempdir(), "cmms_export")
+VIDA_EXPORT = 3600
+
+def _limpiar_exportaciones(ahora):
+    for nombre in os.listdir(DIR_EXPORT):
+        ruta = os.path.join(DIR_EXPORT, nombre)
+        try:
+            if ahora - os.path.getmtime(ruta) > VIDA_EXPORT: os.remove(ruta)
+        except OSError:
+            pass  # otra sesión lo borró primero
+
+def _leer_exportacion(ruta):
+    with open(ruta, "rb") as f: return f.read()
+
+def render_exportacion():
+    """Registro completo a Excel: se escribe a un archivo temporal (memoria acotada) y se lee solo al descargarlo."""
+    c1, c2 = st.columns([1, 3])
+    if c1.button("📤 Exportar registro (Excel)"):
+        os.makedirs(DIR_EXPORT, exist_ok=True)
+        _limpiar_exportaciones(time.time())
+        previo = st.session_state.pop("export_xlsx", None)
+        if previo and os.path.exists(previo[0]): os.remove(previo[0])
+        fd, ruta = tempfile.mkstemp(prefix="cmms_registro_", suffix=".xlsx", dir=DIR_EXPORT); os.close(fd)
+        with st.spinner("Generando Excel..."):
+            res = exportar_activos(ruta)
+        st.session_state["export_xlsx"] = (ruta, res)
+    previo = st.session_state.get("export_xlsx")
+    if previo and os.path.exists(previo[0]):
+        ruta, res = previo
+        c2.caption(f"{res['activos']:,} filas de activos ({res['campos']} campos técnicos) · {res['almacen']:,} repuestos · "
+                   f"{res['lecturas']:,} series de lecturas · {res['segundos']} s")
+        # Descarga diferida: el archivo se lee al hacer clic, no en cada rerun de la página
+        c2.download_button("⬇️ Descargar registro_activos.xlsx", lambda: _leer_exportacion(ruta), "registro_activos.xlsx",
+                           "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", on_click="ignore")
+
 # --- MAIN ---
 def render_gestion_activos():
     st.header("🏭 Gestión de Activos")
     st.markdown("""<style>.component-card {background-color: #262730; border: 1px solid #444; border-radius: 8px; padding: 10px; margin-top: 5px; border-left: 4px solid #FF4B4B;} input {color: black !important;}</style>""", unsafe_allow_html=True)
 
-    # Cargar Datos
-    df_eq = asegurar_df(get_data("equipos"), COLS_EQUIPOS)
-    df_sys = asegurar_df(get_data("sistemas"), COLS_SISTEMAS)
-    df_comp = asegurar_df(get_data("componentes"), COLS_COMPONENTES)
-    
-    # Cargar Maestros
-    df_sys_conf = get_data("sistemas_config")
-    df_fam_conf = get_data("familias_config")
+    # Cargar Datos + Maestros (en paralelo)
+    datos = get_many(["equipos", "sistemas", "componentes", "sistemas_config", "familias_config"])
+    df_eq = datos["equipos"]
+    df_sys_conf = datos["sistemas_config"]
     
     # Lista de Sistemas Maestros (Para el dropdown)
     list_sys_master = df_sys_conf["nombre_sistema"].tolist() if not df_sys_conf.empty else []
 
-    # Normalizar IDs
-    if not df_eq.empty: df_eq['tag'] = df_eq['tag'].astype(str).str.strip().str.upper()
-    if not df_sys.empty: df_sys['id'] = limpiar_id(df_sys['id']); df_sys['equipo_tag'] = df_sys['equipo_tag'].astype(str).str.strip().str.upper()
-    if not df_comp.empty: df_comp['sistema_id'] = limpiar_id(df_comp['sistema_id'])
+    # Índice de la jerarquía (IDs/TAGs ya normalizados, se reconstruye solo si cambian los datos)
+    idx = indice_activos()
 
     tab_arbol, tab_manual, tab_masiva = st.tabs(["🌳 Visualizar Planta", "✏️ Gestión & Edición", "📦 Carga Masiva"])
 
     # === TAB 1: ARBOL ===
-    with tab_arbol:
+    with tab_arbol, span("gestion.arbol"):
         if df_eq.empty: st.info("Sin datos.")
         else:
-            planta_sel = st.selectbox("Planta:", df_eq['planta'].unique())
+            planta_sel = st.selectbox("Planta:", idx.plantas())
             if planta_sel:
-                for area in df_eq[df_eq['planta']==planta_sel]['area'].unique():
-                    with st.expander(f"📍 {area}", expanded=False):
-                        eqs = df_eq[(df_eq['planta']==planta_sel) & (df_eq['area']==area)]
-                        for _, eq in eqs.iterrows():
-                            st.markdown(f"### 🔹 {eq['nombre']} <small>({eq['tag']})</small>", unsafe_allow_html=True)
-                            if not df_sys.empty:
-                                sistemas = df_sys[df_sys['equipo_tag'] == str(eq['tag'])]
-                                for _, sys in sistemas.iterrows():
-                                    st.markdown(f"**🎛️ {sys['nombre']}**")
-                                    if not df_comp.empty:
-                                        comps = df_comp[df_comp['sistema_id'] == str(sys['id'])]
-                                        for _, c in comps.iterrows():
-                                            specs = formatear_specs_html_ejecutivo(c['specs_json'])
-                                            st.markdown(f"<div class='component-card'><div style='display:flex;justify-content:space-between;font-weight:bold;color:white;'><span>🔧 {c['nombre']}</span><span style='background:#444;padding:2px 5px;font-size:0.7em;border-radius:3px;'>{c['categoria']}</span></div><div style='font-size:0.85em;color:#aaa;margin-bottom:5px;'>Marca: {limpiar_dato(c['marca'])} | Mod: {limpiar_dato(c['modelo'])}</div>{specs}</div>", unsafe_allow_html=True)
-                            st.markdown("---")
+                # Solo las áreas abiertas generan HTML (un bloque por página de equipos)
+                for area in idx.areas(planta_sel):
+                    if st.toggle(f"📍 {area}", key=f"arbol_{planta_sel}_{area}"):
+                        render_area_arbol(idx, planta_sel, area)
+            st.divider()
+            render_exportacion()
 
     # === TAB 2: GESTION ===
-    with tab_manual:
+    with tab_manual, span("gestion.edicion"):
         c1, c2 = st.columns(2)
-        l_planta = df_eq['planta'].unique().tolist() if not df_eq.empty else []
+        l_planta = idx.plantas()
         with c1: v_planta, _ = gestionar_filtro_dinamico_persistente("Planta", l_planta, "planta")
         
         if v_planta:
-            l_area = df_eq[df_eq['planta']==v_planta]['area'].unique().tolist() if not df_eq.empty else []
+            l_area = idx.areas(v_planta)
             with c2: v_area, _ = gestionar_filtro_dinamico_persistente("Área", l_area, "area")
             
             if v_area:
                 st.divider()
                 ce1, ce2 = st.columns([1,2])
                 with ce1:
-                    l_eq = df_eq[(df_eq['planta']==v_planta) & (df_eq['area']==v_area)]['nombre'].tolist() if not df_eq.empty else []
+                    eqs_area = idx.equipos(v_planta, v_area)
+                    l_eq = eqs_area['nombre'].tolist()
                     sel_eq, new_eq = gestionar_filtro_dinamico_persistente("Equipo", l_eq, "equipo")
                 
                 tag_eq = None
                 if sel_eq:
                     with ce2:
                         st.caption(f"EQUIPO: {sel_eq}")
-                        d_tag=""; d_typ=""; eq_idx=None
-                        if not new_eq and not df_eq.empty:
+                        d_tag=""; d_typ=""; eq_id=None
+                        if not new_eq:
                             try:
-                                r = df_eq[(df_eq['nombre']==sel_eq)&(df_eq['area']==v_area)].iloc[0]
-                                d_tag=r['tag']; d_typ=r['tipo']; eq_idx=r.name; tag_eq=d_tag
+                                r = eqs_area[eqs_area['nombre']==sel_eq].iloc[0]
+                                d_tag=r['tag']; d_typ=r['tipo']; eq_id=r['id']; tag_eq=d_tag
                             except: pass
                         with st.form("f_eq"):
                             ct1, ct2 = st.columns(2)
@@ -171,13 +261,12 @@ def render_gestion_activos():
                                 if not i_tag: st.error("TAG requerido")
                                 else:
                                     if new_eq:
-                                        nid = 1 if df_eq.empty else (pd.to_numeric(df_eq['id'], errors='coerce').max() or 0)+1
+                                        nid = next_id("equipos")
                                         row = pd.DataFrame([{"id":nid, "tag":i_tag, "nombre":sel_eq, "planta":v_planta, "area":v_area, "tipo":i_typ, "criticidad":"Media", "estado":"OK"}])
-                                        save_data(pd.concat([df_eq, row], ignore_index=True), "equipos")
+                                        append_rows(row, "equipos")
                                         st.session_state['force_equipo'] = sel_eq
                                     else:
-                                        df_eq.at[eq_idx,'tag']=i_tag; df_eq.at[eq_idx,'tipo']=i_typ
-                                        save_data(df_eq, "equipos")
+                                        update_rows(pd.DataFrame([{"id":eq_id, "tag":i_tag, "tipo":i_typ}]), "equipos")
                                     st.success("Ok"); st.rerun()
 
                 # --- SISTEMA (JALA DEL MAESTRO) ---
@@ -186,7 +275,8 @@ def render_gestion_activos():
                     cs1, cs2 = st.columns([1,2])
                     with cs1:
                         # Buscamos sistemas de este equipo
-                        l_sys = df_sys[df_sys['equipo_tag'].astype(str)==str(tag_eq)]['nombre'].tolist() if not df_sys.empty else []
+                        sys_eq = idx.sistemas(tag_eq)
+                        l_sys = sys_eq['nombre'].tolist()
                         
                         # --- MODIFICACIÓN: LISTA MIXTA (EXISTENTES + MAESTRO PARA CREAR) ---
                         # Para el selector, mostramos los existentes del equipo.
@@ -197,12 +287,12 @@ def render_gestion_activos():
                     if sel_sys:
                         with cs2:
                             st.caption(f"SISTEMA: {sel_sys}")
-                            d_desc=""; sys_idx=None
+                            d_desc=""
                             
-                            if not new_sys and not df_sys.empty:
+                            if not new_sys:
                                 try:
-                                    r = df_sys[(df_sys['equipo_tag'].astype(str)==str(tag_eq))&(df_sys['nombre']==sel_sys)].iloc[0]
-                                    d_desc=r['descripcion']; id_sys=r['id']; sys_idx=r.name; nombre_sistema_real=sel_sys
+                                    r = sys_eq[sys_eq['nombre']==sel_sys].iloc[0]
+                                    d_desc=r['descripcion']; id_sys=r['id']; nombre_sistema_real=sel_sys
                                 except: pass
                             
                             with st.form("f_sys"):
@@ -222,14 +312,13 @@ def render_gestion_activos():
                                 if st.form_submit_button("Guardar Sistema"):
                                     if val_nombre_sistema:
                                         if new_sys:
-                                            nid = 1 if df_sys.empty else (pd.to_numeric(df_sys['id'], errors='coerce').max() or 0)+1
+                                            nid = next_id("sistemas")
                                             row = pd.DataFrame([{"id":nid, "equipo_tag":tag_eq, "nombre":val_nombre_sistema, "descripcion":i_desc}])
-                                            save_data(pd.concat([df_sys, row], ignore_index=True), "sistemas")
+                                            append_rows(row, "sistemas")
                                             # Truco: Forzamos la selección del nombre REAL del sistema guardado
                                             st.session_state['force_sistema'] = val_nombre_sistema
                                         else:
-                                            df_sys.at[sys_idx,'descripcion']=i_desc
-                                            save_data(df_sys, "sistemas")
+                                            update_rows(pd.DataFrame([{"id":id_sys, "descripcion":i_desc}]), "sistemas")
                                         st.success("Ok"); st.rerun()
 
                     # --- COMPONENTE (FILTRADO POR SISTEMA) ---
@@ -237,10 +326,8 @@ def render_gestion_activos():
                         st.divider()
                         cc1, cc2 = st.columns([1,2])
                         with cc1:
-                            l_comp = []
-                            if not df_comp.empty:
-                                clean_id = limpiar_id(pd.Series([id_sys]))[0]
-                                l_comp = df_comp[limpiar_id(df_comp['sistema_id'])==clean_id]['nombre'].tolist()
+                            comps_sys = idx.componentes(id_sys)
+                            l_comp = comps_sys['nombre'].tolist()
                             sel_comp, new_comp = gestionar_filtro_dinamico_persistente("Identificador Componente", l_comp, "comp")
                         
                         if sel_comp:
@@ -248,25 +335,22 @@ def render_gestion_activos():
                                 st.caption(f"COMPONENTE: {sel_comp}")
                                 
                                 # FILTRAR FAMILIAS SEGÚN EL SISTEMA PADRE (nombre_sistema_real)
-                                fams_disp = []
-                                if not df_fam_conf.empty:
-                                    # nombre_sistema_real viene del sistema seleccionado arriba
-                                    fams_disp = df_fam_conf[df_fam_conf["sistema_asociado"] == nombre_sistema_real]["nombre_familia"].tolist()
+                                # nombre_sistema_real viene del sistema seleccionado arriba
+                                fams_disp = registro_familias().familias_de(nombre_sistema_real)
                                 
                                 if not fams_disp:
                                     st.warning(f"El sistema '{nombre_sistema_real}' no tiene familias asociadas en el Maestro.")
                                 
                                 # Datos previos
                                 d_mar=""; d_mod=""; d_cant=1; d_cat=fams_disp[0] if fams_disp else ""; d_specs={}
-                                c_idx=None; c_sku=""
+                                c_idx=None; c_id=None; c_sku=""
                                 
-                                if not new_comp and not df_comp.empty:
+                                if not new_comp:
                                     try:
-                                        clean_id = limpiar_id(pd.Series([id_sys]))[0]
-                                        r = df_comp[(limpiar_id(df_comp['sistema_id'])==clean_id)&(df_comp['nombre']==sel_comp)].iloc[0]
-                                        d_mar=r['marca']; d_mod=r['modelo']; d_cant=int(r['cantidad'] or 1); d_cat=r['categoria']; c_sku=r['repuesto_sku']
-                                        if r['specs_json']: d_specs=json.loads(r['specs_json'])
-                                        c_idx=r.name
+                                        r = comps_sys[comps_sys['nombre']==sel_comp].iloc[0]
+                                        d_mar=r['marca']; d_mod=r['modelo']; d_cant=int(r['cantidad']) if pd.notna(r['cantidad']) else 1; d_cat=r['categoria']; c_sku=r['repuesto_sku']
+                                        d_specs = parse_specs(r['specs_json']) or {}
+                                        c_idx=r.name; c_id=r['id']
                                     except: pass
                                 
                                 # Si ya existe, usamos su categoría. Si es nuevo, default.
@@ -291,21 +375,26 @@ def render_gestion_activos():
                                         specs_end = render_campos_dinamicos(v_cat, nombre_sistema_real, d_specs, key_prefix=k_pref)
                                     
                                     if st.form_submit_button("Guardar Componente"):
+                                        familia = registro_familias().get(v_cat, nombre_sistema_real) if v_cat else None
+                                        errores = []
+                                        if familia is not None: specs_end, errores = familia.validar(specs_end)
                                         if not v_cat:
                                             st.error("Debes configurar familias para este sistema primero.")
+                                        elif errores:
+                                            st.error("❌ " + " · ".join(errores))
                                         else:
-                                            js_str = json.dumps(specs_end)
+                                            js_str = json.dumps(specs_end, ensure_ascii=False)
                                             if new_comp:
-                                                nid = 1 if df_comp.empty else (pd.to_numeric(df_comp['id'], errors='coerce').max() or 0)+1
+                                                nid = next_id("componentes")
                                                 row = pd.DataFrame([{"id":nid, "sistema_id":id_sys, "nombre":sel_comp, "categoria":v_cat, "marca":v_mar, "modelo":v_mod, "cantidad":v_cant, "repuesto_sku":v_sku, "specs_json":js_str}])
-                                                save_data(pd.concat([df_comp, row], ignore_index=True), "componentes")
+                                                append_rows(row, "componentes")
+                                                actualizar_componente(row.iloc[0].to_dict()); actualizar_specs(row.iloc[0].to_dict())
                                                 st.session_state['force_comp'] = sel_comp
                                             else:
-                                                df_comp.at[c_idx,'marca']=v_mar; df_comp.at[c_idx,'modelo']=v_mod
-                                                df_comp.at[c_idx,'cantidad']=v_cant; df_comp.at[c_idx,'categoria']=v_cat
-                                                df_comp.at[c_idx,'repuesto_sku']=v_sku; df_comp.at[c_idx,'specs_json']=js_str
-                                                save_data(df_comp, "componentes")
+                                                row = pd.DataFrame([{"id":c_id, "marca":v_mar, "modelo":v_mod, "cantidad":v_cant, "categoria":v_cat, "repuesto_sku":v_sku, "specs_json":js_str}])
+                                                update_rows(row, "componentes")
+                                                actualizar_componente(row.iloc[0].to_dict()); actualizar_specs(row.iloc[0].to_dict())
                                             st.success("Ok"); st.rerun()
 
-    with tab_masiva:
-        st.file_uploader("Carga Masiva", type=["xlsx"])
+    with tab_masiva, span("gestion.carga_masiva"):
+        render_carga_masiva()
@@ -1,31 +1,74 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-from datetime import datetime
-from utils.db_con import get_data, save_data
+from datetime import datetime, timedelta
+from utils.db_con import get_many, get_lecturas_store, guardar_lecturas
+from utils.jerarquia import indice_activos
+from utils.decimacion import decimar, usar_webgl
+from utils.ingesta_lecturas import IngestaLecturas, PARAMETROS
+from utils.alarmas import evaluar_alarmas
+from utils.perfil import span
+
+PERIODOS = {"Últimos 30 días": 30, "Últimos 90 días": 90, "Último año": 365, "Todo": None}
+
+def render_carga_lecturas():
+    st.caption("CSV del colector (',' o ';'). Columnas: **tag, componente, parametro, valor, ts** (o fecha + hora). "
+               "Opcionales: sistema, unidad, tecnico. Unidades convertibles: " +
+               " | ".join(f"{n}: {', '.join(p['conversiones'])}" for n, p in PARAMETROS.items()))
+    archivo = st.file_uploader("Lecturas (CSV)", type=["csv"])
+    if archivo is None: return
+
+    # El análisis se guarda por archivo: los reruns no vuelven a leer el CSV
+    key_ing = f"ing_{archivo.file_id}"
+    if key_ing not in st.session_state:
+        with st.spinner("Validando lecturas..."):
+            st.session_state[key_ing] = IngestaLecturas().analizar(archivo)
+    ing = st.session_state[key_ing]
+    res = ing.resumen()
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Lecturas válidas", f"{res['validas']} / {res['leidas']}")
+    m2.metric("Errores", res["errores"])
+    m3.metric("Filas/s", res["filas_por_seg"])
+
+    if res["errores"]:
+        df_err = ing.df_errores()
+        st.warning(f"{res['errores']} errores (las filas con error no se importan).")
+        st.dataframe(df_err.head(1000), use_container_width=True, hide_index=True)
+        st.download_button("⬇️ Reporte de errores (CSV)", df_err.to_csv(index=False).encode("utf-8"), "errores_lecturas.csv", "text/csv")
+
+    if res["validas"] and st.button("✅ Importar lecturas válidas", type="primary"):
+        with st.spinner("Importando..."):
+            n = ing.confirmar()
+            alarmas = evaluar_alarmas()
+        res = ing.resumen()
+        del st.session_state[key_ing]
+        st.success(f"Importadas {n} lecturas ({res['escritura_filas_por_seg']} filas/s). Alarmas activas: {alarmas['activas']}.")
 
 def render_monitoreo_view():
     st.header("📈 Monitoreo de Condición (CBM)")
+    store = get_lecturas_store()
+
+    with st.expander("📥 Carga masiva de lecturas (CSV)"), span("monitoreo.carga_csv"):
+        render_carga_lecturas()
     
-    # 1. Cargar datos
-    df_equipos = get_data("equipos")
-    df_componentes = get_data("componentes")
+    # 1. Cargar datos (en paralelo; el índice queda en caché). Las lecturas van por su propio almacén.
+    datos = get_many(["equipos", "componentes", "sistemas"])
+    df_equipos = datos["equipos"]
     
     if df_equipos.empty:
         st.warning("No hay equipos registrados.")
         return
 
-    # 2. Filtros en Cascada
+    # 2. Filtros en Cascada (sobre el índice compartido de la jerarquía)
+    idx = indice_activos()
     # Planta
-    plantas = df_equipos["planta"].unique() if "planta" in df_equipos.columns else []
-    planta_sel = st.selectbox("1. Planta", plantas)
+    planta_sel = st.selectbox("1. Planta", idx.plantas())
     
     # Área (Filtrada)
-    areas = df_equipos[df_equipos["planta"] == planta_sel]["area"].unique() if not df_equipos.empty else []
-    area_sel = st.selectbox("2. Área", areas)
+    area_sel = st.selectbox("2. Área", idx.areas(planta_sel))
     
     # Equipo (Filtrado)
-    eqs = df_equipos[(df_equipos["planta"] == planta_sel) & (df_equipos["area"] == area_sel)]
+    eqs = idx.equipos(planta_sel, area_sel).copy()
     # Creamos lista "Nombre | TAG"
     eqs["display"] = eqs["nombre"] + " | " + eqs["tag"]
     eq_sel_str = st.selectbox("3. Equipo", eqs["display"].unique())
@@ -37,19 +80,11 @@ def render_monitoreo_view():
         # Nota: Si implementaste sistemas, aquí deberíamos filtrar sistemas primero.
         # Por simplicidad para que compile, listamos todos los componentes vinculados a ese equipo (vía sistemas o directo)
         
-        # Primero buscamos sistemas de ese equipo
-        df_sistemas = get_data("sistemas")
-        ids_sistemas = []
-        if not df_sistemas.empty:
-            ids_sistemas = df_sistemas[df_sistemas["equipo_tag"] == tag_eq]["id"].tolist()
-            
-        # Ahora componentes de esos sistemas
-        comps_filtrados = pd.DataFrame()
-        if not df_componentes.empty and ids_sistemas:
-            comps_filtrados = df_componentes[df_componentes["sistema_id"].isin(ids_sistemas)]
+        # Componentes de todos los sistemas de ese equipo (búsqueda directa en el índice)
+        comps_filtrados = idx.componentes_de_equipo(tag_eq).copy()
             
         if not comps_filtrados.empty:
-            comps_filtrados["display"] = comps_filtrados["nombre"] + " (" + comps_filtrados["categoria"] + ")"
+            comps_filtrados["display"] = comps_filtrados["nombre"] + " (" + comps_filtrados["categoria"].astype(str) + ")"
             comp_sel_str = st.selectbox("4. Componente", comps_filtrados["display"].unique())
             
             # Recuperar ID para guardar
@@ -61,37 +96,47 @@ def render_monitoreo_view():
             # PESTAÑAS DE ACCIÓN
             t1, t2 = st.tabs(["📝 Nueva Lectura", "📊 Ver Gráfica"])
             
-            with t1:
+            with t1, span("monitoreo.nueva_lectura"):
                 with st.form("lectura_sensor"):
                     c1, c2 = st.columns(2)
-                    param = c1.selectbox("Parámetro", ["Vibración (mm/s)", "Temperatura (°C)", "Ruido (dB)"])
+                    param = c1.selectbox("Parámetro", list(PARAMETROS))
                     val = c2.number_input("Valor", step=0.1)
                     tec = st.text_input("Técnico")
                     
                     if st.form_submit_button("Guardar"):
-                        df_lec = get_data("lecturas")
-                        new_id = 1 if df_lec.empty else df_lec['id'].max() + 1
                         new_row = pd.DataFrame([{
-                            "id": new_id, "componente_id": comp_id,
-                            "fecha": datetime.now().strftime("%Y-%m-%d"),
-                            "hora": datetime.now().strftime("%H:%M"),
+                            "componente_id": comp_id, "ts": datetime.now().replace(microsecond=0),
                             "parametro": param, "valor": val, "tecnico": tec
                         }])
-                        save_data(pd.concat([df_lec, new_row], ignore_index=True), "lecturas")
+                        guardar_lecturas(new_row)
+                        alarmas = evaluar_alarmas()
                         st.success("Lectura Guardada")
+                        if alarmas["eventos"]: st.warning("La lectura cambió el nivel de alarma del componente (ver página Alarmas).")
             
-            with t2:
-                df_hist = get_data("lecturas")
-                if not df_hist.empty:
-                    # Filtramos por este componente
-                    mis_datos = df_hist[df_hist["componente_id"] == comp_id]
-                    if not mis_datos.empty:
-                        param_ver = st.selectbox("Ver variable:", mis_datos["parametro"].unique())
-                        grafico = mis_datos[mis_datos["parametro"] == param_ver]
-                        
-                        fig = px.line(grafico, x="fecha", y="valor", markers=True, title=f"Tendencia: {param_ver}")
+            with t2, span("monitoreo.grafica"):
+                # Solo se leen las filas del componente/variable/rango que se grafican
+                params = store.parametros(comp_id)
+                if params:
+                    c1, c2 = st.columns(2)
+                    param_ver = c1.selectbox("Ver variable:", params)
+                    periodo = c2.selectbox("Periodo:", list(PERIODOS), index=len(PERIODOS) - 1)
+                    dias = PERIODOS[periodo]
+                    desde = datetime.now() - timedelta(days=dias) if dias else None
+                    grafico = store.query(comp_id, param_ver, desde=desde)
+                    
+                    if not grafico.empty:
+                        # El navegador recibe siempre ~PUNTOS puntos, con los picos conservados
+                        total = len(grafico)
+                        with span("monitoreo.decimar", filas=total): grafico = decimar(grafico)
+                        webgl = usar_webgl(len(grafico))
+                        import plotly.express as px  # pesado: solo cuando hay algo que graficar
+                        fig = px.line(grafico, x="ts", y="valor", markers=not webgl, title=f"Tendencia: {param_ver}",
+                                      render_mode="webgl" if webgl else "svg")
                         st.plotly_chart(fig, use_container_width=True)
+                        if len(grafico) < total: st.caption(f"Mostrando {len(grafico):,} de {total:,} lecturas (reducción por tramos).")
                     else:
-                        st.info("No hay datos históricos para este componente.")
+                        st.info("Sin lecturas en el periodo seleccionado.")
+                else:
+                    st.info("No hay datos históricos para este componente.")
         else:
             st.warning("Este equipo no tiene componentes registrados en el árbol.")
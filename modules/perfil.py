@@ -0,0 +1,38 @@
+import json
+import streamlit as st
+import pandas as pd
+from utils.perfil import percentiles, metricas_prometheus
+from utils.paginas import tiempos_import
+
+COLS_SPAN = ["nombre", "padre", "inicio_ms", "ms", "hoja", "filas", "bytes", "cache"]
+
+
+def render_panel_perfil(traza):
+    """Desglose del último rerun en la barra lateral (se dibuja después de la página)."""
+    with st.sidebar:
+        st.divider()
+        n, p50, p95 = percentiles(traza.pagina)
+        st.metric("Rerun", f"{traza.total_ms:,.0f} ms", help="Tiempo total del script en esta ejecución")
+        if n: st.caption(f"{traza.pagina}: p50 {p50:,.0f} ms · p95 {p95:,.0f} ms ({n} reruns)")
+        if not traza.spans:
+            st.caption("Sin spans registrados.")
+            return
+
+        df = pd.DataFrame(traza.spans)
+        for c in COLS_SPAN:
+            if c not in df.columns: df[c] = None
+        # Resumen: tiempo por span (los spans anidados se cuentan también dentro de su padre)
+        resumen = df.groupby("nombre").agg(n=("ms", "size"), ms=("ms", "sum")).sort_values("ms", ascending=False).reset_index()
+        st.dataframe(resumen, use_container_width=True, hide_index=True)
+        io = df[df["nombre"] == "backend.read"]
+        if not io.empty: st.caption(f"Lecturas a red: {len(io)} · {io['filas'].sum():,.0f} filas · {io['ms'].sum():,.0f} ms")
+        imports = tiempos_import()
+        if imports:
+            with st.expander("Import de páginas (primera apertura en este proceso)"):
+                st.dataframe(pd.DataFrame(imports.items(), columns=["modulo", "ms"]), use_container_width=True, hide_index=True)
+        with st.expander("Spans en orden"):
+            st.dataframe(df.sort_values("inicio_ms")[COLS_SPAN + [c for c in df.columns if c not in COLS_SPAN]],
+                         use_container_width=True, hide_index=True)
+        c1, c2 = st.columns(2)
+        c1.download_button("JSONL", json.dumps(traza.a_dict(), ensure_ascii=False, default=str) + "\n", "traza.jsonl", "application/json")
+        c2.download_button("Prometheus", metricas_prometheus(), "metricas.prom", "text/plain")
@@ -0,0 +1,37 @@
+import os
+import sys
+import pandas as pd
+import pytest
+
+# Los módulos de utils/ se importan desde la raíz del repo (como lo hace Streamlit con main.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import db_con
+from utils.backends import SQLiteBackend
+from utils.lecturas_store import LecturasStore
+
+
+@pytest.fixture
+def entorno(tmp_path, monkeypatch):
+    """
+    db_con apuntando a un SQLite temporal: sin write-behind, sin fotos y con una réplica de lecturas
+    en memoria. Devuelve el backend para sembrar hojas con write_table().
+    """
+    monkeypatch.setenv("CMMS_BACKEND", "sqlite")
+    monkeypatch.setenv("CMMS_WRITE_BEHIND", "0")
+    monkeypatch.setenv("CMMS_SNAPSHOTS", "0")
+    monkeypatch.setattr(db_con, "_COLA", None)
+    monkeypatch.setattr(db_con, "_COLA_LISTA", True)
+    backend = SQLiteBackend(str(tmp_path / "cmms.db"))
+    db_con.set_backend(backend)  # también invalida el caché: los índices derivados se reconstruyen
+    db_con.set_snapshots(None)
+    db_con.set_lecturas_store(LecturasStore(":memory:"))
+    yield backend
+    db_con.get_cache().invalidate()
+
+
+def sembrar(backend, **hojas):
+    """Escribe hojas completas en el backend (nombre=DataFrame o lista de dicts)."""
+    for hoja, filas in hojas.items():
+        backend.write_table(hoja, filas if isinstance(filas, pd.DataFrame) else pd.DataFrame(filas))
+    db_con.invalidate_cache()
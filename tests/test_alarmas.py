@@ -0,0 +1,103 @@
+import pandas as pd
+import pytest
+from conftest import sembrar
+from utils import db_con
+from utils.alarmas import evaluar_alarmas, alarmas_activas, historial_alarmas
+
+TEMP = "Temperatura (°C)"  # defecto: alerta 80, peligro 95
+
+
+@pytest.fixture
+def planta(entorno):
+    sembrar(entorno,
+            equipos=[{"id": 1, "tag": "EQ-1", "nombre": "Bomba", "planta": "P1", "area": "A1", "estado": "OK"},
+                     {"id": 2, "tag": "EQ-2", "nombre": "Molino", "planta": "P1", "area": "A1", "estado": "EN REPARACION"}],
+            sistemas=[{"id": 1, "equipo_tag": "EQ-1", "nombre": "Motor"}, {"id": 2, "equipo_tag": "EQ-2", "nombre": "Motor"}],
+            componentes=[{"id": 1, "sistema_id": 1, "nombre": "Rodamiento LA", "categoria": "RODAMIENTO"},
+                         {"id": 2, "sistema_id": 2, "nombre": "Rodamiento LA", "categoria": "RODAMIENTO"}],
+            limites_alarma=[{"id": 1, "familia": "RODAMIENTO", "parametro": "Ruido (dB)", "alerta": 50, "peligro": 60},
+                            {"id": 2, "componente_id": 1, "parametro": "Ruido (dB)", "alerta": 70, "peligro": 75}])
+    return entorno
+
+
+def _leer(comp, minuto, valor, parametro=TEMP):
+    db_con.guardar_lecturas(pd.DataFrame({"componente_id": [comp], "ts": [pd.Timestamp("2026-01-05 08:00") + pd.Timedelta(minutes=minuto)],
+                                          "parametro": [parametro], "valor": [valor], "tecnico": ["JP"]}))
+    return evaluar_alarmas()
+
+
+def _estado_equipo(tag):
+    eq = db_con.get_data("equipos")
+    return eq.loc[eq["tag"] == tag, "estado"].iloc[0]
+
+
+def test_transiciones_de_nivel(planta):
+    assert _leer(1, 0, 70)["eventos"] == 0 and _estado_equipo("EQ-1") == "OK"
+    r = _leer(1, 1, 85)
+    assert r["eventos"] == 1 and r["activas"] == 1 and _estado_equipo("EQ-1") == "ALERTA"
+    _leer(1, 2, 96)
+    assert _estado_equipo("EQ-1") == "PELIGRO"
+    assert alarmas_activas()["nivel"].tolist() == ["PELIGRO"]
+    r = _leer(1, 3, 60)
+    assert r["activas"] == 0 and _estado_equipo("EQ-1") == "OK"
+    hist = historial_alarmas().sort_values("lectura_id")
+    assert list(zip(hist["nivel_anterior"], hist["nivel"])) == [("OK", "ALERTA"), ("ALERTA", "PELIGRO"), ("PELIGRO", "OK")]
+
+
+def test_varias_lecturas_en_un_lote(planta):
+    db_con.guardar_lecturas(pd.DataFrame({"componente_id": [1] * 4, "parametro": [TEMP] * 4, "valor": [85, 96, 90, 50],
+                                          "ts": pd.date_range("2026-01-05 08:00", periods=4, freq="min")}))
+    r = evaluar_alarmas()
+    assert r["lecturas"] == 4 and r["eventos"] == 4 and r["activas"] == 0
+
+
+def test_lectura_atrasada_no_cambia_el_estado(planta):
+    _leer(1, 10, 85)
+    r = _leer(1, 0, 99)  # cargada tarde: más vieja que el estado vigente
+    assert r["eventos"] == 0 and alarmas_activas()["nivel"].tolist() == ["ALERTA"]
+
+
+def test_limite_del_componente_antes_que_el_de_la_familia(planta):
+    _leer(1, 0, 55, "Ruido (dB)")  # familia: alerta 50; componente 1: alerta 70
+    _leer(2, 0, 55, "Ruido (dB)")
+    activas = alarmas_activas()
+    assert activas["componente_id"].tolist() == [2]
+
+
+def test_no_pisa_estados_manuales_sin_alarma(planta):
+    _leer(2, 0, 20)
+    assert _estado_equipo("EQ-2") == "EN REPARACION"
+
+
+def test_reevaluar_completo_tras_cambiar_limites(planta):
+    _leer(1, 0, 85)
+    assert _estado_equipo("EQ-1") == "ALERTA"
+    db_con.update_rows(pd.DataFrame([{"id": 3, "componente_id": 1, "parametro": TEMP, "alerta": 90, "peligro": 100}]), "limites_alarma")
+    r = evaluar_alarmas(completo=True)
+    assert r["activas"] == 0 and _estado_equipo("EQ-1") == "OK"
+
+
+def test_id_que_llega_tarde_se_evalua(planta):
+    _leer(1, 0, 70)  # id 1
+    store = db_con.get_lecturas_store()
+    # Otra instancia reservó ids antes pero su fila entra después de la pasada anterior
+    store.append(pd.DataFrame({"id": [5, 3], "componente_id": [1, 1], "parametro": [TEMP] * 2, "valor": [72, 90],
+                               "ts": [pd.Timestamp("2026-01-05 08:01"), pd.Timestamp("2026-01-05 08:05")]}))
+    assert evaluar_alarmas()["lecturas"] == 2
+    store.append(pd.DataFrame({"id": [2], "componente_id": [1], "parametro": [TEMP], "valor": [96],
+                               "ts": [pd.Timestamp("2026-01-05 08:06")]}))
+    r = evaluar_alarmas()
+    assert r["lecturas"] == 1 and alarmas_activas()["nivel"].tolist() == ["PELIGRO"]
+    assert evaluar_alarmas()["lecturas"] == 0  # cada lectura se evalúa una vez
+
+
+def test_base_anterior_a_la_cola_retoma_desde_la_marca(tmp_path):
+    from utils.lecturas_store import LecturasStore
+    ruta = str(tmp_path / "lecturas.db")
+    store = LecturasStore(ruta)
+    store.append(pd.DataFrame({"id": [1, 2, 3], "componente_id": [1] * 3, "parametro": [TEMP] * 3, "valor": [1, 2, 3],
+                               "ts": pd.date_range("2026-01-05", periods=3, freq="min")}))
+    store._con.execute("DROP TRIGGER tr_alarmas_pendientes")
+    store._con.execute("DROP TABLE alarmas_pendientes")
+    store.fijar_marca("alarmas", 2)  # el motor viejo ya evaluó hasta el id 2
+    assert LecturasStore(ruta).por_evaluar()["id"].tolist() == [3]
@@ -0,0 +1,153 @@
+import threading
+import pandas as pd
+import pytest
+from utils.backends import SQLiteBackend, GSheetsBackend
+from utils.benchmark import ConexionMemoria
+
+
+def _equipos(*filas):
+    return pd.DataFrame([{"id": i, "tag": t, "nombre": n} for i, t, n in filas])
+
+
+def _ids(df):
+    return sorted(pd.to_numeric(df["id"]).astype(int))
+
+
+# --- SQLITE: IDA Y VUELTA ---
+def test_sqlite_ida_y_vuelta(tmp_path):
+    ruta = str(tmp_path / "cmms.db")
+    SQLiteBackend(ruta).write_table("equipos", _equipos((1, "EQ-1", "Bomba"), (2, "EQ-2", "Molino")))
+    df = SQLiteBackend(ruta).read_table("equipos")  # otra conexión: quedó en disco
+    assert _ids(df) == [1, 2]
+    assert list(df["tag"]) == ["EQ-1", "EQ-2"]
+    assert "criticidad" in df.columns  # columnas del esquema aunque no se escribieron
+
+
+def test_sqlite_append_upsert_delete(tmp_path):
+    b = SQLiteBackend(str(tmp_path / "cmms.db"))
+    b.write_table("equipos", _equipos((1, "EQ-1", "Bomba")))
+    b.append_rows("equipos", _equipos((2, "EQ-2", "Molino"), (3, "EQ-3", "Secador")))
+    b.upsert_rows("equipos", _equipos((2, "EQ-2", "Molino 2"), (4, "EQ-4", "Faja")))
+    df = b.read_table("equipos").set_index("id")
+    assert df.loc[2, "nombre"] == "Molino 2" and df.loc[4, "tag"] == "EQ-4"
+    assert len(df) == 4
+    b.delete_rows("equipos", ["1", 3.0])  # claves de cualquier tipo
+    assert _ids(b.read_table("equipos")) == [2, 4]
+
+
+def test_sqlite_upsert_y_delete_por_sku(tmp_path):
+    b = SQLiteBackend(str(tmp_path / "cmms.db"))
+    b.write_table("almacen", pd.DataFrame({"sku": ["R-1", "R-2"], "stock_actual": [5, 1]}))
+    b.upsert_rows("almacen", pd.DataFrame({"sku": ["R-2"], "stock_actual": [9]}))
+    b.delete_rows("almacen", ["R-1"])
+    df = b.read_table("almacen")
+    assert list(df["sku"]) == ["R-2"] and df["stock_actual"].iloc[0] == 9
+
+
+def test_sqlite_columna_nueva(tmp_path):
+    b = SQLiteBackend(str(tmp_path / "cmms.db"))
+    b.append_rows("equipos", _equipos((1, "EQ-1", "Bomba")).assign(extra="x"))
+    assert b.read_table("equipos")["extra"].iloc[0] == "x"
+
+
+# --- RESERVA DE IDS ---
+def _reservar_en_paralelo(backends, hilos=8, veces=25, n=3):
+    ids, errores = [], []
+    lock = threading.Lock()
+
+    def _trabajo(b):
+        try:
+            for _ in range(veces):
+                r = b.reserve_ids("componentes", n)
+                with lock: ids.extend(r)
+        except Exception as e:
+            errores.append(e)
+    ts = [threading.Thread(target=_trabajo, args=(backends[i % len(backends)],)) for i in range(hilos)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    assert not errores
+    return ids
+
+
+def test_reserve_ids_sqlite_concurrente(tmp_path):
+    ruta = str(tmp_path / "cmms.db")
+    b = SQLiteBackend(ruta)
+    b.write_table("componentes", pd.DataFrame({"id": [1, 7], "nombre": ["a", "b"]}))
+    # Dos conexiones al mismo archivo (como dos procesos) y varios hilos en cada una
+    ids = _reservar_en_paralelo([b, SQLiteBackend(ruta)])
+    assert len(ids) == len(set(ids)) == 8 * 25 * 3
+    assert sorted(ids) == list(range(8, 8 + len(ids)))
+
+
+def test_reserve_ids_gsheets_concurrente():
+    b = GSheetsBackend(conn=ConexionMemoria({"componentes": pd.DataFrame({"id": [1, 7], "nombre": ["a", "b"]})}))
+    ids = _reservar_en_paralelo([b])
+    assert sorted(ids) == list(range(8, 8 + 8 * 25 * 3))
+
+
+@pytest.mark.parametrize("crear", [lambda p: SQLiteBackend(str(p / "cmms.db")),
+                                   lambda p: GSheetsBackend(conn=ConexionMemoria({"componentes": pd.DataFrame({"id": [], "nombre": []})}))],
+                         ids=["sqlite", "gsheets"])
+def test_reserve_ids_respeta_escrituras_encoladas(tmp_path, crear):
+    b = crear(tmp_path)
+    b.append_rows("componentes", pd.DataFrame({"id": [3], "nombre": ["a"]}))
+    # La cola todavía tiene filas hasta el 10: el contador arranca por encima
+    assert list(b.reserve_ids("componentes", 2, pendientes=lambda: 10)) == [11, 12]
+    # Solo se consulta al crear el contador
+    assert list(b.reserve_ids("componentes", 1, pendientes=lambda: 100)) == [13]
+
+
+def test_reserve_ids_no_queda_atras_de_ids_explicitos(tmp_path):
+    b = SQLiteBackend(str(tmp_path / "cmms.db"))
+    assert list(b.reserve_ids("componentes", 1)) == [1]
+    b.append_rows("componentes", pd.DataFrame({"id": [50], "nombre": ["importado"]}))
+    assert list(b.reserve_ids("componentes", 1)) == [51]
+
+
+# --- GOOGLE SHEETS: HOJA FALTANTE ---
+def test_gsheets_crea_hoja_faltante():
+    conn = ConexionMemoria({})
+    b = GSheetsBackend(conn=conn)
+    assert b.read_table("componentes").empty
+    b.append_rows("componentes", pd.DataFrame({"id": [1], "nombre": ["a"]}))
+    assert _ids(b.read_table("componentes")) == [1]
+
+
+# --- GOOGLE SHEETS: ESCRITURAS POR FILA ---
+def _hoja_gsheets(n, latencia=0.0):
+    conn = ConexionMemoria({"equipos": pd.DataFrame({"id": range(1, n + 1), "tag": [f"EQ-{i}" for i in range(1, n + 1)],
+                                                     "nombre": [f"n{i}" for i in range(1, n + 1)]})}, latencia=latencia)
+    return conn, GSheetsBackend(conn=conn)
+
+
+def test_gsheets_delete_en_una_llamada():
+    conn, b = _hoja_gsheets(10)
+    b.delete_rows("equipos", [2, 3, 4, 7, 10])
+    assert _ids(b.read_table("equipos")) == [1, 5, 6, 8, 9]
+    assert conn.contador["batch_update_libro"] == 1  # tres rangos, una llamada
+
+
+def test_read_keys_sin_bajar_la_hoja(tmp_path):
+    conn, b = _hoja_gsheets(3)
+    assert b.read_keys("equipos") == {"1", "2", "3"} and "read" not in conn.contador  # solo la columna clave
+    s = SQLiteBackend(str(tmp_path / "cmms.db"))
+    s.write_table("almacen", pd.DataFrame({"sku": ["R-1", None]}))
+    assert s.read_keys("almacen") == {"R-1"} and s.read_keys("equipos") == set()
+
+
+def test_gsheets_upsert_y_delete_concurrentes_no_cruzan_registros():
+    conn, b = _hoja_gsheets(60, latencia=0.0005)
+
+    def borrar():
+        for i in range(1, 61, 4): b.delete_rows("equipos", [i, i + 2])  # todos los impares
+
+    def editar(resto):
+        for i in range(2 + resto * 2, 61, 4): b.upsert_rows("equipos", _equipos((i, f"EQ-{i}", f"m{i}")))
+    hilos = [threading.Thread(target=borrar)] + [threading.Thread(target=editar, args=(r,)) for r in (0, 1)]
+    for h in hilos: h.start()
+    for h in hilos: h.join()
+    df = b.read_table("equipos")
+    df["id"] = pd.to_numeric(df["id"]).astype(int)
+    assert sorted(df["id"]) == list(range(2, 61, 2))
+    assert (df["tag"] == "EQ-" + df["id"].astype(str)).all()
+    assert (df["nombre"] == "m" + df["id"].astype(str)).all()
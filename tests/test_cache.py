@@ -0,0 +1,135 @@
+import threading
+import time
+import pandas as pd
+from utils.cache import SheetCache
+
+
+def _cargador(valores):
+    llamadas = []
+
+    def cargar():
+        llamadas.append(1)
+        return pd.DataFrame({"id": valores})
+    return cargar, llamadas
+
+
+def test_segunda_lectura_sale_del_cache():
+    cache = SheetCache(ttl=None)
+    cargar, llamadas = _cargador([1, 2])
+    cache.get("equipos", cargar)
+    df = cache.get("equipos", cargar)
+    assert len(llamadas) == 1
+    assert list(df["id"]) == [1, 2]
+    assert cache.stats()["hojas"]["equipos"] == {"hits": 1, "misses": 1, "version": 0}
+
+
+def test_copias_protegen_el_cache():
+    cache = SheetCache(ttl=None)
+    cargar, _ = _cargador([1, 2])
+    df = cache.get("equipos", cargar)
+    df.loc[0, "id"] = 99
+    assert list(cache.get("equipos", cargar)["id"]) == [1, 2]
+
+
+def test_invalidate_sube_version_y_fuerza_descarga():
+    cache = SheetCache(ttl=None)
+    cargar, llamadas = _cargador([1])
+    cache.get("equipos", cargar)
+    cache.get("sistemas", cargar)
+    cache.invalidate("equipos")
+    assert cache.version("equipos") == 1 and cache.version("sistemas") == 0
+    assert not cache.vigente("equipos") and cache.vigente("sistemas")
+    cache.get("equipos", cargar)
+    assert len(llamadas) == 3
+    cache.invalidate()  # todas
+    assert cache.version("equipos") == 2 and cache.version("sistemas") == 1
+
+
+def test_token_cambia_con_escrituras_y_recargas():
+    cache = SheetCache(ttl=None)
+    cargar, _ = _cargador([1])
+    t0 = cache.token("equipos")
+    cache.get("equipos", cargar)
+    t1 = cache.token("equipos")
+    cache.get("equipos", cargar)
+    assert t1 != t0 and cache.token("equipos") == t1  # un acierto no cambia el token
+    cache.actualizar("equipos", lambda df: df)
+    t2 = cache.token("equipos")
+    cache.invalidate("equipos")
+    cache.get("equipos", cargar)
+    assert len({t0, t1, t2, cache.token("equipos")}) == 4
+
+
+def test_actualizar_aplica_en_cache_sin_descargar():
+    cache = SheetCache(ttl=None)
+    cargar, llamadas = _cargador([1])
+    cache.get("equipos", cargar)
+    cache.actualizar("equipos", lambda df: pd.concat([df, pd.DataFrame({"id": [2]})], ignore_index=True))
+    assert cache.version("equipos") == 1
+    assert list(cache.get("equipos", cargar)["id"]) == [1, 2]
+    assert len(llamadas) == 1
+
+
+def test_actualizar_sin_datos_solo_invalida():
+    cache = SheetCache(ttl=None)
+    aplicada = []
+    cache.actualizar("equipos", lambda df: aplicada.append(1) or df)
+    assert not aplicada and cache.version("equipos") == 1 and not cache.vigente("equipos")
+
+
+def test_escritura_durante_la_descarga_no_guarda_datos_viejos():
+    cache = SheetCache(ttl=None)
+
+    def cargar():
+        cache.invalidate("equipos")  # otra sesión escribe mientras se descarga
+        return pd.DataFrame({"id": [1]})
+    cache.get("equipos", cargar)
+    assert not cache.vigente("equipos")
+
+
+def test_reemplazar_rechaza_version_vieja():
+    cache = SheetCache(ttl=None)
+    version = cache.version("equipos")
+    cache.actualizar("equipos", lambda df: df)
+    assert not cache.reemplazar("equipos", pd.DataFrame({"id": [1]}), version)
+    assert cache.reemplazar("equipos", pd.DataFrame({"id": [2]}), cache.version("equipos"))
+    assert list(cache.get("equipos", lambda: None)["id"]) == [2]
+
+
+def test_ttl_vencido_recarga():
+    cache = SheetCache(ttl=0.05)
+    cargar, llamadas = _cargador([1])
+    cache.get("equipos", cargar)
+    time.sleep(0.1)
+    cache.get("equipos", cargar)
+    assert len(llamadas) == 2
+
+
+def test_una_sola_descarga_concurrente():
+    cache = SheetCache(ttl=None)
+    llamadas = []
+
+    def cargar():
+        llamadas.append(1)
+        time.sleep(0.05)
+        return pd.DataFrame({"id": [1]})
+    hilos = [threading.Thread(target=cache.get, args=("equipos", cargar)) for _ in range(8)]
+    for h in hilos: h.start()
+    for h in hilos: h.join()
+    assert len(llamadas) == 1
+
+
+def test_refresco_en_segundo_plano_no_lo_pisa_la_carga_en_curso():
+    # Como _cargar_hoja: sirve la foto (vieja) y lanza la descarga, que termina antes que get()
+    cache = SheetCache(ttl=None)
+    hilo = []
+
+    def cargar():
+        v = cache.version("equipos")
+        hilo.append(threading.Thread(target=cache.reemplazar, args=("equipos", pd.DataFrame({"id": [1, 2]}), v)))
+        hilo[0].start()
+        time.sleep(0.05)
+        return pd.DataFrame({"id": [1]})
+    assert list(cache.get("equipos", cargar)["id"]) == [1]
+    hilo[0].join()
+    assert list(cache.get("equipos", cargar)["id"]) == [1, 2]
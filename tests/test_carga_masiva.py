@@ -0,0 +1,91 @@
+import io
+import json
+import pytest
+from openpyxl import Workbook
+from conftest import sembrar
+from utils import db_con
+from utils.carga_masiva import ImportacionActivos
+
+
+@pytest.fixture
+def maestros(entorno):
+    sembrar(entorno,
+            equipos=[{"id": 1, "tag": "EQ-1", "nombre": "Bomba", "planta": "P1", "area": "A1"}],
+            sistemas=[{"id": 1, "equipo_tag": "EQ-1", "nombre": "Motor Eléctrico"}],
+            sistemas_config=[{"id": 1, "nombre_sistema": "Motor Eléctrico"}, {"id": 2, "nombre_sistema": "Reductor"}],
+            familias_config=[{"id": 1, "nombre_familia": "Rodamiento", "sistema_asociado": "Motor Eléctrico", "config_json": "[]"},
+                             {"id": 2, "nombre_familia": "Engranaje", "sistema_asociado": "Reductor", "config_json": "[]"}])
+    return entorno
+
+
+def _excel(**hojas):
+    wb = Workbook()
+    wb.remove(wb.active)
+    for nombre, filas in hojas.items():
+        ws = wb.create_sheet(nombre)
+        for fila in filas: ws.append(fila)
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf
+
+
+ARCHIVO = dict(
+    equipos=[["TAG", "Nombre", "Planta", "Area"],
+             ["eq-2", "Molino", "P1", "A2"],       # 2: ok (el TAG se normaliza)
+             ["EQ-1", "Repetido", "P1", "A1"],     # 3: ya existe
+             ["EQ-2", "Otra vez", "P1", "A2"],     # 4: duplicado en el archivo
+             ["EQ-3", "", "P1", "A1"]],            # 5: falta nombre
+    sistemas=[["equipo_tag", "nombre"],
+              ["EQ-2", "reductor"],                # 2: ok -> "Reductor" del maestro
+              ["EQ-1", "MOTOR ELÉCTRICO"],         # 3: ya existe para EQ-1
+              ["EQ-9", "Reductor"],                # 4: equipo inexistente
+              ["EQ-2", "Bomba de vacío"]],         # 5: no está en sistemas_config
+    componentes=[["equipo_tag", "sistema", "nombre", "categoria", "cantidad", "Potencia"],
+                 ["EQ-2", "Reductor", "Piñón", "engranaje", 2, "5 kW"],    # 2: ok
+                 ["EQ-1", "Motor Eléctrico", "Rod. LA", "RODAMIENTO", None, None],  # 3: ok, cantidad 1
+                 ["EQ-1", "Motor Eléctrico", "Rod. LOA", "Engranaje", 1, None],     # 4: familia de otro sistema
+                 ["EQ-1", "Reductor", "Piñón", "Engranaje", 1, None],      # 5: EQ-1 no tiene reductor
+                 ["EQ-2", "Reductor", "Eje", "Engranaje", "dos", None],    # 6: cantidad inválida
+                 ["EQ-2", "Reductor", "Eje", "Engranaje", 0, None],        # 7: cantidad inválida
+                 ["EQ-2", "Reductor", "Eje", "Engranaje", 2.7, None]],     # 8: no entera (no se trunca)
+)
+
+
+def test_validacion_por_fila(maestros):
+    imp = ImportacionActivos().analizar(_excel(**ARCHIVO))
+    err = imp.df_errores()
+    assert set(zip(err["hoja"], err["fila"], err["error"])) == {
+        ("equipos", 3, "TAG ya existe en el sistema"),
+        ("equipos", 4, "TAG duplicado en el archivo"),
+        ("equipos", 5, "'nombre' es obligatorio"),
+        ("sistemas", 3, "Sistema duplicado para el equipo"),
+        ("sistemas", 4, "Equipo (TAG) no existe"),
+        ("sistemas", 5, "Sistema no está en sistemas_config"),
+        ("componentes", 4, "Familia no configurada en familias_config para ese sistema"),
+        ("componentes", 5, "Sistema no existe para ese equipo"),
+        ("componentes", 6, "Cantidad inválida"),
+        ("componentes", 7, "Cantidad inválida"),
+        ("componentes", 8, "Cantidad inválida"),
+    }
+    assert imp.resumen()["validas"] == {"equipos": 1, "sistemas": 1, "componentes": 2}
+
+
+def test_bloques_pequenos_dan_el_mismo_resultado(maestros):
+    grande = ImportacionActivos().analizar(_excel(**ARCHIVO))
+    chico = ImportacionActivos().analizar(_excel(**ARCHIVO), chunk=2)
+    assert chico.df_errores().reset_index(drop=True).equals(grande.df_errores().reset_index(drop=True))
+
+
+def test_confirmar_guarda_nombres_del_maestro_y_resuelve_padres(maestros):
+    ImportacionActivos().analizar(_excel(**ARCHIVO)).confirmar()
+    eq = db_con.get_data("equipos").set_index("tag")
+    assert eq.loc["EQ-2", "id"] == 2 and eq.loc["EQ-2", "criticidad"] == "Media" and eq.loc["EQ-2", "estado"] == "OK"
+    sis = db_con.get_data("sistemas").set_index("id")
+    assert sis.loc[2, "nombre"] == "Reductor" and sis.loc[2, "equipo_tag"] == "EQ-2"
+    comp = db_con.get_data("componentes").set_index("nombre")
+    assert comp.loc["Piñón", "sistema_id"] == 2 and comp.loc["Rod. LA", "sistema_id"] == 1
+    assert comp.loc["Piñón", "categoria"] == "Engranaje" and comp.loc["Rod. LA", "categoria"] == "Rodamiento"
+    assert comp.loc["Rod. LA", "cantidad"] == 1 and comp.loc["Piñón", "cantidad"] == 2
+    assert json.loads(comp.loc["Piñón", "specs_json"]) == {"Potencia": "5 kW"}
+    assert json.loads(comp.loc["Rod. LA", "specs_json"]) == {}
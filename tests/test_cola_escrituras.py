@@ -0,0 +1,128 @@
+import pandas as pd
+from utils.backends import SQLiteBackend
+from utils.cola_escrituras import Operacion, coalescer, ColaEscrituras
+
+
+def _df(*filas):
+    return pd.DataFrame([{"id": i, "nombre": n} for i, n in filas])
+
+
+def _secuencial(ops, df=None):
+    for op in ops: df = op.aplicar(df)
+    return df
+
+
+def _igual(a, b):
+    pd.testing.assert_frame_equal(a.reset_index(drop=True), b.reset_index(drop=True), check_dtype=False)
+
+
+BASE = _df((1, "a"), (2, "b"))
+
+
+def test_appends_seguidos_en_orden():
+    ops = [Operacion("append", "componentes", _df((3, "c")), ids=[1]), Operacion("append", "componentes", _df((4, "d")), ids=[2])]
+    res = coalescer(ops)
+    assert [op.tipo for op in res] == ["append"] and res[0].ids == [1, 2]
+    assert list(res[0].df["id"]) == [3, 4]
+    _igual(_secuencial(res, BASE), _secuencial(ops, BASE))
+
+
+def test_save_absorbe_lo_anterior_y_lo_posterior():
+    ops = [Operacion("append", "componentes", _df((9, "x")), ids=[1]),
+           Operacion("save", "componentes", BASE, ids=[2]),
+           Operacion("append", "componentes", _df((3, "c")), ids=[3]),
+           Operacion("upsert", "componentes", _df((1, "a2")), ids=[4]),
+           Operacion("delete", "componentes", valores=[2], ids=[5])]
+    res = coalescer(ops)
+    assert [op.tipo for op in res] == ["save"] and res[0].ids == [1, 2, 3, 4, 5]
+    assert list(res[0].df["id"]) == [1, 3] and res[0].df["nombre"].iloc[0] == "a2"
+    _igual(_secuencial(res), _secuencial(ops))
+
+
+def test_upsert_de_filas_recien_agregadas_se_funde_en_el_append():
+    ops = [Operacion("append", "componentes", _df((3, "c"), (4, "d")), ids=[1]),
+           Operacion("upsert", "componentes", _df((4, "d2")), ids=[2])]
+    res = coalescer(ops)
+    assert [op.tipo for op in res] == ["append"]
+    assert list(res[0].df["nombre"]) == ["c", "d2"]
+
+
+def test_upsert_de_fila_existente_no_se_funde():
+    ops = [Operacion("append", "componentes", _df((3, "c")), ids=[1]),
+           Operacion("upsert", "componentes", _df((1, "a2")), ids=[2])]
+    res = coalescer(ops)
+    assert [op.tipo for op in res] == ["append", "upsert"]
+    _igual(_secuencial(res, BASE), _secuencial(ops, BASE))
+
+
+def test_upserts_seguidos_gana_el_ultimo():
+    ops = [Operacion("upsert", "componentes", _df((1, "a2"), (2, "b2")), ids=[1]),
+           Operacion("upsert", "componentes", _df((1, "a3")), ids=[2])]
+    res = coalescer(ops)
+    assert [op.tipo for op in res] == ["upsert"]
+    assert list(_secuencial(res, BASE)["nombre"]) == ["a3", "b2"]
+    _igual(_secuencial(res, BASE), _secuencial(ops, BASE))
+
+
+def test_deletes_seguidos_y_orden_respetado():
+    ops = [Operacion("delete", "componentes", valores=[1], ids=[1]),
+           Operacion("delete", "componentes", valores=[2], ids=[2]),
+           Operacion("append", "componentes", _df((1, "nuevo")), ids=[3]),
+           Operacion("delete", "componentes", valores=[1], ids=[4])]
+    res = coalescer(ops)
+    # El append no puede saltar sobre los deletes que lo rodean
+    assert [op.tipo for op in res] == ["delete", "append", "delete"]
+    assert res[0].valores == [1, 2]
+    _igual(_secuencial(res, BASE), _secuencial(ops, BASE))
+
+
+def test_cola_sube_en_orden(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cmms.db"))
+    ruta = str(tmp_path / "cola.db")
+    cola = ColaEscrituras(lambda: backend, path=ruta, demora=0.01)
+    cola.encolar("append", "componentes", _df((1, "a")))
+    cola.encolar("upsert", "componentes", _df((1, "a2")))
+    cola.encolar("append", "componentes", _df((2, "b")))
+    assert cola.vaciar(timeout=10)
+    assert list(backend.read_table("componentes")["nombre"]) == ["a2", "b"]
+    assert cola.estado()["profundidad"] == 0 and cola.stats["subidas"] == 3
+
+
+def test_max_id_de_pendientes(tmp_path):
+    class Caido:
+        def append_rows(self, *a): raise RuntimeError("sin red")
+    cola = ColaEscrituras(lambda: Caido(), path=str(tmp_path / "cola.db"), demora=60)
+    cola.encolar("append", "componentes", _df((5, "a"), (12, "b")))
+    assert cola.max_id("componentes") == 12 and cola.max_id("sistemas") == 0
+    # Una cola nueva sobre el mismo archivo recupera lo pendiente
+    assert [op.tipo for op in ColaEscrituras(lambda: Caido(), path=str(tmp_path / "cola.db"), demora=60).pendientes("componentes")] == ["append"]
+
+
+def test_append_restaurado_que_ya_habia_llegado_no_se_duplica(tmp_path):
+    class Caido:
+        def append_rows(self, *a): raise RuntimeError("sin red")
+    ruta = str(tmp_path / "cola.db")
+    ColaEscrituras(lambda: Caido(), path=ruta, demora=60).encolar("append", "componentes", _df((1, "a"), (2, "b")))
+    backend = SQLiteBackend(str(tmp_path / "cmms.db"))
+    backend.append_rows("componentes", _df((1, "a")))  # subió, pero el proceso cayó antes de sacarla del spill
+    assert ColaEscrituras(lambda: backend, path=ruta, demora=0.01).vaciar(timeout=10)
+    assert list(backend.read_table("componentes")["id"]) == [1, 2]
+
+
+def test_reintento_de_append_que_llego_con_timeout(tmp_path, monkeypatch):
+    from utils import cola_escrituras
+    monkeypatch.setattr(cola_escrituras, "ESPERA_BASE", 0.01)
+
+    class Lento(SQLiteBackend):
+        fallos = 1
+
+        def append_rows(self, tabla, df):
+            super().append_rows(tabla, df)
+            if self.fallos:
+                self.fallos -= 1
+                raise TimeoutError("la respuesta no llegó")
+    backend = Lento(str(tmp_path / "cmms.db"))
+    cola = ColaEscrituras(lambda: backend, path=str(tmp_path / "cola.db"), demora=0.01)
+    cola.encolar("append", "componentes", _df((1, "a"), (2, "b")))
+    assert cola.vaciar(timeout=10)
+    assert list(backend.read_table("componentes")["id"]) == [1, 2] and cola.stats["reintentos"] == 1
@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+from conftest import sembrar
+from utils import db_con
+from utils import jerarquia
+
+
+@pytest.fixture
+def planta(entorno):
+    sembrar(entorno,
+            equipos=[{"id": 1, "tag": "EQ-1", "nombre": "Bomba", "planta": "P1", "area": "A1"}],
+            sistemas=[{"id": 1, "equipo_tag": "EQ-1", "nombre": "Motor"}],
+            componentes=[{"id": 1, "sistema_id": 1, "nombre": "Rodamiento", "categoria": "RODAMIENTO", "repuesto_sku": "R-1"}],
+            almacen=[{"sku": "R-1", "descripcion": "Rodamiento 6205", "stock_actual": 2}])
+    return entorno
+
+
+def escribir_durante_la_carga(monkeypatch, modulo, funcion, escribir):
+    """
+    La primera carga de 'modulo' termina y, antes de que lea la clave, otra sesión escribe y vuelve a leer
+    la hoja (queda en caché con la versión nueva).
+    """
+    original = getattr(modulo, funcion)
+    hecho = []
+
+    def _cargar(*a, **kw):
+        datos = original(*a, **kw)
+        if not hecho:
+            hecho.append(1)
+            escribir()
+        return datos
+    monkeypatch.setattr(modulo, funcion, _cargar)
+
+
+def _editar(hoja, fila, key=None):
+    db_con.update_rows(pd.DataFrame([fila]), hoja, key=key)
+    db_con.get_data(hoja)
+
+
+def test_indice_activos_no_publica_datos_viejos(planta, monkeypatch):
+    escribir_durante_la_carga(monkeypatch, jerarquia, "get_many",
+                              lambda: _editar("equipos", {"id": 1, "nombre": "Bomba 2"}))
+    assert jerarquia.indice_activos().equipo("EQ-1")["nombre"] == "Bomba"  # la lectura en curso
+    assert jerarquia.indice_activos().equipo("EQ-1")["nombre"] == "Bomba 2"
+
+
+def test_indice_almacen_no_publica_datos_viejos(planta, monkeypatch):
+    from utils import busqueda
+    escribir_durante_la_carga(monkeypatch, busqueda, "get_data",
+                              lambda: _editar("almacen", {"sku": "R-2", "descripcion": "Sello mecánico"}))
+    assert busqueda.indice_almacen().resultados("sello").empty
+    assert busqueda.indice_almacen().resultados("sello")["sku"].tolist() == ["R-2"]
+
+
+def test_indice_bom_no_publica_datos_viejos(planta, monkeypatch):
+    from utils import bom
+    escribir_durante_la_carga(monkeypatch, bom, "indice_activos",
+                              lambda: _editar("componentes", {"id": 1, "repuesto_sku": "R-2"}))
+    assert bom.indice_bom().donde_se_usa("R-2").empty
+    assert bom.indice_bom().donde_se_usa("R-2")["componente_id"].tolist() == [1]
+
+
+def test_indice_specs_no_publica_datos_viejos(planta, monkeypatch):
+    from utils import especificaciones
+    escribir_durante_la_carga(monkeypatch, especificaciones, "indice_activos",
+                              lambda: _editar("componentes", {"id": 1, "specs_json": '{"Potencia": "50"}'}))
+    assert not len(especificaciones.indice_specs().filtrar([("Potencia", ">", 10)]))
+    assert list(especificaciones.indice_specs().filtrar([("Potencia", ">", 10)])) == [1]
+
+
+def test_registro_familias_no_publica_datos_viejos(planta, monkeypatch):
+    from utils import familias
+    sembrar(planta, familias_config=[{"id": 1, "nombre_familia": "RODAMIENTO", "sistema_asociado": "MOTOR", "config_json": "[]"}])
+    escribir_durante_la_carga(monkeypatch, familias, "get_data",
+                              lambda: _editar("familias_config", {"id": 1, "config_json": '[{"nombre": "Diámetro", "unidad": "mm"}]'}))
+    assert familias.registro_familias().get("RODAMIENTO", "MOTOR").campos == []
+    assert [c.nombre for c in familias.registro_familias().get("RODAMIENTO", "MOTOR").campos] == ["Diámetro"]
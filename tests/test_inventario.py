@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import sembrar
+from utils import db_con
+from utils.inventario import registrar_movimiento, registrar_movimientos, saldo, conciliar, kardex, _kardex
+
+
+@pytest.fixture
+def almacen(entorno):
+    sembrar(entorno, almacen=[{"sku": "R-1", "descripcion": "Rodamiento 6205", "stock_actual": 0, "precio_promedio": 0},
+                              {"sku": "R-2", "descripcion": "Sello", "stock_actual": 4, "precio_promedio": 3.0}])
+    return entorno
+
+
+def test_costo_promedio_ponderado(almacen):
+    registrar_movimiento("R-1", "ENTRADA", 10, 5.0)
+    registrar_movimiento("r-1 ", "entrada", 30, 9.0)  # SKU y tipo se normalizan
+    assert saldo("R-1") == (40.0, 8.0)  # (10*5 + 30*9) / 40
+    registrar_movimiento("R-1", "SALIDA", 15, componente_id=3, orden_trabajo="OT-1")
+    assert saldo("R-1") == (25.0, 8.0)  # la salida no cambia el promedio
+    registrar_movimiento("R-1", "AJUSTE", -5)
+    registrar_movimiento("R-1", "ENTRADA", 20, 10.0)
+    assert saldo("R-1") == (40.0, 9.0)  # (20*8 + 20*10) / 40
+    assert list(kardex("R-1")["saldo"]) == [40, 20, 25, 40, 10]
+
+
+def test_saldo_inicial_antes_del_kardex(almacen):
+    registrar_movimiento("R-2", "ENTRADA", 4, 5.0)
+    assert saldo("R-2") == (8.0, 4.0)
+    mov = kardex("R-2").sort_values("id")
+    assert mov["responsable"].tolist() == ["SALDO INICIAL", ""]
+    assert db_con.get_data("almacen").set_index("sku").loc["R-2", "en_kardex"] == 1
+    registrar_movimiento("R-2", "SALIDA", 1)
+    assert len(kardex("R-2")) == 3  # la apertura se asienta una sola vez
+
+
+def test_stock_insuficiente_no_escribe(almacen):
+    with pytest.raises(ValueError, match="Stock insuficiente"):
+        registrar_movimiento("R-1", "SALIDA", 1)
+    assert kardex().empty and saldo("R-1") == (0.0, 0.0)
+
+
+@pytest.mark.parametrize("sku, tipo, cantidad, costo, error", [
+    ("R-9", "ENTRADA", 1, 1.0, "SKU inexistente"),
+    ("R-1", "PRESTAMO", 1, 1.0, "Tipo de movimiento"),
+    ("R-1", "SALIDA", -1, None, "Cantidad inválida"),
+    ("R-1", "ENTRADA", 1, None, "costo unitario"),
+])
+def test_validaciones(almacen, sku, tipo, cantidad, costo, error):
+    with pytest.raises(ValueError, match=error):
+        registrar_movimiento(sku, tipo, cantidad, costo)
+
+
+def test_conciliar_coincide_con_lo_materializado(almacen):
+    registrar_movimientos(pd.DataFrame({"sku": ["R-1", "R-2", "R-1", "R-1"], "tipo": ["ENTRADA", "SALIDA", "ENTRADA", "SALIDA"],
+                                        "cantidad": [10, 2, 10, 5], "costo_unitario": [2.0, None, 4.0, None]}))
+    assert saldo("R-1") == (15.0, 3.0) and saldo("R-2") == (2.0, 3.0)
+    assert conciliar(aplicar=False).empty
+    db_con.update_rows(pd.DataFrame({"sku": ["R-1"], "stock_actual": [99]}), "almacen")  # edición a mano
+    dif = conciliar()
+    assert dif["sku"].tolist() == ["R-1"] and saldo("R-1") == (15.0, 3.0)
+
+
+def test_kardex_vectorizado_igual_a_recorrer_fila_por_fila():
+    rng = np.random.default_rng(0)
+    n = 300
+    mov = pd.DataFrame({"sku": rng.choice(["A", "B", "C"], n), "tipo": rng.choice(["ENTRADA", "SALIDA", "AJUSTE"], n, p=[0.5, 0.3, 0.2]),
+                        "cantidad": rng.integers(1, 20, n).astype(float), "costo_unitario": rng.uniform(1, 50, n).round(2)})
+    mov["id"] = np.arange(n)
+    mov = mov.sort_values(["sku", "id"], kind="stable").reset_index(drop=True)
+    inicial = pd.DataFrame({"stock_actual": [5.0, 0.0], "precio_promedio": [2.0, 0.0]}, index=["A", "B"])
+    saldos, promedios = _kardex(mov, inicial)
+
+    stock = {"A": 5.0, "B": 0.0, "C": 0.0}; prom = {"A": 2.0, "B": 0.0, "C": 0.0}
+    for i, m in mov.iterrows():
+        signo = -1 if m["tipo"] == "SALIDA" else 1
+        antes = stock[m["sku"]]; stock[m["sku"]] = antes + signo * m["cantidad"]
+        if m["tipo"] == "ENTRADA":
+            despues = stock[m["sku"]]
+            prom[m["sku"]] = (max(antes, 0) * prom[m["sku"]] + m["cantidad"] * m["costo_unitario"]) / despues if despues > 0 else m["costo_unitario"]
+        assert saldos[i] == pytest.approx(stock[m["sku"]])
+        assert promedios[i] == pytest.approx(prom[m["sku"]])
+
+
+def test_saldo_se_repara_si_falla_la_segunda_escritura(almacen, monkeypatch):
+    from utils import inventario
+    registrar_movimiento("R-1", "ENTRADA", 10, 5.0)
+    original = inventario.update_rows
+
+    def _caida(df, hoja, key=None):
+        monkeypatch.setattr(inventario, "update_rows", original)
+        raise ConnectionError("sin red")
+    monkeypatch.setattr(inventario, "update_rows", _caida)
+    with pytest.raises(ConnectionError):
+        registrar_movimiento("R-1", "SALIDA", 4)  # el kardex quedó escrito, el saldo no
+    assert saldo("R-1") == (10.0, 5.0)
+    registrar_movimiento("R-1", "SALIDA", 1)
+    assert saldo("R-1") == (5.0, 5.0) and list(kardex("R-1")["saldo"]) == [5, 6, 10]
+    assert conciliar(aplicar=False).empty
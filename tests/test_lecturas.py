@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+from conftest import sembrar
+from utils import db_con
+
+
+def _lecturas(*ids):
+    return [{"id": i, "componente_id": 1, "fecha": "2026-01-05", "hora": f"08:{i:02d}", "parametro": "Temperatura (°C)",
+             "valor": 50 + i, "tecnico": "JP"} for i in ids]
+
+
+@pytest.fixture
+def pedidos(entorno, monkeypatch):
+    """Registra cada lectura incremental que db_con le pide al backend: (desde, filas devueltas)."""
+    original, vistos = entorno.read_rows_after, []
+
+    def _leer(tabla, desde, key="id"):
+        df = original(tabla, desde, key)
+        vistos.append((desde, len(df)))
+        return df
+    monkeypatch.setattr(entorno, "read_rows_after", _leer)
+    return vistos
+
+
+def test_sqlite_lee_solo_filas_posteriores(entorno):
+    sembrar(entorno, lecturas=_lecturas(1, 2, 3) + [{"componente_id": 1, "parametro": "Ruido (dB)", "valor": 60}])
+    assert entorno.read_rows_after("lecturas", 2)["id"].tolist() == [3]
+    assert len(entorno.read_rows_after("lecturas", None)) == 4  # la primera vez, también las filas sin id
+
+
+def test_sincronizar_trae_lo_nuevo_sin_pasar_por_el_cache(entorno, pedidos):
+    sembrar(entorno, lecturas=_lecturas(1, 2, 3))
+    assert db_con.sincronizar_lecturas(forzar=True) == 3
+    entorno.append_rows("lecturas", pd.DataFrame(_lecturas(4, 5)))  # otra instancia
+    assert db_con.sincronizar_lecturas(forzar=True) == 2
+    assert pedidos == [(None, 3), (3 - db_con.VENTANA_SYNC, 5)]
+    assert db_con.get_lecturas_store().total() == 5
+    assert not db_con.get_cache().vigente("lecturas")  # la réplica es la copia; la hoja no queda en memoria
+
+
+def test_guardar_propio_no_vuelve_a_bajar(entorno, pedidos):
+    db_con.get_lecturas_store()
+    db_con.guardar_lecturas(pd.DataFrame({"componente_id": [1], "parametro": ["Temperatura (°C)"], "valor": [70],
+                                          "ts": [pd.Timestamp("2026-01-05 08:00")]}))
+    db_con.get_lecturas_store()
+    assert len(pedidos) == 1 and db_con.get_lecturas_store().total() == 1
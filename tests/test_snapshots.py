@@ -0,0 +1,80 @@
+import time
+import pandas as pd
+import pytest
+from conftest import sembrar
+from utils import db_con
+from utils.esquemas import aplicar_esquema
+
+pytest.importorskip("pyarrow")
+from utils.snapshots import SnapshotStore  # noqa: E402
+
+
+class SinRed:
+    """Backend que envuelve a otro y puede dejar de responder (red caída)."""
+
+    def __init__(self, backend):
+        self.backend, self.caido, self.lecturas = backend, False, 0
+
+    def read_table(self, tabla):
+        self.lecturas += 1
+        if self.caido: raise ConnectionError("sin red")
+        return self.backend.read_table(tabla)
+
+
+def _esperar(hoja, origen, timeout=5.0):
+    limite = time.monotonic() + timeout
+    while db_con.origen_datos().get(hoja, (None,))[0] != origen:
+        if time.monotonic() > limite: raise AssertionError(f"{hoja}: {db_con.origen_datos().get(hoja)} != {origen}")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def fotos(entorno, tmp_path):
+    sembrar(entorno, equipos=[{"id": 1, "tag": "EQ-1", "nombre": "Bomba", "planta": "P1", "area": "A1"}])
+    store = SnapshotStore(str(tmp_path / "fotos"))
+    red = SinRed(entorno)
+    db_con.set_backend(red)
+    db_con.set_snapshots(store)
+    return store, red
+
+
+def test_primera_carga_guarda_la_foto(fotos):
+    store, _ = fotos
+    assert db_con.get_data("equipos")["tag"].tolist() == ["EQ-1"]
+    assert db_con.origen_datos()["equipos"][0] == "red"
+    limite = time.monotonic() + 5
+    while store.cargar("equipos") is None and time.monotonic() < limite: time.sleep(0.01)
+    assert store.cargar("equipos")[0]["tag"].tolist() == ["EQ-1"]
+
+
+def test_arranque_desde_la_foto_y_refresco_en_segundo_plano(fotos):
+    store, _ = fotos
+    store.guardar("equipos", aplicar_esquema("equipos", pd.DataFrame({"id": [1], "tag": ["EQ-VIEJO"]})))
+    assert db_con.get_data("equipos")["tag"].tolist() == ["EQ-VIEJO"]  # al instante, sin esperar la red
+    _esperar("equipos", "red")
+    assert db_con.get_data("equipos")["tag"].tolist() == ["EQ-1"]
+
+
+def test_sin_red_al_arrancar_sigue_la_foto(fotos):
+    store, red = fotos
+    store.guardar("equipos", aplicar_esquema("equipos", pd.DataFrame({"id": [1], "tag": ["EQ-1"]})))
+    red.caido = True
+    assert db_con.get_data("equipos")["tag"].tolist() == ["EQ-1"]
+    _esperar("equipos", "sin_red")
+
+
+def test_backend_caido_despues_sirve_la_foto(fotos):
+    store, red = fotos
+    db_con.get_data("equipos")
+    limite = time.monotonic() + 5
+    while store.cargar("equipos") is None and time.monotonic() < limite: time.sleep(0.01)
+    red.caido = True
+    db_con.invalidate_cache("equipos")
+    assert db_con.get_data("equipos")["tag"].tolist() == ["EQ-1"]
+    assert db_con.origen_datos()["equipos"][0] == "sin_red"
+
+
+def test_sin_foto_y_sin_red_hoja_vacia(fotos):
+    _, red = fotos
+    red.caido = True
+    assert db_con.get_data("equipos").empty
@@ -0,0 +1,14 @@
+from modules.gestion_activos import formatear_specs_html_ejecutivo, html_componente
+
+
+def test_specs_se_escapan():
+    html = formatear_specs_html_ejecutivo('{"<b>Potencia</b>": "<img src=x onerror=alert(1)>"}')
+    assert "<img" not in html and "<b>" not in html
+    assert "&lt;img src=x onerror=alert(1)&gt;" in html and "&lt;b&gt;Potencia&lt;/b&gt;" in html
+
+
+def test_tarjeta_memorizada_tambien_escapada():
+    c = {"nombre": "Motor <x>", "categoria": "MOTOR", "marca": "ABB", "modelo": "M3", "specs_json": '{"RPM": "<script>1</script>"}'}
+    html = html_componente(c)
+    assert html == html_componente(dict(c))  # segunda vez sale de la memoria
+    assert "<script>" not in html and "Motor &lt;x&gt;" in html
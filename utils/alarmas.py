@@ -0,0 +1,156 @@
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+from utils.db_con import get_data, get_lecturas_store, update_rows
+from utils.esquemas import aplicar_esquema
+from utils.jerarquia import indice_activos
+from utils.perfil import perfilar
+
+# --- LÍMITES POR DEFECTO ---
+# Vibración: zonas de severidad ISO 10816 (mm/s RMS) según clase de máquina.
+#   Bordes A/B, B/C, C/D. Alerta = entrada a zona C; Peligro = entrada a zona D.
+ZONAS_ISO_10816 = {
+    "I": (0.71, 1.8, 4.5),     # máquinas pequeñas (< 15 kW)
+    "II": (1.12, 2.8, 7.1),    # medianas (15-75 kW)
+    "III": (1.8, 4.5, 11.2),   # grandes sobre base rígida
+    "IV": (2.8, 7.1, 18.0),    # grandes sobre base flexible
+}
+CLASE_ISO = os.environ.get("CMMS_ISO_CLASE", "II").upper()
+_ZONAS = ZONAS_ISO_10816.get(CLASE_ISO, ZONAS_ISO_10816["II"])
+LIMITES_DEFECTO = {
+    "Vibración (mm/s)": (_ZONAS[1], _ZONAS[2]),
+    "Temperatura (°C)": (80.0, 95.0),
+    "Ruido (dB)": (85.0, 100.0),
+}
+
+# Precedencia: límite del componente > límite de la familia (categoria) > defecto
+NIVELES = {0: "OK", 1: "ALERTA", 2: "PELIGRO"}
+ESTADOS_ALARMA = {"ALERTA", "PELIGRO"}
+LOTE = 200000
+_LOCK = threading.Lock()
+
+
+def limites_vigentes():
+    """Hoja limites_alarma separada en límites por componente y por familia (sin duplicados)."""
+    lim = get_data("limites_alarma")
+    if lim.empty: lim = aplicar_esquema("limites_alarma", pd.DataFrame())
+    por_comp = lim[lim["componente_id"].notna()][["componente_id", "parametro", "alerta", "peligro"]]
+    por_fam = lim[lim["componente_id"].isna() & (lim["familia"] != "")][["familia", "parametro", "alerta", "peligro"]]
+    por_comp = por_comp.astype({"componente_id": "int64"}).drop_duplicates(["componente_id", "parametro"], keep="last")
+    return por_comp, por_fam.drop_duplicates(["familia", "parametro"], keep="last")
+
+
+def _niveles(df, idx, por_comp, por_fam):
+    """Agrega alerta/peligro/nivel a un lote de lecturas (todo con joins y máscaras, sin bucles por fila)."""
+    cat = idx.df_comp["categoria"]
+    familias = pd.Series(cat.astype(object).where(cat.notna(), "").astype(str).str.upper().to_numpy(), index=idx.df_comp["id"].to_numpy())
+    familias = familias[~familias.index.duplicated()]
+    df = df.assign(familia=df["componente_id"].map(familias).fillna(""))
+    df = df.merge(por_comp, on=["componente_id", "parametro"], how="left")
+    df = df.merge(por_fam, on=["familia", "parametro"], how="left", suffixes=("", "_fam"))
+    for col, pos in (("alerta", 0), ("peligro", 1)):
+        defecto = df["parametro"].map({p: v[pos] for p, v in LIMITES_DEFECTO.items()})
+        df[col] = df[col].fillna(df[f"{col}_fam"]).fillna(defecto)
+    valor = df["valor"].to_numpy(dtype="float64")
+    # NaN en valor o límite compara False -> nivel 0
+    df["nivel"] = np.select([valor >= df["peligro"].to_numpy(), valor >= df["alerta"].to_numpy()], [2, 1], 0)
+    return df.drop(columns=["familia", "alerta_fam", "peligro_fam"])
+
+
+def _evaluar_lote(lote, estado, idx, por_comp, por_fam):
+    """Devuelve (estado nuevo de los grupos tocados, eventos) para un lote de lecturas ordenado por id."""
+    claves = ["componente_id", "parametro"]
+    df = _niveles(lote, idx, por_comp, por_fam).sort_values(claves + ["ts", "id"], kind="stable")
+    previo = estado[claves + ["nivel", "ts", "desde"]].rename(columns={"nivel": "nivel_previo", "ts": "ts_previo", "desde": "desde_previo"})
+    df = df.merge(previo, on=claves, how="left")
+    # Lecturas cargadas tarde (más viejas que el estado actual) no cambian el estado
+    df = df[df["ts_previo"].isna() | (df["ts"] >= df["ts_previo"])]
+    if df.empty: return estado.iloc[0:0], pd.DataFrame()
+
+    anterior = df.groupby(claves, sort=False)["nivel"].shift(1)
+    df["nivel_anterior"] = anterior.fillna(df["nivel_previo"]).fillna(0).astype("int64")
+    cambio = df["nivel"] != df["nivel_anterior"]
+    eventos = df[cambio].rename(columns={"id": "lectura_id"})
+
+    ultimo = df.groupby(claves, sort=False).tail(1).set_index(claves)
+    desde = eventos.groupby(claves)["ts"].last() if not eventos.empty else pd.Series(dtype="datetime64[ns]")
+    primero = df.groupby(claves, sort=False)["ts"].first()
+    ultimo["desde"] = desde.reindex(ultimo.index).fillna(ultimo["desde_previo"]).fillna(primero.reindex(ultimo.index))
+    nuevo = ultimo.reset_index().rename(columns={"id": "lectura_id"})
+    return nuevo, eventos
+
+
+def _sincronizar_equipos(estado, idx):
+    """El peor nivel de los componentes de cada equipo define su estado (ALERTA / PELIGRO / OK)."""
+    df_eq = idx.df_eq
+    if df_eq.empty: return 0
+    peor = estado.groupby("componente_id")["nivel"].max() if not estado.empty else pd.Series(dtype="int64")
+    comp = idx.df_comp[["id", "sistema_id"]].rename(columns={"id": "componente_id"})
+    comp = comp.merge(idx.df_sys[["id", "equipo_tag"]].rename(columns={"id": "sistema_id"}), on="sistema_id", how="inner")
+    comp["nivel"] = comp["componente_id"].map(peor).fillna(0)
+    nivel_eq = comp.groupby("equipo_tag")["nivel"].max()
+
+    nivel = df_eq["tag"].map(nivel_eq).fillna(0).astype("int64")
+    actual = df_eq["estado"]
+    nuevo = nivel.map(NIVELES)
+    # Solo se toca el estado si hay alarma o si hay que limpiar una alarma anterior (no pisa estados manuales)
+    cambia = ((nivel > 0) | actual.isin(ESTADOS_ALARMA)) & (actual != nuevo) & df_eq["id"].notna()
+    if not cambia.any(): return 0
+    update_rows(pd.DataFrame({"id": df_eq.loc[cambia, "id"], "estado": nuevo[cambia]}), "equipos")
+    return int(cambia.sum())
+
+
+@perfilar("evaluar_alarmas")
+def evaluar_alarmas(completo=False):
+    """
+    Evalúa las lecturas aún no evaluadas (las que entraron a la réplica desde la última pasada, aunque su id
+    sea menor que uno ya procesado) y actualiza el estado de alarmas y de los equipos.
+    completo=True reevalúa toda la historia (usar tras cambiar límites).
+    """
+    t0 = time.perf_counter()
+    store = get_lecturas_store()
+    with _LOCK:
+        if completo: store.reiniciar_alarmas()
+        idx = indice_activos()
+        por_comp, por_fam = limites_vigentes()
+        estado = store.estado_alarmas()
+        leidas = n_eventos = 0
+        while True:
+            lote = store.por_evaluar(LOTE)
+            if lote.empty: break
+            nuevo, eventos = _evaluar_lote(lote, estado, idx, por_comp, por_fam)
+            store.guardar_alarmas(nuevo, eventos, lote["id"])
+            if not nuevo.empty:
+                claves = ["componente_id", "parametro"]
+                estado = pd.concat([estado.set_index(claves).drop(nuevo.set_index(claves).index, errors="ignore").reset_index(), nuevo[estado.columns]], ignore_index=True)
+            leidas += len(lote); n_eventos += len(eventos)
+        equipos = _sincronizar_equipos(estado, idx) if (leidas or completo) else 0
+    return {"lecturas": leidas, "eventos": n_eventos, "activas": int((estado["nivel"] > 0).sum()) if not estado.empty else 0,
+            "equipos_actualizados": equipos, "segundos": round(time.perf_counter() - t0, 3)}
+
+
+def _con_nombres(df, idx):
+    comp = idx.df_comp[["id", "sistema_id", "nombre", "categoria"]].rename(columns={"id": "componente_id", "nombre": "componente"})
+    sis = idx.df_sys[["id", "equipo_tag"]].rename(columns={"id": "sistema_id"})
+    eq = idx.df_eq[["tag", "nombre", "planta", "area"]].rename(columns={"tag": "equipo_tag", "nombre": "equipo"})
+    return df.merge(comp, on="componente_id", how="left").merge(sis, on="sistema_id", how="left").merge(eq, on="equipo_tag", how="left")
+
+
+def alarmas_activas():
+    """Alarmas vigentes (nivel > 0) con planta/área/equipo/componente, las más graves primero."""
+    estado = get_lecturas_store().estado_alarmas()
+    activas = estado[estado["nivel"] > 0]
+    if activas.empty: return activas
+    df = _con_nombres(activas, indice_activos()).sort_values(["nivel", "desde"], ascending=[False, True])
+    df["nivel"] = df["nivel"].map(NIVELES)
+    return df
+
+
+def historial_alarmas(limite=500):
+    ev = get_lecturas_store().eventos_alarma(limite)
+    if ev.empty: return ev
+    df = _con_nombres(ev, indice_activos())
+    df["nivel_anterior"] = df["nivel_anterior"].map(NIVELES); df["nivel"] = df["nivel"].map(NIVELES)
+    return df
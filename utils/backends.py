@@ -0,0 +1,464 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import rowcol_to_a1
+from utils.esquemas import ESQUEMAS
+
+# --- ESQUEMA BASE (columnas conocidas por hoja) ---
+TABLAS = {hoja: list(cols) for hoja, cols in ESQUEMAS.items()}
+
+# Clave primaria por hoja (por defecto "id")
+CLAVES = {"almacen": "sku"}
+
+# Índices reales (solo SQLite)
+INDICES = {
+    "equipos": ["tag"],
+    "sistemas": ["equipo_tag"],
+    "componentes": ["sistema_id", "repuesto_sku"],
+    "lecturas": ["componente_id"],
+    "movimientos": ["sku"],
+}
+
+# SQLite no conoce los tipos de numpy/pandas
+sqlite3.register_adapter(np.int64, int)
+sqlite3.register_adapter(np.int32, int)
+sqlite3.register_adapter(np.bool_, bool)
+sqlite3.register_adapter(pd.Timestamp, lambda ts: ts.isoformat())
+
+
+def clave_de(tabla):
+    return CLAVES.get(tabla, "id")
+
+
+def normalizar_clave(serie):
+    """Claves comparables entre backends: 5, 5.0 y '5' son la misma fila."""
+    return serie.astype(str).str.replace(r"\.0$", "", regex=True).str.strip()
+
+
+def max_id(df, key="id"):
+    if df is None or df.empty or key not in df.columns: return 0
+    m = pd.to_numeric(df[key], errors="coerce").max()
+    return 0 if pd.isna(m) else int(m)
+
+
+def combinar_por_clave(actual, nuevos, key):
+    """Upsert en memoria: reemplaza las filas con la misma clave y agrega las demás."""
+    if actual is None or actual.empty: return nuevos.reset_index(drop=True)
+    df = actual.astype(object)
+    for c in nuevos.columns:
+        if c not in df.columns: df[c] = None
+    pos = {k: i for i, k in enumerate(normalizar_clave(df[key]))}
+    cols = list(nuevos.columns)
+    agregar = []
+    for j, k in enumerate(normalizar_clave(nuevos[key])):
+        i = pos.get(k)
+        if i is None: agregar.append(j)
+        else: df.loc[df.index[i], cols] = nuevos.iloc[j].values
+    if agregar: df = pd.concat([df, nuevos.iloc[agregar]], ignore_index=True)
+    return df
+
+
+class StorageBackend:
+    """
+    Interfaz de almacenamiento que usa utils.db_con.
+    Cada hoja de cálculo es una 'tabla'; las páginas nunca hablan con el backend directamente.
+    """
+    nombre = "base"
+
+    def read_table(self, tabla):
+        raise NotImplementedError
+
+    def write_table(self, tabla, df):
+        """Reemplaza la tabla completa."""
+        raise NotImplementedError
+
+    def read_rows_after(self, tabla, desde, key="id"):
+        """
+        Filas con key > desde (desde=None: la tabla completa, incluidas las filas sin key).
+        Por defecto lee todo y filtra en memoria; un backend que puede filtrar en el origen lo sobreescribe.
+        """
+        df = self.read_table(tabla)
+        if desde is None or df.empty or key not in df.columns: return df
+        return df[pd.to_numeric(df[key], errors="coerce") > desde].reset_index(drop=True)
+
+    def append_rows(self, tabla, df):
+        raise NotImplementedError
+
+    def read_keys(self, tabla, key=None):
+        """Claves (normalizadas) que ya están en la tabla. Por defecto lee la tabla completa."""
+        key = key or clave_de(tabla)
+        df = self.read_table(tabla)
+        return set(normalizar_clave(df[key].dropna())) if key in df.columns else set()
+
+    def upsert_rows(self, tabla, df, key=None):
+        raise NotImplementedError
+
+    def delete_rows(self, tabla, valores, key=None):
+        raise NotImplementedError
+
+    def reserve_ids(self, tabla, n=1, pendientes=None):
+        """
+        Reserva n IDs consecutivos y devuelve el range. Ningún otro llamador recibe los mismos.
+        pendientes: función -> mayor id ya usado que todavía no está en la tabla (escrituras encoladas);
+        se consulta solo al crear el contador.
+        """
+        raise NotImplementedError
+
+
+# ==========================================
+# GOOGLE SHEETS
+# ==========================================
+class GSheetsBackend(StorageBackend):
+    """
+    Backend original: una hoja de Google Sheets por tabla.
+    upsert / delete ubican cada registro por su fila (columna clave) y escriben por posición: entre
+    sesiones del mismo proceso se serializan por hoja. Sheets no tiene escrituras condicionales, así que
+    con varios procesos escribiendo el mismo libro un borrado ajeno puede correr las filas: un solo proceso por libro.
+    """
+    nombre = "gsheets"
+
+    def __init__(self, conn=None, conn_name="gsheets"):
+        # conn permite inyectar una conexión alternativa (pruebas offline)
+        self._conn_fija = conn
+        self.conn_name = conn_name
+        # Secuencias en memoria: Sheets no tiene contadores atómicos, así que el proceso
+        # (todas las sesiones de Streamlit) reparte los IDs bajo un lock.
+        self._secuencias = {}
+        self._seq_lock = threading.Lock()
+        # Escrituras por posición (upsert / delete ubican la fila por la columna clave): una a la vez por hoja,
+        # así un borrado de otra sesión no corre las filas entre la lectura de la clave y la escritura.
+        self._locks_hoja = {}
+
+    def reserve_ids(self, tabla, n=1, pendientes=None):
+        """
+        Sin choques solo dentro del proceso: el contador vive en memoria y arranca de MAX(id) de la hoja.
+        Dos procesos (réplicas) sobre el mismo libro parten del mismo máximo y reparten los mismos IDs.
+        """
+        with self._seq_lock:
+            ultimo = self._secuencias.get(tabla)
+            if ultimo is None:  # solo la primera vez
+                # La cola antes que la hoja: lo que se suba entre medio queda contado en alguna de las dos
+                piso = pendientes() if pendientes else 0
+                ultimo = max(piso, max_id(self.read_table(tabla)))
+            self._secuencias[tabla] = ultimo + n
+        return range(ultimo + 1, ultimo + n + 1)
+
+    def _ver_ids(self, tabla, df):
+        """Si se escriben IDs explícitos (reescritura, import), la secuencia no puede quedar atrás."""
+        with self._seq_lock:
+            if tabla in self._secuencias:
+                self._secuencias[tabla] = max(self._secuencias[tabla], max_id(df))
+
+    def _lock_hoja(self, tabla):
+        with self._seq_lock:
+            return self._locks_hoja.setdefault(tabla, threading.RLock())
+
+    def _conn(self):
+        if self._conn_fija is not None: return self._conn_fija
+        import streamlit as st
+        from streamlit_gsheets import GSheetsConnection
+        return st.connection(self.conn_name, type=GSheetsConnection)
+
+    def read_table(self, tabla):
+        # TTL=0 evita que se quede pegado con datos viejos (Caché).
+        try: return self._conn().read(worksheet=tabla, ttl=0)
+        except WorksheetNotFound:
+            return pd.DataFrame(columns=TABLAS.get(tabla, []))  # se crea con la primera escritura
+
+    def write_table(self, tabla, df):
+        # Google Sheets NO acepta NaN (object: los categóricos/Int64 también aceptan "").
+        datos = df.astype(object).fillna("")
+        with self._lock_hoja(tabla):
+            try: self._conn().update(worksheet=tabla, data=datos)
+            except WorksheetNotFound:
+                if self._crear_hoja(tabla, df.columns) is None: raise
+                self._conn().update(worksheet=tabla, data=datos)
+        self._ver_ids(tabla, df)
+
+    def _crear_hoja(self, tabla, cols=()):
+        """
+        Agrega al libro la hoja que falta (ej: 'movimientos', 'limites_alarma' en una planilla anterior
+        a esas funciones), con el encabezado del esquema más las columnas del DF. None si no se puede.
+        """
+        abrir = getattr(getattr(self._conn(), "client", None), "_open_spreadsheet", None)
+        if abrir is None: return None
+        base = TABLAS.get(tabla, [])
+        encabezado = base + [c for c in cols if c not in base]
+        libro = abrir()
+        try:
+            ws = libro.add_worksheet(title=tabla, rows=1000, cols=max(len(encabezado), 1))
+        except APIError:
+            return libro.worksheet(tabla)  # otra sesión la creó al mismo tiempo
+        if encabezado: ws.update("A1", [encabezado])
+        return ws
+
+    def _worksheet(self, tabla, crear_con=None):
+        """
+        Hoja gspread para escrituras por fila (None si la conexión no lo permite).
+        crear_con: columnas con las que se crea la hoja si no existe; sin ellas, WorksheetNotFound.
+        """
+        cliente = getattr(self._conn(), "client", None)
+        seleccionar = getattr(cliente, "_select_worksheet", None)
+        if seleccionar is None: return None
+        try: return seleccionar(worksheet=tabla)
+        except WorksheetNotFound:
+            if crear_con is None: raise
+            return self._crear_hoja(tabla, crear_con)
+
+    def _encabezado(self, ws, cols):
+        """Lee la fila 1 y agrega al final las columnas nuevas que traiga el DF."""
+        encabezado = ws.row_values(1)
+        nuevas = [c for c in cols if c not in encabezado]
+        if encabezado and nuevas:
+            encabezado = encabezado + nuevas
+            if ws.col_count < len(encabezado): ws.add_cols(len(encabezado) - ws.col_count)
+            ws.update("A1", [encabezado])
+        return encabezado
+
+    def read_keys(self, tabla, key=None):
+        key = key or clave_de(tabla)
+        try: ws = self._worksheet(tabla)
+        except WorksheetNotFound: return set()
+        encabezado = ws.row_values(1) if ws is not None else []
+        if key not in encabezado: return super().read_keys(tabla, key)
+        # Solo se descarga la columna clave
+        valores = pd.Series(ws.col_values(encabezado.index(key) + 1)[1:], dtype=object)
+        return set(normalizar_clave(valores[valores != ""]))
+
+    def append_rows(self, tabla, df):
+        if df.empty: return
+        self._ver_ids(tabla, df)
+        ws = self._worksheet(tabla, crear_con=df.columns)
+        if ws is None:
+            actual = self.read_table(tabla)
+            return self.write_table(tabla, pd.concat([actual, df], ignore_index=True))
+        encabezado = self._encabezado(ws, list(df.columns))
+        if not encabezado: return self.write_table(tabla, df)  # hoja vacía
+        # Un solo append: la API lo aplica al final sin pisar filas de otros usuarios
+        ws.append_rows(_valores_sheet(df, encabezado), value_input_option="USER_ENTERED")
+
+    def upsert_rows(self, tabla, df, key=None):
+        key = key or clave_de(tabla)
+        if df.empty: return
+        with self._lock_hoja(tabla):
+            ws = self._worksheet(tabla, crear_con=df.columns)
+            encabezado = self._encabezado(ws, list(df.columns)) if ws is not None else []
+            if key not in encabezado:
+                return self.write_table(tabla, combinar_por_clave(self.read_table(tabla), df, key))
+
+            # Solo se descarga la columna clave para ubicar las filas
+            col_clave = encabezado.index(key) + 1
+            claves = normalizar_clave(pd.Series(ws.col_values(col_clave)[1:], dtype=object))
+            if claves.duplicated().any():  # filas repetidas a mano: la posición no identifica el registro
+                return self.write_table(tabla, combinar_por_clave(self.read_table(tabla), df, key))
+            pos = {k: i + 2 for i, k in enumerate(claves)}
+            cols = list(df.columns)
+            valores = _valores_sheet(df, cols)
+            celdas = []; nuevas = []
+            for j, k in enumerate(normalizar_clave(df[key])):
+                fila = pos.get(k)
+                if fila is None: nuevas.append(j); continue
+                for c, v in zip(cols, valores[j]):
+                    celdas.append({"range": rowcol_to_a1(fila, encabezado.index(c) + 1), "values": [[v]]})
+            if celdas: ws.batch_update(celdas, value_input_option="USER_ENTERED")
+            if nuevas: ws.append_rows(_valores_sheet(df.iloc[nuevas], encabezado), value_input_option="USER_ENTERED")
+
+    def delete_rows(self, tabla, valores, key=None):
+        key = key or clave_de(tabla)
+        borrar = set(normalizar_clave(pd.Series(list(valores), dtype=object)))
+        if not borrar: return
+        with self._lock_hoja(tabla):
+            try: ws = self._worksheet(tabla)
+            except WorksheetNotFound: return  # nada que borrar
+            encabezado = ws.row_values(1) if ws is not None else []
+            if key not in encabezado:
+                actual = self.read_table(tabla)
+                if actual.empty: return
+                return self.write_table(tabla, actual[~normalizar_clave(actual[key]).isin(borrar)])
+            claves = normalizar_clave(pd.Series(ws.col_values(encabezado.index(key) + 1)[1:], dtype=object))
+            filas = [i + 1 for i, k in enumerate(claves) if k in borrar]  # índice 0 = encabezado
+            if not filas: return
+            # Filas contiguas -> un rango; todos los rangos en un solo batch_update, de abajo hacia arriba
+            # (cada borrado corre solo las filas de más abajo, que ya se borraron)
+            rangos = []
+            for i in filas:
+                if rangos and rangos[-1][1] == i: rangos[-1][1] = i + 1
+                else: rangos.append([i, i + 1])
+            ws.spreadsheet.batch_update({"requests": [
+                {"deleteDimension": {"range": {"sheetId": ws.id, "dimension": "ROWS", "startIndex": a, "endIndex": b}}}
+                for a, b in reversed(rangos)]})
+
+
+def _valores_sheet(df, cols):
+    """Filas listas para la API de Sheets (sin NaN ni tipos numpy)."""
+    return [["" if v is None else v for v in f] for f in _filas(df, cols)]
+
+
+# ==========================================
+# SQLITE EMBEBIDO
+# ==========================================
+def _q(nombre):
+    return '"' + str(nombre).replace('"', '""') + '"'
+
+
+def _tipo_columna(col):
+    # Afinidad NUMERIC: 5, 5.0 y '5' se guardan igual -> los JOIN/WHERE por id funcionan
+    if col == "id" or col.endswith("_id"): return "NUMERIC"
+    if col in ("tag", "equipo_tag", "sku", "repuesto_sku"): return "TEXT"
+    return ""
+
+
+def _filas(df, cols):
+    sub = df.reindex(columns=cols).astype(object)
+    return sub.where(sub.notna(), None).values.tolist()
+
+
+class SQLiteBackend(StorageBackend):
+    """Backend local en un archivo SQLite, con índices en tag / sistema_id / componente_id."""
+    nombre = "sqlite"
+
+    def __init__(self, path="data/cmms.db"):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.RLock()
+        # Una sola conexión compartida entre hilos de Streamlit, protegida por el lock
+        self._con = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        self._con.execute("CREATE TABLE IF NOT EXISTS _secuencias (tabla TEXT PRIMARY KEY, ultimo INTEGER NOT NULL)")
+        self._cols = {}
+        for t, cols in TABLAS.items(): self._asegurar_tabla(t, cols)
+
+    def _asegurar_tabla(self, tabla, cols):
+        """Crea la tabla/columnas/índices que falten. Devuelve la lista de columnas."""
+        existentes = self._cols.get(tabla)
+        if existentes is None:
+            existentes = [r[1] for r in self._con.execute(f"PRAGMA table_info({_q(tabla)})")]
+            if not existentes:
+                if not cols: return []
+                defs = ", ".join(f"{_q(c)} {_tipo_columna(c)}".strip() for c in cols)
+                self._con.execute(f"CREATE TABLE IF NOT EXISTS {_q(tabla)} ({defs})")
+                existentes = list(cols)
+            self._cols[tabla] = existentes
+        for c in cols:
+            if c not in existentes:
+                self._con.execute(f"ALTER TABLE {_q(tabla)} ADD COLUMN {_q(c)} {_tipo_columna(c)}".strip())
+                existentes.append(c)
+        for c in INDICES.get(tabla, []) + [clave_de(tabla)]:
+            if c in existentes:
+                self._con.execute(f"CREATE INDEX IF NOT EXISTS {_q(f'ix_{tabla}_{c}')} ON {_q(tabla)} ({_q(c)})")
+        return existentes
+
+    def _transaccion(self, fn):
+        with self._lock:
+            self._con.execute("BEGIN IMMEDIATE")
+            try:
+                res = fn(self._con)
+                self._con.execute("COMMIT")
+                return res
+            except Exception:
+                self._con.execute("ROLLBACK")
+                raise
+
+    def read_table(self, tabla):
+        with self._lock:
+            cols = self._cols.get(tabla) or self._asegurar_tabla(tabla, TABLAS.get(tabla, []))
+            if not cols: return pd.DataFrame()
+            lista = ", ".join(_q(c) for c in cols)
+            return pd.read_sql_query(f"SELECT {lista} FROM {_q(tabla)} ORDER BY rowid", self._con)
+
+    def read_rows_after(self, tabla, desde, key="id"):
+        # Por el índice de la clave: solo viajan las filas nuevas
+        with self._lock:
+            cols = self._cols.get(tabla) or self._asegurar_tabla(tabla, TABLAS.get(tabla, []))
+            if desde is None or key not in cols: return super().read_rows_after(tabla, desde, key)
+            lista = ", ".join(_q(c) for c in cols)
+            return pd.read_sql_query(f"SELECT {lista} FROM {_q(tabla)} WHERE {_q(key)} > ? ORDER BY rowid", self._con, params=[desde])
+
+    def read_keys(self, tabla, key=None):
+        key = key or clave_de(tabla)
+        with self._lock:
+            cols = self._cols.get(tabla) or self._asegurar_tabla(tabla, TABLAS.get(tabla, []))
+            if key not in cols: return set()
+            filas = self._con.execute(f"SELECT {_q(key)} FROM {_q(tabla)} WHERE {_q(key)} IS NOT NULL").fetchall()
+        return set(normalizar_clave(pd.Series([f[0] for f in filas], dtype=object)))
+
+    def _insertar(self, con, tabla, df):
+        cols = self._asegurar_tabla(tabla, list(df.columns))
+        usar = [c for c in cols if c in df.columns]
+        marcas = ", ".join("?" for _ in usar)
+        con.executemany(f"INSERT INTO {_q(tabla)} ({', '.join(_q(c) for c in usar)}) VALUES ({marcas})", _filas(df, usar))
+        self._ver_ids(con, tabla, df)
+
+    def write_table(self, tabla, df):
+        def _op(con):
+            self._asegurar_tabla(tabla, list(df.columns))
+            con.execute(f"DELETE FROM {_q(tabla)}")
+            self._insertar(con, tabla, df)
+        self._transaccion(_op)
+
+    def append_rows(self, tabla, df):
+        if df.empty: return
+        self._transaccion(lambda con: self._insertar(con, tabla, df))
+
+    def upsert_rows(self, tabla, df, key=None):
+        key = key or clave_de(tabla)
+        if df.empty: return
+
+        def _op(con):
+            self._asegurar_tabla(tabla, list(df.columns))
+            otras = [c for c in df.columns if c != key]
+            nuevas = []
+            filas = _filas(df, [key] + otras)
+            if otras:
+                sets = ", ".join(f"{_q(c)} = ?" for c in otras)
+                sql = f"UPDATE {_q(tabla)} SET {sets} WHERE {_q(key)} = ?"
+                for i, f in enumerate(filas):
+                    if con.execute(sql, f[1:] + [f[0]]).rowcount == 0: nuevas.append(i)
+            else:
+                existe = f"SELECT 1 FROM {_q(tabla)} WHERE {_q(key)} = ? LIMIT 1"
+                nuevas = [i for i, f in enumerate(filas) if con.execute(existe, [f[0]]).fetchone() is None]
+            if nuevas: self._insertar(con, tabla, df.iloc[nuevas])
+        self._transaccion(_op)
+
+    def delete_rows(self, tabla, valores, key=None):
+        key = key or clave_de(tabla)
+        valores = list(valores)
+        if not valores: return
+
+        def _op(con):
+            for i in range(0, len(valores), 500):
+                lote = valores[i:i + 500]
+                con.execute(f"DELETE FROM {_q(tabla)} WHERE {_q(key)} IN ({', '.join('?' for _ in lote)})", lote)
+        self._transaccion(_op)
+
+    def _max_id(self, con, tabla):
+        """MAX(id) resuelto con el índice de la clave; solo si la columna trae texto se filtra por tipo."""
+        if "id" not in self._asegurar_tabla(tabla, TABLAS.get(tabla, [])): return 0
+        maximo = con.execute(f"SELECT MAX(id) FROM {_q(tabla)}").fetchone()[0]
+        if isinstance(maximo, str):  # en SQLite el texto ordena después de los números
+            maximo = con.execute(f"SELECT MAX(id) FROM {_q(tabla)} WHERE typeof(id) IN ('integer', 'real')").fetchone()[0]
+        return int(maximo or 0)
+
+    def _ver_ids(self, con, tabla, df):
+        """Filas con ID explícito (import, reescritura): el contador no puede quedar por debajo."""
+        if "id" in df.columns:
+            con.execute("UPDATE _secuencias SET ultimo = MAX(ultimo, ?) WHERE tabla = ?", [max_id(df), tabla])
+
+    def reserve_ids(self, tabla, n=1, pendientes=None):
+        """
+        Contador por tabla en _secuencias, dentro de una transacción IMMEDIATE:
+        correcto aunque haya varias sesiones o procesos insertando a la vez.
+        Es una lectura y una escritura por clave primaria; MAX(id) solo se consulta para crear el contador.
+        """
+        def _op(con):
+            fila = con.execute("SELECT ultimo FROM _secuencias WHERE tabla = ?", [tabla]).fetchone()
+            ultimo = int(fila[0]) if fila else max(self._max_id(con, tabla), pendientes() if pendientes else 0)
+            con.execute("INSERT INTO _secuencias (tabla, ultimo) VALUES (?, ?) "
+                        "ON CONFLICT(tabla) DO UPDATE SET ultimo = excluded.ultimo", [tabla, ultimo + n])
+            return range(ultimo + 1, ultimo + n + 1)
+        return self._transaccion(_op)
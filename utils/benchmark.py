@@ -0,0 +1,395 @@
+import os
+import json
+import gc
+import sys
+import subprocess
+import time
+import tempfile
+import threading
+import tracemalloc
+from collections import Counter
+import numpy as np
+import pandas as pd
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import a1_to_rowcol
+from utils.backends import GSheetsBackend
+from utils.lecturas_store import LecturasStore
+from utils.snapshots import SnapshotStore
+from utils.db_con import set_backend, set_lecturas_store, set_snapshots, get_snapshots, get_data
+
+# --- BANCO DE PRUEBAS CON PLANTA SINTÉTICA ---
+# Mide las páginas sin Google Sheets: una conexión en memoria reemplaza a GSheetsConnection
+# (se inyecta con GSheetsBackend(conn=...)) y cuenta cada llamada que en producción iría a la red.
+# Las páginas corren headless con streamlit.testing (AppTest), en este mismo proceso.
+#   python cli.py bench --escalas 1k,10k --lecturas 1000000
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ESCALAS = {"1k": 1000, "10k": 10000, "100k": 100000}  # equipos
+SISTEMAS_POR_EQUIPO = 3
+COMPONENTES_POR_SISTEMA = 4
+EQUIPOS_POR_AREA = 50
+AREAS_POR_PLANTA = 10
+CHUNK_LECTURAS = 500000
+
+# Maestro de clases sintético: sistema -> familias -> campos (nombre, unidad, mínimo, máximo)
+MAESTRO = {
+    "SISTEMA MOTRIZ": {"MOTOR": [("Potencia", "HP", 1, 500), ("RPM", "rpm", 900, 3600)],
+                       "ACOPLE": [("Torque", "Nm", 10, 5000)]},
+    "SISTEMA HIDRAULICO": {"BOMBA": [("Caudal", "L/min", 10, 2000), ("Presión", "bar", 1, 250)],
+                           "VALVULA": [("Diámetro", "pulg", 1, 24)]},
+    "SISTEMA DE TRANSMISION": {"REDUCTOR": [("Relación", "", 5, 100), ("Potencia", "HP", 1, 500)],
+                               "RODAMIENTO": [("Diámetro", "mm", 20, 400)]},
+}
+
+
+# --- CONEXIÓN EN MEMORIA ---
+class _Hoja:
+    """Lo mínimo de gspread.Worksheet que usa GSheetsBackend (escrituras por fila)."""
+
+    def __init__(self, conn, tabla):
+        self._conn, self._tabla = conn, tabla
+
+    @property
+    def _df(self):
+        return self._conn.tablas.setdefault(self._tabla, pd.DataFrame())
+
+    @property
+    def col_count(self):
+        return max(26, len(self._df.columns))
+
+    def row_values(self, fila):
+        self._conn._contar("row_values")
+        return list(self._df.columns) if fila == 1 else self._df.iloc[fila - 2].tolist()
+
+    def col_values(self, col):
+        self._conn._contar("col_values")
+        df = self._df
+        return [df.columns[col - 1]] + df.iloc[:, col - 1].astype(object).where(df.iloc[:, col - 1].notna(), "").astype(str).tolist()
+
+    def add_cols(self, n):
+        self._conn._contar("add_cols")
+
+    def update(self, rango, valores, **kw):
+        self._conn._contar("update_celdas")
+        if rango == "A1":  # encabezado
+            df = self._df
+            for c in valores[0]:
+                if c not in df.columns: df[c] = np.nan
+            self._conn.tablas[self._tabla] = df
+
+    def append_rows(self, filas, **kw):
+        self._conn._contar("append_rows")
+        df = self._df
+        nuevas = pd.DataFrame([list(f) + [""] * (len(df.columns) - len(f)) for f in filas], columns=df.columns)
+        self._conn.tablas[self._tabla] = pd.concat([df, nuevas.replace("", np.nan)], ignore_index=True)
+
+    def batch_update(self, celdas, **kw):
+        self._conn._contar("batch_update")
+        df = self._df.astype(object)
+        for c in celdas:
+            fila, col = a1_to_rowcol(c["range"])
+            df.iat[fila - 2, col - 1] = c["values"][0][0]
+        self._conn.tablas[self._tabla] = df
+
+    @property
+    def id(self):
+        return list(self._conn.tablas).index(self._tabla)
+
+    @property
+    def spreadsheet(self):
+        return self._conn.client
+
+
+class _Cliente:
+    """Cliente y libro a la vez: abrir hojas existentes y crear las que faltan, como gspread."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def _select_worksheet(self, worksheet):
+        self._conn._contar("abrir_hoja")
+        return self.worksheet(worksheet)
+
+    def _open_spreadsheet(self, **kw):
+        return self
+
+    def worksheet(self, titulo):
+        if titulo not in self._conn.tablas: raise WorksheetNotFound(titulo)
+        return _Hoja(self._conn, titulo)
+
+    def batch_update(self, cuerpo):
+        """Solo deleteDimension de filas (lo que usa GSheetsBackend.delete_rows); se aplican en orden."""
+        self._conn._contar("batch_update_libro")
+        tablas = self._conn.tablas
+        for req in cuerpo["requests"]:
+            r = req["deleteDimension"]["range"]
+            tabla = list(tablas)[r["sheetId"]]
+            df = tablas[tabla]  # índice 0 = encabezado -> fila i del DF = índice i + 1
+            tablas[tabla] = df.drop(df.index[r["startIndex"] - 1:r["endIndex"] - 1]).reset_index(drop=True)
+
+    def add_worksheet(self, title, rows=1000, cols=26):
+        self._conn._contar("add_worksheet")
+        self._conn.tablas.setdefault(title, pd.DataFrame())
+        return _Hoja(self._conn, title)
+
+
+class ConexionMemoria:
+    """
+    Sustituto de GSheetsConnection: una tabla (DataFrame) por hoja, en memoria.
+    latencia: segundos de espera por llamada, para simular la red. contador: llamadas por operación.
+    """
+
+    def __init__(self, tablas=None, latencia=0.0):
+        self.tablas = {k: v.copy() for k, v in (tablas or {}).items()}
+        self.latencia = latencia
+        self.contador = Counter()
+        self.client = _Cliente(self)
+        self._lock = threading.Lock()
+
+    def _contar(self, op):
+        with self._lock: self.contador[op] += 1
+        if self.latencia: time.sleep(self.latencia)
+
+    def read(self, worksheet, ttl=None, **kw):
+        self._contar("read")
+        if worksheet not in self.tablas: raise WorksheetNotFound(worksheet)
+        return self.tablas[worksheet].copy()
+
+    def update(self, worksheet, data, **kw):
+        self._contar("update")
+        if worksheet not in self.tablas: raise WorksheetNotFound(worksheet)
+        self.tablas[worksheet] = data.replace("", np.nan).reset_index(drop=True)
+
+    def llamadas(self):
+        with self._lock: return sum(self.contador.values())
+
+    # Persistencia opcional en archivos locales (una hoja = un CSV), para reusar una planta generada
+    def guardar(self, directorio):
+        os.makedirs(directorio, exist_ok=True)
+        for tabla, df in self.tablas.items(): df.to_csv(os.path.join(directorio, f"{tabla}.csv"), index=False)
+
+    @classmethod
+    def cargar(cls, directorio, latencia=0.0):
+        tablas = {os.path.splitext(f)[0]: pd.read_csv(os.path.join(directorio, f)) for f in os.listdir(directorio) if f.endswith(".csv")}
+        return cls(tablas, latencia)
+
+
+# --- GENERADOR DE PLANTAS ---
+def generar_planta(equipos=1000, semilla=0):
+    """Hojas de una planta sintética con 'equipos' equipos (y sus sistemas / componentes / repuestos)."""
+    rng = np.random.default_rng(semilla)
+    n_eq = int(equipos)
+    i = np.arange(n_eq)
+    area = i // EQUIPOS_POR_AREA
+    df_eq = pd.DataFrame({"id": i + 1, "tag": [f"EQ-{k:06d}" for k in i + 1], "nombre": [f"Equipo {k}" for k in i + 1],
+                          "planta": [f"PLANTA {k + 1}" for k in area // AREAS_POR_PLANTA],
+                          "area": [f"AREA {k % AREAS_POR_PLANTA + 1}" for k in area],
+                          "tipo": rng.choice(["BOMBA", "MOLINO", "TRANSPORTADOR", "SECADOR"], n_eq),
+                          "criticidad": rng.choice(["Alta", "Media", "Baja"], n_eq), "estado": "OK"})
+
+    nombres_sys = list(MAESTRO)
+    s = np.arange(n_eq * SISTEMAS_POR_EQUIPO)
+    tipo_sys = s % SISTEMAS_POR_EQUIPO % len(nombres_sys)
+    df_sys = pd.DataFrame({"id": s + 1, "equipo_tag": df_eq["tag"].to_numpy()[s // SISTEMAS_POR_EQUIPO],
+                           "nombre": np.array(nombres_sys, dtype=object)[tipo_sys], "descripcion": ""})
+
+    n_sku = max(100, n_eq // 2)
+    skus = np.array([f"REP-{k:06d}" for k in range(1, n_sku + 1)], dtype=object)
+    c = np.arange(len(s) * COMPONENTES_POR_SISTEMA)
+    sys_c = c // COMPONENTES_POR_SISTEMA
+    partes = []
+    for t, nombre_sys in enumerate(nombres_sys):
+        pos = np.flatnonzero(tipo_sys[sys_c] == t)
+        familias = list(MAESTRO[nombre_sys])
+        fam = np.array(familias, dtype=object)[c[pos] % COMPONENTES_POR_SISTEMA % len(familias)]
+        specs = pd.Series("", index=pos, dtype=object)
+        for nombre_fam, campos in MAESTRO[nombre_sys].items():
+            m = fam == nombre_fam
+            txt = pd.Series("{", index=pos[m], dtype=object)
+            for j, (campo, _, lo, hi) in enumerate(campos):
+                val = pd.Series(rng.integers(lo, hi + 1, m.sum()), index=pos[m]).astype(str)
+                txt = txt + ("" if j == 0 else ", ") + f'"{campo}": ' + val
+            specs[pos[m]] = txt + "}"
+        partes.append(pd.DataFrame({"id": c[pos] + 1, "sistema_id": sys_c[pos] + 1, "categoria": fam, "specs_json": specs.to_numpy()}))
+    df_comp = pd.concat(partes).sort_values("id", kind="stable").reset_index(drop=True)
+    df_comp.insert(2, "nombre", [f"{f} {k % COMPONENTES_POR_SISTEMA + 1}" for f, k in zip(df_comp["categoria"], df_comp["id"] - 1)])
+    df_comp["marca"] = rng.choice(["WEG", "SIEMENS", "ABB", "SKF", "FAG"], len(df_comp))
+    df_comp["modelo"] = "M-" + pd.Series(rng.integers(100, 999, len(df_comp))).astype(str)
+    df_comp["cantidad"] = rng.integers(1, 5, len(df_comp))
+    df_comp["repuesto_sku"] = np.where(rng.random(len(df_comp)) < 0.6, skus[rng.integers(0, n_sku, len(df_comp))], "")
+    df_comp = df_comp[["id", "sistema_id", "nombre", "marca", "modelo", "cantidad", "categoria", "repuesto_sku", "specs_json"]]
+
+    df_alm = pd.DataFrame({"sku": skus, "descripcion": [f"Repuesto {k}" for k in range(1, n_sku + 1)],
+                           "marca": rng.choice(["SKF", "FAG", "NSK", "TIMKEN"], n_sku),
+                           "stock_actual": rng.integers(0, 50, n_sku), "unidad": "UND",
+                           "ubicacion_fisica": [f"PASILLO {chr(65 + k % 6)}-{k % 40 + 1}" for k in range(n_sku)],
+                           "precio_promedio": rng.uniform(5, 500, n_sku).round(2)})
+
+    df_sys_conf = pd.DataFrame({"id": range(1, len(MAESTRO) + 1), "nombre_sistema": nombres_sys, "descripcion": ""})
+    fam_conf = [{"nombre_familia": f, "sistema_asociado": sis,
+                 "config_json": json.dumps([{"nombre": n, "unidad": u, "tipo": "numero", "min": lo, "max": hi} for n, u, lo, hi in campos], ensure_ascii=False)}
+                for sis, fams in MAESTRO.items() for f, campos in fams.items()]
+    df_fam_conf = pd.DataFrame(fam_conf)
+    df_fam_conf.insert(0, "id", range(1, len(df_fam_conf) + 1))
+
+    vacias = {h: pd.DataFrame(columns=cols) for h, cols in {
+        "movimientos": ["id", "fecha", "sku", "tipo", "cantidad", "costo_unitario", "saldo", "costo_promedio", "componente_id", "orden_trabajo", "responsable"],
+        "limites_alarma": ["id", "familia", "componente_id", "parametro", "alerta", "peligro"],
+        "lecturas": ["id", "componente_id", "fecha", "hora", "parametro", "valor", "tecnico"]}.items()}
+    return {"equipos": df_eq, "sistemas": df_sys, "componentes": df_comp, "sistemas_config": df_sys_conf,
+            "familias_config": df_fam_conf, "almacen": df_alm, **vacias}
+
+
+def generar_lecturas(componentes, n, semilla=0, chunk=CHUNK_LECTURAS):
+    """
+    Lecturas sintéticas en lotes (memoria constante aunque n sea 10M): cada componente monitoreado
+    recibe una serie horaria hacia atrás desde hoy, con los tres parámetros del colector.
+    """
+    from utils.ingesta_lecturas import PARAMETROS
+    rng = np.random.default_rng(semilla)
+    ids = np.asarray(componentes, dtype="int64")
+    params = np.array(list(PARAMETROS), dtype=object)
+    base = {"Vibración (mm/s)": (2.5, 1.0), "Temperatura (°C)": (60.0, 8.0), "Ruido (dB)": (78.0, 5.0)}
+    media = np.array([base.get(p, (10.0, 1.0))[0] for p in params])
+    desv = np.array([base.get(p, (10.0, 1.0))[1] for p in params])
+    fin = pd.Timestamp.now().floor("h")
+    por_paso = len(ids) * len(params)
+    for ini in range(0, int(n), chunk):
+        k = np.arange(ini, min(int(n), ini + chunk))
+        paso, resto = np.divmod(k, por_paso)
+        p = resto % len(params)
+        yield pd.DataFrame({"componente_id": ids[resto // len(params)], "parametro": params[p],
+                            "valor": np.abs(rng.normal(media[p], desv[p])).round(2),
+                            "ts": fin - pd.to_timedelta(paso, unit="h"), "tecnico": "SINTETICO"})
+
+
+# --- MEDICIÓN DE PÁGINAS ---
+def _navegar_gestion(at):
+    """Recorre planta -> área -> equipo -> sistema -> componente (primera opción real de cada nivel)."""
+    if at.toggle: at.toggle[0].set_value(True).run()  # árbol: primera área
+    for key in ["sel_planta", "sel_area", "sel_equipo", "sel_sistema", "sel_comp"]:
+        try: sb = at.selectbox(key=key)
+        except KeyError: break
+        if len(sb.options) < 3: break
+        sb.set_value(sb.options[2]).run()
+
+
+PAGINAS = {
+    "gestion_activos": ("modules.gestion_activos", "render_gestion_activos", _navegar_gestion),
+    "monitoreo": ("modules.monitoreo", "render_monitoreo_view", None),
+    "almacen": ("modules.almacen", "render_almacen_view", None),
+    "configurador": ("modules.configurador", "render_configurador", None),
+}
+
+_SCRIPT = """
+import sys
+sys.path.insert(0, {raiz!r})
+import streamlit as st
+st.set_page_config(layout="wide")
+from {modulo} import {funcion}
+{funcion}()
+"""
+
+
+_SCRIPT_IMPORT = """
+import sys, time, json, resource
+sys.path.insert(0, {raiz!r})
+import utils.db_con, utils.paginas  # lo que main.py importa siempre
+rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; t0 = time.perf_counter()
+for m in {modulos!r}: __import__(m)
+print(json.dumps({{"import_ms": round((time.perf_counter() - t0) * 1000, 1), "rss_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss0) / 1024, 1)}}))
+"""
+
+
+def medir_imports(progreso=print):
+    """
+    Costo de abrir cada página por primera vez en un worker nuevo (un subproceso por página):
+    ms de import y MB de RSS extra sobre lo que main.py carga siempre. 'todas' = import completo por adelantado.
+    """
+    from utils.paginas import PAGINAS
+    casos = {titulo: [modulo] for titulo, (modulo, _) in PAGINAS.items()}
+    casos["todas"] = sorted({modulo for modulo, _ in PAGINAS.values()})
+    filas = []
+    for titulo, modulos in casos.items():
+        out = subprocess.run([sys.executable, "-c", _SCRIPT_IMPORT.format(raiz=RAIZ, modulos=modulos)],
+                             capture_output=True, text=True, cwd=RAIZ, check=True).stdout
+        filas.append({"pagina": titulo, **json.loads(out.strip().splitlines()[-1])})
+        progreso("  " + " | ".join(f"{k}={v}" for k, v in filas[-1].items()))
+    return pd.DataFrame(filas)
+
+
+def preparar(planta, lecturas=0, latencia=0.0, ruta_lecturas=None, semilla=0, fotos=False):
+    """
+    Instala la planta en un backend GSheets en memoria (y las lecturas en un store local). Devuelve la conexión.
+    fotos=True: las corridas en frío simulan un reinicio con foto local de cada hoja (utils/snapshots.py).
+    """
+    conn = ConexionMemoria(planta, latencia)
+    set_backend(GSheetsBackend(conn=conn))
+    set_snapshots(None)
+    if fotos:
+        store = SnapshotStore(tempfile.mkdtemp(prefix="cmms_bench_fotos_"))
+        for hoja in planta: store.guardar(hoja, get_data(hoja))
+        set_snapshots(store)
+    ruta = ruta_lecturas or os.path.join(tempfile.mkdtemp(prefix="cmms_bench_"), "lecturas.db")
+    store = LecturasStore(ruta)
+    if lecturas and store.total() == 0:
+        for lote in generar_lecturas(planta["componentes"]["id"], lecturas, semilla): store.append(lote)
+    set_lecturas_store(store)
+    return conn
+
+
+def medir_pagina(conn, pagina, memoria=True, timeout=600):
+    """
+    Frío (caché vacío), tibio (re-ejecución) y navegación; tiempo, llamadas de I/O y pico de memoria.
+    El pico se mide en una segunda corrida en frío bajo tracemalloc, para no inflar los tiempos.
+    """
+    from streamlit.testing.v1 import AppTest
+    from utils.db_con import invalidate_cache
+    modulo, funcion, navegar = PAGINAS[pagina]
+    script = _SCRIPT.format(raiz=RAIZ, modulo=modulo, funcion=funcion)
+    res = {"pagina": pagina}
+
+    def _corrida(etapa, fn):
+        io0 = conn.llamadas(); t0 = time.perf_counter()
+        fn()
+        res[f"{etapa}_s"] = round(time.perf_counter() - t0, 3)
+        res[f"{etapa}_io"] = conn.llamadas() - io0
+
+    def _reinicio():
+        invalidate_cache()
+        if get_snapshots() is not None: set_snapshots(get_snapshots())  # como un proceso nuevo: primero la foto
+        gc.collect()
+
+    _reinicio()
+    at = AppTest.from_string(script, default_timeout=timeout)
+    _corrida("frio", at.run)
+    _corrida("tibio", at.run)
+    if navegar is not None: _corrida("navegacion", lambda: navegar(at))
+    res["errores"] = len(at.exception)
+
+    if memoria:
+        _reinicio()
+        tracemalloc.start()
+        try:
+            AppTest.from_string(script, default_timeout=timeout).run()
+            res["pico_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+        finally:
+            tracemalloc.stop()
+    return res
+
+
+def correr(escalas=("1k",), lecturas=0, paginas=None, latencia=0.0, memoria=True, semilla=0, fotos=False, progreso=print):
+    """Un escenario por escala; devuelve una fila por (escala, página)."""
+    filas = []
+    for escala in escalas:
+        n_eq = ESCALAS.get(escala) or int(escala)
+        t0 = time.perf_counter()
+        planta = generar_planta(n_eq, semilla)
+        conn = preparar(planta, lecturas, latencia, semilla=semilla, fotos=fotos)
+        generado = round(time.perf_counter() - t0, 2)
+        progreso(f"[{escala}] {n_eq} equipos, {len(planta['componentes'])} componentes, {lecturas} lecturas ({generado} s)")
+        del planta
+        for pagina in paginas or list(PAGINAS):
+            r = medir_pagina(conn, pagina, memoria=memoria)
+            filas.append({"escala": escala, "equipos": n_eq, "lecturas": lecturas, "fotos": fotos, **r})
+            progreso("  " + " | ".join(f"{k}={v}" for k, v in r.items()))
+    return pd.DataFrame(filas)
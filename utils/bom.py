@@ -0,0 +1,140 @@
+import copy
+import pandas as pd
+from utils.db_con import get_data
+from utils.jerarquia import indice_activos, HOJAS_JERARQUIA, IndiceCompartido
+from utils.perfil import perfilar
+
+# --- DÓNDE SE USA / LISTA DE REPUESTOS (BOM) ---
+# componentes -> sistemas -> equipos se unen una vez por versión de datos (hash joins).
+# Lo que queda son diccionarios: SKU -> componentes, equipo -> componentes y demanda por SKU,
+# que se parchan sin reconstruir cuando se guarda un componente (sin joins: copia de los diccionarios y
+# cambio de referencia). El stock se cruza al consultar
+# (almacen cambia con cada movimiento y no debe forzar una reconstrucción).
+COLS_USO = ["componente_id", "componente", "categoria", "cantidad", "repuesto_sku", "sistema_id", "equipo_tag", "equipo", "planta", "area"]
+
+
+def _sku(valor):
+    return "" if valor is None or pd.isna(valor) else str(valor).strip().upper()
+
+
+def _cantidad(valor):
+    num = pd.to_numeric(valor, errors="coerce")
+    return 1.0 if pd.isna(num) else float(num)
+
+
+class IndiceBOM:
+    def __init__(self, idx):
+        eq = idx.df_eq[["tag", "nombre", "planta", "area"]].rename(columns={"tag": "equipo_tag", "nombre": "equipo"})
+        sis = idx.df_sys[["id", "equipo_tag"]].rename(columns={"id": "sistema_id"})
+        comp = idx.df_comp[["id", "sistema_id", "nombre", "categoria", "cantidad", "repuesto_sku"]].rename(columns={"id": "componente_id", "nombre": "componente"})
+        con_id = sis.dropna(subset=["sistema_id"])
+        self.sys_eq = dict(zip(con_id["sistema_id"].astype(int), con_id["equipo_tag"]))
+        self.eq_info = {t: {"equipo": n, "planta": p, "area": a} for t, n, p, a in eq.itertuples(index=False)}
+
+        # Todos los componentes quedan en 'filas' (un componente sin SKU puede recibirlo al editarse);
+        # los índices por SKU / equipo solo incluyen los que tienen repuesto
+        todos = comp.merge(sis, on="sistema_id", how="left").merge(eq, on="equipo_tag", how="left")
+        todos = todos[todos["componente_id"].notna()]
+        todos["componente_id"] = todos["componente_id"].astype(int)
+        todos["cantidad"] = todos["cantidad"].astype("float64").fillna(1.0)
+        todos["categoria"] = todos["categoria"].astype(object)
+        self.filas = {r["componente_id"]: r for r in todos[COLS_USO].to_dict("records")}
+        bom = todos[todos["repuesto_sku"] != ""]
+        self.por_sku = {k: set(v) for k, v in bom.groupby("repuesto_sku")["componente_id"]}
+        self.por_equipo = {k: set(v) for k, v in bom.groupby("equipo_tag")["componente_id"]}
+        self.demanda = bom.groupby("repuesto_sku")["cantidad"].sum().to_dict()
+
+    # --- MANTENIMIENTO INCREMENTAL ---
+    # Copy-on-write: el índice publicado no se toca; se copian los diccionarios (copia superficial)
+    # y los conjuntos que cambian se reemplazan por otros nuevos en vez de modificarse.
+    def _quitar(self, comp_id):
+        fila = self.filas.pop(comp_id, None)
+        if fila is None or not fila["repuesto_sku"]: return
+        sku = fila["repuesto_sku"]
+        self.por_sku[sku] = self.por_sku.get(sku, set()) - {comp_id}
+        self.por_equipo[fila["equipo_tag"]] = self.por_equipo.get(fila["equipo_tag"], set()) - {comp_id}
+        self.demanda[sku] = self.demanda.get(sku, 0.0) - fila["cantidad"]
+        if not self.por_sku[sku]: self.por_sku.pop(sku, None); self.demanda.pop(sku, None)
+
+    def aplicar(self, cambio):
+        """Índice nuevo con un componente guardado (dict con 'id' y las columnas que cambiaron)."""
+        nuevo = copy.copy(self)
+        nuevo.filas, nuevo.por_sku, nuevo.por_equipo, nuevo.demanda = dict(self.filas), dict(self.por_sku), dict(self.por_equipo), dict(self.demanda)
+        comp_id = int(cambio["id"])
+        previo = self.filas.get(comp_id, {})
+        nuevo._quitar(comp_id)
+        sistema_id = cambio.get("sistema_id", previo.get("sistema_id"))
+        sku = _sku(cambio.get("repuesto_sku", previo.get("repuesto_sku")))
+        if sistema_id is None or pd.isna(sistema_id): return nuevo
+        tag = self.sys_eq.get(int(sistema_id))
+        fila = {"componente_id": comp_id, "componente": cambio.get("nombre", previo.get("componente", "")),
+                "categoria": cambio.get("categoria", previo.get("categoria")), "cantidad": _cantidad(cambio.get("cantidad", previo.get("cantidad"))),
+                "repuesto_sku": sku, "sistema_id": int(sistema_id), "equipo_tag": tag, **self.eq_info.get(tag, {"equipo": None, "planta": None, "area": None})}
+        nuevo.filas[comp_id] = fila
+        if not sku: return nuevo
+        nuevo.por_sku[sku] = nuevo.por_sku.get(sku, set()) | {comp_id}
+        nuevo.por_equipo[tag] = nuevo.por_equipo.get(tag, set()) | {comp_id}
+        nuevo.demanda[sku] = nuevo.demanda.get(sku, 0.0) + fila["cantidad"]
+        return nuevo
+
+    # --- CONSULTAS ---
+    def _df(self, ids):
+        return pd.DataFrame([self.filas[i] for i in sorted(ids)], columns=COLS_USO)
+
+    def donde_se_usa(self, sku):
+        """Componentes (con su equipo) que usan el SKU."""
+        return self._df(self.por_sku.get(_sku(sku), ()))
+
+    def repuestos_equipo(self, tag):
+        """Repuestos de un equipo: cantidad requerida por SKU contra el stock."""
+        uso = self._df(self.por_equipo.get(str(tag).strip().upper(), ()))
+        if uso.empty: return pd.DataFrame(columns=["repuesto_sku", "componentes", "requerido", "stock_actual", "descripcion"])
+        lista = uso.groupby("repuesto_sku").agg(componentes=("componente", lambda s: ", ".join(sorted(set(map(str, s))))), requerido=("cantidad", "sum")).reset_index()
+        return _con_stock(lista)
+
+    def demanda_total(self):
+        """Demanda de toda la planta por SKU, con stock, faltante y cobertura (stock / demanda)."""
+        df = pd.DataFrame({"repuesto_sku": list(self.demanda), "requerido": list(self.demanda.values()),
+                           "equipos": [len({self.filas[c]["equipo_tag"] for c in self.por_sku[s]}) for s in self.demanda]})
+        df = _con_stock(df)
+        df["faltante"] = (df["requerido"] - df["stock_actual"]).clip(lower=0)
+        df["cobertura"] = (df["stock_actual"] / df["requerido"]).where(df["requerido"] > 0)
+        return df.sort_values("faltante", ascending=False, kind="stable")
+
+    def faltantes(self):
+        df = self.demanda_total()
+        return df[df["faltante"] > 0]
+
+
+def _con_stock(df):
+    alm = get_data("almacen")
+    if alm.empty: alm = pd.DataFrame(columns=["sku", "stock_actual", "descripcion"])
+    alm = alm.drop_duplicates("sku", keep="last").set_index("sku")
+    df["stock_actual"] = df["repuesto_sku"].map(alm["stock_actual"]).astype("float64").fillna(0.0)
+    df["descripcion"] = df["repuesto_sku"].map(alm["descripcion"])
+    df["en_catalogo"] = df["repuesto_sku"].isin(alm.index)
+    return df
+
+
+_INDICE = IndiceCompartido(HOJAS_JERARQUIA)
+
+
+@perfilar("indice_bom")
+def indice_bom():
+    """Índice compartido; se reconstruye si cambió equipos/sistemas/componentes fuera de actualizar_componente()."""
+    antes = _INDICE.versiones()
+    idx = indice_activos()  # deja las tres hojas en caché
+    clave = _INDICE.clave()
+    bom = _INDICE.vigente(clave)
+    if bom is None:
+        bom = IndiceBOM(idx)
+        _INDICE.publicar(clave, bom, antes)
+    return bom
+
+
+def actualizar_componente(cambio):
+    """
+    Llamar después de guardar un componente (append_rows/update_rows): parcha el índice en vez de
+    reconstruirlo. Si hubo otras escrituras entre medio, se descarta y se reconstruye al consultar.
+    """
+    _INDICE.parchar(lambda bom: bom.aplicar(dict(cambio)))
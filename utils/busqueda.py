@@ -0,0 +1,123 @@
+import re
+import threading
+import unicodedata
+import numpy as np
+import pandas as pd
+from utils.db_con import get_data, get_cache, data_version
+from utils.perfil import perfilar
+
+# --- BÚSQUEDA INDEXADA ---
+# Índice invertido por campo: token -> filas. Cada término de la consulta se resuelve por
+#   exacto (token igual)  -> 3 puntos x peso del campo
+#   prefijo (token empieza por el término, búsqueda binaria en el vocabulario) -> 2 puntos
+#   subcadena (trigramas del vocabulario, ej. "6302" dentro de "rod6302") -> 1 punto
+# Todos los términos deben aparecer (AND); el puntaje total ordena los resultados.
+CAMPOS_ALMACEN = {"sku": 4.0, "descripcion": 2.0, "marca": 1.5, "ubicacion_fisica": 1.0}
+_NO_ALFANUM = re.compile(r"[^0-9a-z]+")
+_VACIO = np.array([], dtype=np.int64)
+
+
+def normalizar(texto):
+    """minúsculas y sin tildes ('Rodamiento Rígido' -> 'rodamiento rigido')."""
+    texto = unicodedata.normalize("NFKD", str(texto).lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def tokens(texto):
+    return [t for t in _NO_ALFANUM.split(normalizar(texto)) if t]
+
+
+def _trigramas(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class _IndiceCampo:
+    def __init__(self, serie):
+        # Se tokeniza cada texto distinto una sola vez (marcas y ubicaciones se repiten mucho)
+        codigos, unicos = pd.factorize(serie.astype(object).where(serie.notna(), "").astype(str))
+        orden = np.argsort(codigos, kind="stable")
+        bordes = np.searchsorted(codigos[orden], np.arange(len(unicos) + 1))
+        por_token = {}
+        for u, texto in enumerate(unicos):
+            for tok in set(tokens(texto)): por_token.setdefault(tok, []).append(u)
+        self.vocab = np.array(sorted(por_token), dtype=object)  # ordenado: prefijos por búsqueda binaria
+        self.postings = [np.sort(np.concatenate([orden[bordes[u]:bordes[u + 1]] for u in por_token[t]])) for t in self.vocab]
+        # Trigrama -> ids de vocabulario (solo se indexa el vocabulario, no las filas)
+        self.trigramas = {}
+        for i, tok in enumerate(self.vocab):
+            for g in _trigramas(tok): self.trigramas.setdefault(g, []).append(i)
+
+    def _filas(self, ids):
+        if len(ids) == 0: return _VACIO
+        return np.unique(np.concatenate([self.postings[i] for i in ids]))
+
+    def buscar(self, termino):
+        """(exactas, por prefijo, por subcadena) como arrays de posiciones."""
+        lo = int(np.searchsorted(self.vocab, termino, side="left"))
+        hi = int(np.searchsorted(self.vocab, termino + "\uffff", side="left"))
+        exacto = [lo] if lo < len(self.vocab) and self.vocab[lo] == termino else []
+        prefijo = range(lo, hi)
+        sub = []
+        if len(termino) >= 3:
+            grams = sorted(_trigramas(termino), key=lambda g: len(self.trigramas.get(g, ())))
+            cand = set(self.trigramas.get(grams[0], ()))
+            for g in grams[1:]:
+                if not cand: break
+                cand &= set(self.trigramas.get(g, ()))
+            sub = [i for i in cand if termino in self.vocab[i] and not (lo <= i < hi)]
+        return self._filas(exacto), self._filas(prefijo), self._filas(sub)
+
+
+class IndiceBusqueda:
+    """Índice de búsqueda sobre un DataFrame; se construye una vez por versión de la hoja."""
+
+    def __init__(self, df, campos):
+        self.df = df.reset_index(drop=True)
+        self.campos = {c: p for c, p in campos.items() if c in self.df.columns}
+        self._indices = {c: _IndiceCampo(self.df[c]) for c in self.campos}
+
+    def __len__(self):
+        return len(self.df)
+
+    def buscar(self, consulta):
+        """Posiciones de las filas que contienen todos los términos, ordenadas por relevancia."""
+        terminos = tokens(consulta)
+        n = len(self.df)
+        if not terminos: return np.arange(n)
+        total = np.zeros(n)
+        todas = np.ones(n, dtype=bool)
+        for t in terminos:
+            puntaje_t = np.zeros(n)
+            for campo, peso in self.campos.items():
+                exacto, prefijo, sub = self._indices[campo].buscar(t)
+                p = np.zeros(n)
+                p[sub] = 1.0; p[prefijo] = 2.0; p[exacto] = 3.0
+                puntaje_t += p * peso
+            todas &= puntaje_t > 0
+            total += puntaje_t
+        pos = np.flatnonzero(todas)
+        # Mayor puntaje primero; empate -> orden original de la hoja
+        return pos[np.argsort(-total[pos], kind="stable")]
+
+    def resultados(self, consulta):
+        return self.df.iloc[self.buscar(consulta)]
+
+
+_INDICE = None  # (versión, IndiceBusqueda)
+_LOCK = threading.Lock()
+
+
+@perfilar("indice_almacen")
+def indice_almacen():
+    """Índice del almacén compartido por las sesiones; se reconstruye solo si cambió la hoja."""
+    global _INDICE
+    if get_cache().vigente("almacen"):
+        with _LOCK:
+            if _INDICE is not None and _INDICE[0] == data_version("almacen"): return _INDICE[1]
+    antes = get_cache().version("almacen")  # antes de leer: una escritura durante la carga no se publica
+    df = get_data("almacen")
+    version = data_version("almacen")
+    indice = IndiceBusqueda(df, CAMPOS_ALMACEN)
+    if version[0] == antes:
+        with _LOCK: _INDICE = (version, indice)
+    return indice
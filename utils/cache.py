@@ -0,0 +1,153 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class SheetCache:
+    """
+    Caché de hojas compartida por todo el proceso (todas las sesiones).
+    - Cada hoja tiene una versión que sube con cada escritura -> invalidación exacta.
+    - El TTL solo cubre cambios hechos fuera de la app (edición directa del Sheet).
+    """
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self._datos = {}      # hoja -> (df, momento de carga, versión)
+        self._versiones = {}  # hoja -> int
+        self._cargas = {}     # hoja -> nº de veces que se guardó una descarga nueva
+        self._locks = {}      # hoja -> lock (una sola descarga concurrente por hoja)
+        self._lock = threading.RLock()
+        self.hits = {}
+        self.misses = {}
+
+    def _lock_hoja(self, hoja):
+        with self._lock:
+            return self._locks.setdefault(hoja, threading.Lock())
+
+    def version(self, hoja):
+        with self._lock:
+            return self._versiones.get(hoja, 0)
+
+    def _vigente(self, hoja):
+        item = self._datos.get(hoja)
+        if item is None: return None
+        df, t, v = item
+        if v != self._versiones.get(hoja, 0): return None
+        if self.ttl is not None and time.monotonic() - t > self.ttl: return None
+        return df
+
+    def token(self, hoja):
+        """Identifica el contenido actual: cambia con cada escritura y con cada recarga (TTL)."""
+        with self._lock:
+            return (self._versiones.get(hoja, 0), self._cargas.get(hoja, 0))
+
+    def vigente(self, hoja):
+        """True si la hoja se puede servir sin ir al backend."""
+        with self._lock:
+            return self._vigente(hoja) is not None
+
+    def get(self, hoja, cargar):
+        """Devuelve la hoja cacheada o la carga con cargar() (las copias protegen el caché)."""
+        with self._lock:
+            df = self._vigente(hoja)
+            if df is not None:
+                self.hits[hoja] = self.hits.get(hoja, 0) + 1
+                return df.copy()
+        with self._lock_hoja(hoja):
+            # Otro hilo pudo haberla cargado mientras esperábamos
+            with self._lock:
+                df = self._vigente(hoja)
+                if df is not None:
+                    self.hits[hoja] = self.hits.get(hoja, 0) + 1
+                    return df.copy()
+                self.misses[hoja] = self.misses.get(hoja, 0) + 1
+                v = self._versiones.get(hoja, 0)
+            df = cargar()
+            with self._lock:
+                # Si hubo una escritura durante la descarga, no guardamos datos viejos
+                if v == self._versiones.get(hoja, 0):
+                    self._datos[hoja] = (df, time.monotonic(), v)
+                    self._cargas[hoja] = self._cargas.get(hoja, 0) + 1
+            return df.copy()
+
+    def reemplazar(self, hoja, df, version):
+        """
+        Guarda una descarga hecha en segundo plano, salvo que hubo una escritura desde 'version'.
+        Espera a que termine un get() en curso de la hoja: si no, get() guardaría después su carga (más vieja).
+        """
+        with self._lock_hoja(hoja), self._lock:
+            if version != self._versiones.get(hoja, 0): return False
+            self._datos[hoja] = (df, time.monotonic(), version)
+            self._cargas[hoja] = self._cargas.get(hoja, 0) + 1
+            return True
+
+    def actualizar(self, hoja, fn):
+        """
+        Escritura local: aplica fn(df) a la hoja cacheada y sube la versión (una escritura = +1).
+        Si la hoja no está en caché se invalida igual; la próxima lectura la trae del backend.
+        """
+        with self._lock_hoja(hoja):
+            with self._lock:
+                df = self._vigente(hoja)
+                t = self._datos[hoja][1] if df is not None else None
+            nuevo = fn(df) if df is not None else None
+            with self._lock:
+                v = self._versiones.get(hoja, 0) + 1
+                self._versiones[hoja] = v
+                if nuevo is None: self._datos.pop(hoja, None)
+                else: self._datos[hoja] = (nuevo, t, v)  # el TTL sigue contando desde la descarga
+
+    def invalidate(self, hoja=None):
+        with self._lock:
+            hojas = [hoja] if hoja else list(set(self._datos) | set(self._versiones))
+            for h in hojas:
+                self._versiones[h] = self._versiones.get(h, 0) + 1
+                self._datos.pop(h, None)
+
+    def stats(self):
+        with self._lock:
+            hojas = sorted(set(self.hits) | set(self.misses))
+            h = sum(self.hits.values()); m = sum(self.misses.values())
+            return {
+                "hits": h, "misses": m,
+                "hit_rate": h / (h + m) if h + m else 0.0,
+                "ttl": self.ttl,
+                "hojas": {x: {"hits": self.hits.get(x, 0), "misses": self.misses.get(x, 0), "version": self._versiones.get(x, 0)} for x in hojas},
+            }
+
+
+class LRUCache:
+    """LRU acotado y seguro entre hilos, con contadores de aciertos para dimensionarlo."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_build(self, clave, construir):
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.hits += 1
+                return self._datos[clave]
+            self.misses += 1
+        valor = construir()
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+                self.evictions += 1
+        return valor
+
+    def clear(self):
+        with self._lock: self._datos.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"size": len(self._datos), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "hit_rate": self.hits / total if total else 0.0}
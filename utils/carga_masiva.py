@@ -0,0 +1,218 @@
+import json
+import time
+import pandas as pd
+from utils.db_con import get_many, append_rows, reserve_ids
+
+# --- FORMATO DEL EXCEL ---
+# Una hoja por nivel (nombres de hoja en minúsculas). En 'componentes', toda columna que no
+# esté en la lista base se guarda como dato técnico en specs_json (ej: "Potencia", "RPM").
+COLS_IMPORT = {
+    "equipos": ["tag", "nombre", "planta", "area", "tipo", "criticidad", "estado"],
+    "sistemas": ["equipo_tag", "nombre", "descripcion"],
+    "componentes": ["equipo_tag", "sistema", "nombre", "categoria", "marca", "modelo", "cantidad", "repuesto_sku"],
+}
+REQUERIDAS = {
+    "equipos": ["tag", "nombre", "planta", "area"],
+    "sistemas": ["equipo_tag", "nombre"],
+    "componentes": ["equipo_tag", "sistema", "nombre", "categoria"],
+}
+CHUNK = 5000
+_SEP = "\x1f"
+
+
+def _txt(serie):
+    return serie.astype(object).where(serie.notna(), "").astype(str).str.strip()
+
+
+def _clave(a, b):
+    return a.astype(str) + _SEP + b.astype(str)  # astype: una hoja vacía llega como object
+
+
+def leer_por_bloques(ws, chunk=CHUNK):
+    """Recorre una hoja openpyxl (read_only) en DataFrames de 'chunk' filas; el índice es la fila de Excel."""
+    filas = ws.iter_rows(values_only=True)
+    encabezado = next(filas, None)
+    if encabezado is None: return
+    cols = [str(c).strip() if c is not None else f"_col{i}" for i, c in enumerate(encabezado)]
+    n = len(cols)
+    bloque = []; inicio = 2
+    for fila in filas:
+        # En modo read_only las filas pueden venir más cortas que el encabezado
+        bloque.append(fila[:n] if len(fila) >= n else fila + (None,) * (n - len(fila)))
+        if len(bloque) >= chunk:
+            yield _a_df(bloque, cols, inicio)
+            inicio += len(bloque); bloque = []
+    if bloque: yield _a_df(bloque, cols, inicio)
+
+
+def _a_df(bloque, cols, inicio):
+    df = pd.DataFrame.from_records(bloque, columns=cols)
+    df.index = pd.RangeIndex(inicio, inicio + len(df), name="fila")
+    return df.dropna(how="all")
+
+
+class ImportacionActivos:
+    """
+    Valida un Excel de activos por bloques (checks vectorizados) y lo confirma con
+    una sola escritura por hoja. Uso: imp = ImportacionActivos(); imp.analizar(archivo); imp.confirmar()
+    """
+
+    def __init__(self):
+        datos = get_many(["equipos", "sistemas", "sistemas_config", "familias_config"])
+        df_eq, df_sys = datos["equipos"], datos["sistemas"]
+        self.tags_existentes = set(df_eq["tag"]) if not df_eq.empty else set()
+        self.sistemas_existentes = df_sys[["equipo_tag", "nombre", "id"]].copy() if not df_sys.empty else pd.DataFrame(columns=["equipo_tag", "nombre", "id"])
+        self.sistemas_existentes["nombre"] = _txt(self.sistemas_existentes["nombre"]).str.upper()
+        self.claves_sys_existentes = set(_clave(self.sistemas_existentes["equipo_tag"], self.sistemas_existentes["nombre"]))
+        df_sc, df_fc = datos["sistemas_config"], datos["familias_config"]
+        # Mayúsculas solo para comparar: lo que se guarda es el nombre tal como está escrito en el maestro
+        nombres_sc = _txt(df_sc["nombre_sistema"]) if not df_sc.empty else pd.Series(dtype=object)
+        self.sistemas_maestro = dict(zip(nombres_sc.str.upper(), nombres_sc))
+        nombres_fc = _txt(df_fc["nombre_familia"]) if not df_fc.empty else pd.Series(dtype=object)
+        asociados = _txt(df_fc["sistema_asociado"]).str.upper() if not df_fc.empty else pd.Series(dtype=object)
+        self.familias = dict(zip(_clave(nombres_fc.str.upper(), asociados), nombres_fc))
+
+        self.tags_nuevos = set()
+        self.claves_sys_nuevas = set()
+        self.validos = {h: [] for h in COLS_IMPORT}
+        self.errores = []
+        self.leidas = {h: 0 for h in COLS_IMPORT}
+        self.segundos = 0.0
+
+    # --- VALIDACIÓN ---
+    def _error(self, hoja, df, mask, msg):
+        if mask.any(): self.errores.append(pd.DataFrame({"hoja": hoja, "fila": df.index[mask], "error": msg}))
+
+    def _base(self, hoja, df):
+        # Encabezados base sin importar mayúsculas ("TAG" -> "tag"); los extra conservan su nombre
+        df.rename(columns={c: c.lower() for c in df.columns if c.lower() in COLS_IMPORT[hoja]}, inplace=True)
+        for c in COLS_IMPORT[hoja]:
+            if c not in df.columns: df[c] = None
+        for c in COLS_IMPORT[hoja]:
+            if c != "cantidad": df[c] = _txt(df[c])
+        malo = pd.Series(False, index=df.index)
+        for c in REQUERIDAS[hoja]:
+            vacio = df[c] == ""
+            self._error(hoja, df, vacio, f"'{c}' es obligatorio")
+            malo |= vacio
+        return malo
+
+    def _equipos(self, df):
+        malo = self._base("equipos", df)
+        df["tag"] = df["tag"].str.upper()
+        dup = df["tag"].duplicated() | df["tag"].isin(self.tags_nuevos)
+        self._error("equipos", df, dup & ~malo, "TAG duplicado en el archivo")
+        existe = df["tag"].isin(self.tags_existentes)
+        self._error("equipos", df, existe & ~malo, "TAG ya existe en el sistema")
+        ok = df[~(malo | dup | existe)]
+        self.tags_nuevos.update(ok["tag"])
+        return ok
+
+    def _sistemas(self, df):
+        malo = self._base("sistemas", df)
+        df["equipo_tag"] = df["equipo_tag"].str.upper()
+        nombre = df["nombre"].str.upper()
+        sin_eq = ~(df["equipo_tag"].isin(self.tags_existentes) | df["equipo_tag"].isin(self.tags_nuevos))
+        self._error("sistemas", df, sin_eq & ~malo, "Equipo (TAG) no existe")
+        sin_maestro = ~nombre.isin(self.sistemas_maestro.keys())
+        self._error("sistemas", df, sin_maestro & ~malo, "Sistema no está en sistemas_config")
+        clave = _clave(df["equipo_tag"], nombre)
+        dup = clave.duplicated() | clave.isin(self.claves_sys_nuevas) | clave.isin(self.claves_sys_existentes)
+        self._error("sistemas", df, dup & ~malo, "Sistema duplicado para el equipo")
+        valido = ~(malo | sin_eq | sin_maestro | dup)
+        ok = df[valido].copy()
+        ok["nombre"] = nombre[valido].map(self.sistemas_maestro)
+        self.claves_sys_nuevas.update(clave[valido])
+        return ok
+
+    def _componentes(self, df):
+        malo = self._base("componentes", df)
+        extras = [c for c in df.columns if c not in COLS_IMPORT["componentes"] and not c.startswith("_col")]
+        df["equipo_tag"] = df["equipo_tag"].str.upper()
+        df["sistema"] = df["sistema"].str.upper()
+        familia = _clave(df["categoria"].str.upper(), df["sistema"])
+        clave = _clave(df["equipo_tag"], df["sistema"])
+        sin_sys = ~(clave.isin(self.claves_sys_existentes) | clave.isin(self.claves_sys_nuevas))
+        self._error("componentes", df, sin_sys & ~malo, "Sistema no existe para ese equipo")
+        sin_fam = ~familia.isin(self.familias.keys())
+        self._error("componentes", df, sin_fam & ~malo, "Familia no configurada en familias_config para ese sistema")
+        cant = pd.to_numeric(df["cantidad"], errors="coerce")
+        # Enteros positivos: 2.7 es un error de digitación, no se trunca a 2
+        mala_cant = (cant.isna() & df["cantidad"].notna()) | (cant < 1) | (cant.notna() & (cant % 1 != 0))
+        self._error("componentes", df, mala_cant & ~malo, "Cantidad inválida")
+        ok = df[~(malo | sin_sys | sin_fam | mala_cant)].copy()
+        ok["cantidad"] = cant[ok.index].fillna(1).astype(int)
+        ok["categoria"] = familia[ok.index].map(self.familias)
+        # Columnas extra -> specs_json (se omiten celdas vacías)
+        if extras:
+            specs = ok[extras].astype(object).where(ok[extras].notna(), None).to_dict("records")
+            ok["specs_json"] = [json.dumps({k: str(v) for k, v in s.items() if v is not None and str(v).strip() != ""}, ensure_ascii=False) for s in specs]
+        else:
+            ok["specs_json"] = "{}"
+        return ok[COLS_IMPORT["componentes"] + ["specs_json"]]
+
+    def analizar(self, archivo, chunk=CHUNK):
+        """Lee el xlsx en modo streaming (read_only) y valida bloque por bloque."""
+        from openpyxl import load_workbook  # pesado: solo al subir un archivo
+        t0 = time.perf_counter()
+        wb = load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            hojas = {ws.title.strip().lower(): ws for ws in wb.worksheets}
+            # El orden importa: los sistemas se validan contra los equipos nuevos, y así sucesivamente
+            for hoja, validar in (("equipos", self._equipos), ("sistemas", self._sistemas), ("componentes", self._componentes)):
+                if hoja not in hojas: continue
+                for df in leer_por_bloques(hojas[hoja], chunk):
+                    self.leidas[hoja] += len(df)
+                    ok = validar(df)
+                    if not ok.empty: self.validos[hoja].append(ok)
+        finally:
+            wb.close()
+        self.segundos = time.perf_counter() - t0
+        return self
+
+    # --- RESULTADOS ---
+    def df_validos(self, hoja):
+        partes = self.validos[hoja]
+        return pd.concat(partes) if partes else pd.DataFrame(columns=COLS_IMPORT[hoja])
+
+    def df_errores(self):
+        if not self.errores: return pd.DataFrame(columns=["hoja", "fila", "error"])
+        return pd.concat(self.errores, ignore_index=True).sort_values(["hoja", "fila"], kind="stable")
+
+    def resumen(self):
+        total = sum(self.leidas.values())
+        return {
+            "leidas": dict(self.leidas),
+            "validas": {h: sum(len(p) for p in self.validos[h]) for h in COLS_IMPORT},
+            "errores": sum(len(e) for e in self.errores),
+            "segundos": round(self.segundos, 2),
+            "filas_por_seg": round(total / self.segundos) if self.segundos else 0,
+        }
+
+    # --- CONFIRMACIÓN ---
+    def confirmar(self):
+        """Asigna IDs en bloque, resuelve padres con joins y escribe cada hoja de una sola vez."""
+        eq = self.df_validos("equipos").copy()
+        if not eq.empty:
+            eq["id"] = list(reserve_ids("equipos", len(eq)))
+            eq["criticidad"] = eq["criticidad"].replace("", "Media")
+            eq["estado"] = eq["estado"].replace("", "OK")
+            append_rows(eq[["id"] + COLS_IMPORT["equipos"]], "equipos")
+
+        sis = self.df_validos("sistemas").copy()
+        if not sis.empty:
+            sis["id"] = list(reserve_ids("sistemas", len(sis)))
+            append_rows(sis[["id"] + COLS_IMPORT["sistemas"]], "sistemas")
+
+        comp = self.df_validos("componentes").copy()
+        if not comp.empty:
+            # Hash join (equipo_tag, sistema) -> sistema_id contra sistemas existentes + nuevos
+            # 'sistema' en componentes viene en mayúsculas (clave de comparación); los nombres guardados, como en el maestro
+            partes = [self.sistemas_existentes] + ([sis[["equipo_tag", "nombre", "id"]].assign(nombre=sis["nombre"].str.upper())] if not sis.empty else [])
+            mapa = pd.concat(partes, ignore_index=True)
+            mapa = mapa.drop_duplicates(["equipo_tag", "nombre"]).rename(columns={"nombre": "sistema", "id": "sistema_id"})
+            comp = comp.merge(mapa, on=["equipo_tag", "sistema"], how="left")
+            comp["id"] = list(reserve_ids("componentes", len(comp)))
+            cols = ["id", "sistema_id", "nombre", "marca", "modelo", "cantidad", "categoria", "repuesto_sku", "specs_json"]
+            append_rows(comp[cols], "componentes")
+        return {"equipos": len(eq), "sistemas": len(sis), "componentes": len(comp)}
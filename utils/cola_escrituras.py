@@ -0,0 +1,263 @@
+import os
+import time
+import pickle
+import random
+import sqlite3
+import threading
+import pandas as pd
+from utils.backends import clave_de, normalizar_clave, combinar_por_clave, max_id
+from utils.esquemas import aplicar_esquema
+
+# --- COLA DE ESCRITURAS DIFERIDAS (WRITE-BEHIND) ---
+# Con storage.write_behind activo, save_data / append_rows / update_rows / delete_rows no esperan a la red:
+# la operación se guarda en un SQLite local (sobrevive a un reinicio), se aplica al caché
+# (la app la ve de inmediato) y un hilo la sube al backend.
+# El hilo junta las operaciones pendientes de una misma hoja antes de subirlas:
+#   save + lo que venga detrás          -> una sola reescritura (lo anterior queda reemplazado)
+#   appends seguidos                     -> un append
+#   upserts seguidos (mismas columnas)   -> un upsert (la última versión de cada clave)
+#   upsert de filas recién agregadas     -> se funde en el append pendiente
+#   deletes seguidos                     -> un delete
+# Cuota de Sheets (429 / RESOURCE_EXHAUSTED): espera exponencial (1, 2, 4 … 64 s) y reintenta sin límite.
+# Otros errores: hasta MAX_REINTENTOS; después la operación queda como 'fallida' (se ve en la app).
+# Entrega "al menos una vez": una subida que llegó pero no se confirmó (timeout, corte antes de borrarla
+# del spill) se vuelve a enviar. save / upsert / delete son idempotentes; un append reenviado primero
+# consulta las claves de la hoja y solo sube las filas que no están.
+TIPOS_OP = ("save", "append", "upsert", "delete")
+DEMORA = 0.5          # segundos de ventana para juntar ráfagas
+ESPERA_BASE = 1.0
+ESPERA_MAX = 64.0
+MAX_REINTENTOS = 5
+
+
+def es_limite_cuota(error):
+    """True si el error es de cuota / rate limit de la API de Google."""
+    codigo = getattr(getattr(error, "response", None), "status_code", None)
+    if codigo == 429: return True
+    txt = str(error).upper()
+    return any(m in txt for m in ("429", "RATE_LIMIT", "RESOURCE_EXHAUSTED", "QUOTA EXCEEDED", "RATELIMITEXCEEDED"))
+
+
+class Operacion:
+    def __init__(self, tipo, hoja, df=None, valores=None, key=None, ids=None, intentos=0, reenvio=False):
+        self.tipo, self.hoja, self.df, self.valores = tipo, hoja, df, valores
+        self.key = key or clave_de(hoja)
+        self.ids = list(ids or [])   # filas del spill que representa (varias si se juntó)
+        self.intentos = intentos
+        self.reenvio = reenvio       # pudo haber llegado antes (restaurada del spill o reintentada)
+
+    def aplicar(self, df):
+        """Resultado de la operación sobre la hoja en memoria (ya tipada). Idempotente."""
+        if self.tipo == "save": return aplicar_esquema(self.hoja, self.df.copy())
+        if df is None or df.empty:
+            if self.tipo == "delete": return df
+            return aplicar_esquema(self.hoja, self.df.copy())
+        if self.tipo == "append":
+            # Si la lectura ya trae las filas (la subida terminó mientras se leía), no se duplican
+            nuevos = self.df
+            if self.key in nuevos.columns and self.key in df.columns:
+                nuevos = nuevos[~normalizar_clave(nuevos[self.key]).isin(set(normalizar_clave(df[self.key])))]
+            if nuevos.empty: return df
+            return aplicar_esquema(self.hoja, pd.concat([df.astype(object), nuevos.astype(object)], ignore_index=True))
+        if self.tipo == "upsert":
+            return aplicar_esquema(self.hoja, combinar_por_clave(df, self.df, self.key))
+        borrar = set(normalizar_clave(pd.Series(list(self.valores), dtype=object)))
+        return df[~normalizar_clave(df[self.key]).isin(borrar)].reset_index(drop=True)
+
+
+def coalescer(ops):
+    """Junta una secuencia de operaciones (de una misma hoja, en orden) en la menor cantidad posible."""
+    salida = []
+    for op in ops:
+        previa = salida[-1] if salida else None
+        if op.tipo == "save":
+            salida = [Operacion("save", op.hoja, op.df, key=op.key, ids=[i for o in salida for i in o.ids] + op.ids)]
+        elif previa is not None and previa.tipo == "save":
+            # Todo lo que sigue a una reescritura se aplica sobre ella en memoria
+            df = previa.df.astype(object)
+            if op.tipo == "append": df = pd.concat([df, op.df.astype(object)], ignore_index=True)
+            elif op.tipo == "upsert": df = combinar_por_clave(df, op.df, op.key)
+            else: df = df[~normalizar_clave(df[op.key]).isin(set(normalizar_clave(pd.Series(list(op.valores), dtype=object))))]
+            previa.df = df.reset_index(drop=True); previa.ids += op.ids
+        elif previa is not None and previa.tipo == op.tipo == "append":
+            previa.df = pd.concat([previa.df, op.df], ignore_index=True); previa.ids += op.ids
+            previa.reenvio |= op.reenvio
+        elif previa is not None and previa.tipo == "append" and op.tipo == "upsert" and op.key == previa.key and op.key in previa.df.columns \
+                and normalizar_clave(op.df[op.key]).isin(set(normalizar_clave(previa.df[op.key]))).all():
+            previa.df = combinar_por_clave(previa.df, op.df, op.key); previa.ids += op.ids
+        elif previa is not None and previa.tipo == op.tipo == "upsert" and op.key == previa.key and list(op.df.columns) == list(previa.df.columns):
+            df = pd.concat([previa.df, op.df], ignore_index=True)
+            previa.df = df[~normalizar_clave(df[op.key]).duplicated(keep="last")].reset_index(drop=True); previa.ids += op.ids
+        elif previa is not None and previa.tipo == op.tipo == "delete" and op.key == previa.key:
+            previa.valores = list(previa.valores) + list(op.valores); previa.ids += op.ids
+        else:
+            salida.append(Operacion(op.tipo, op.hoja, op.df, op.valores, op.key, op.ids, op.intentos, op.reenvio))
+    return salida
+
+
+class ColaEscrituras:
+    """
+    backend_fn: función que devuelve el backend (se resuelve en cada subida).
+    al_fallar(hoja): aviso cuando una operación se descarta (el caché tenía aplicado un cambio que no llegó).
+    contexto: se llama en el hilo antes de cada subida (p.ej. para adjuntar el contexto de Streamlit).
+    """
+
+    def __init__(self, backend_fn, path="data/cola_escrituras.db", demora=DEMORA, al_fallar=None, contexto=None):
+        self._backend_fn = backend_fn
+        self.demora = demora
+        self._al_fallar = al_fallar
+        self._contexto = contexto  # callable que prepara el hilo (p.ej. contexto de Streamlit)
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._con = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("""CREATE TABLE IF NOT EXISTS cola (id INTEGER PRIMARY KEY AUTOINCREMENT, hoja TEXT, tipo TEXT,
+                             clave TEXT, datos BLOB, intentos INTEGER DEFAULT 0, estado TEXT DEFAULT 'pendiente',
+                             error TEXT, creado REAL)""")
+        self._lock = threading.Lock()
+        self._hay_trabajo = threading.Condition(self._lock)
+        self._vacia = threading.Condition(self._lock)
+        self._pendientes = []  # Operacion en orden de llegada
+        self._en_curso = 0
+        self._subiendo = []    # lote que el hilo está subiendo ahora
+        self.stats = {"encoladas": 0, "subidas": 0, "llamadas": 0, "reintentos": 0, "cuota": 0, "fallidas": 0}
+        self.espera_hasta = 0.0
+        self.ultimo_error = None
+        # Lo que quedó sin subir en la corrida anterior
+        for i, hoja, tipo, clave, datos, intentos in self._con.execute(
+                "SELECT id, hoja, tipo, clave, datos, intentos FROM cola WHERE estado = 'pendiente' ORDER BY id"):
+            df, valores = pickle.loads(datos)
+            self._pendientes.append(Operacion(tipo, hoja, df, valores, clave, [i], intentos, reenvio=True))
+        self._hilo = threading.Thread(target=self._trabajar, name="cmms-write-behind", daemon=True)
+        self._hilo.start()
+
+    # --- API ---
+    def encolar(self, tipo, hoja, df=None, valores=None, key=None):
+        if tipo not in TIPOS_OP: raise ValueError(f"Operación inválida: {tipo}")
+        op = Operacion(tipo, hoja, None if df is None else df.copy(), None if valores is None else list(valores), key)
+        datos = pickle.dumps((op.df, op.valores), protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            cur = self._con.execute("INSERT INTO cola (hoja, tipo, clave, datos, creado) VALUES (?, ?, ?, ?, ?)",
+                                    (hoja, tipo, op.key, datos, time.time()))
+            op.ids = [cur.lastrowid]
+            self._pendientes.append(op)
+            self.stats["encoladas"] += 1
+            self._hay_trabajo.notify()
+        return op
+
+    def profundidad(self):
+        with self._lock: return len(self._pendientes) + self._en_curso
+
+    def pendientes(self, hoja):
+        """Operaciones aún no confirmadas de la hoja (para reaplicarlas sobre una lectura fresca)."""
+        with self._lock: return [op for op in self._subiendo + self._pendientes if op.hoja == hoja]
+
+    def max_id(self, hoja):
+        """Mayor id que traen las escrituras de la hoja que aún no llegaron (pendientes, subiendo o fallidas)."""
+        with self._lock:
+            dfs = [op.df for op in self._subiendo + self._pendientes if op.hoja == hoja]
+            dfs += [pickle.loads(d)[0] for (d,) in self._con.execute("SELECT datos FROM cola WHERE estado = 'fallida' AND hoja = ?", [hoja])]
+        return max((max_id(df) for df in dfs), default=0)
+
+    def estado(self):
+        with self._lock:
+            por_hoja = {}
+            for op in self._pendientes: por_hoja[op.hoja] = por_hoja.get(op.hoja, 0) + 1
+            return {"profundidad": len(self._pendientes) + self._en_curso, "por_hoja": por_hoja, **self.stats,
+                    "espera_s": max(0.0, round(self.espera_hasta - time.monotonic(), 1)), "ultimo_error": self.ultimo_error}
+
+    def fallidas(self):
+        with self._lock:
+            return pd.read_sql_query("SELECT id, hoja, tipo, intentos, error, creado FROM cola WHERE estado = 'fallida' ORDER BY id", self._con)
+
+    def reintentar_fallidas(self):
+        with self._lock:
+            filas = self._con.execute("SELECT id, hoja, tipo, clave, datos FROM cola WHERE estado = 'fallida' ORDER BY id").fetchall()
+            self._con.execute("UPDATE cola SET estado = 'pendiente', intentos = 0 WHERE estado = 'fallida'")
+            for i, hoja, tipo, clave, datos in filas:
+                df, valores = pickle.loads(datos)
+                self._pendientes.append(Operacion(tipo, hoja, df, valores, clave, [i], reenvio=True))
+            self._hay_trabajo.notify()
+        return len(filas)
+
+    def vaciar(self, timeout=None):
+        """Espera a que no quede nada pendiente (CLI, apagado). True si se vació a tiempo."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._pendientes or self._en_curso:
+                self._hay_trabajo.notify()
+                resto = None if limite is None else limite - time.monotonic()
+                if resto is not None and resto <= 0: return False
+                self._vacia.wait(resto if resto is not None else 1.0)
+        return True
+
+    # --- HILO DE SUBIDA ---
+    def _trabajar(self):
+        fallos_cuota = 0
+        while True:
+            with self._lock:
+                while not self._pendientes: self._hay_trabajo.wait()
+            time.sleep(max(self.demora, self.espera_hasta - time.monotonic()))  # ventana para juntar la ráfaga
+            if self._contexto is not None:
+                try: self._contexto()
+                except Exception: pass
+            with self._lock:
+                lote, self._pendientes = self._pendientes, []
+                self._en_curso = len(lote)
+                self._subiendo = lote
+            resto = []
+            hojas = list(dict.fromkeys(op.hoja for op in lote))
+            for n, hoja in enumerate(hojas):
+                ops = coalescer([op for op in lote if op.hoja == hoja])
+                cuota = False
+                for j, op in enumerate(ops):
+                    try:
+                        self._subir(op)
+                        fallos_cuota = 0
+                        continue
+                    except Exception as e:
+                        self.ultimo_error = f"{hoja}: {e}"
+                        error = e
+                    if es_limite_cuota(error):
+                        # La cuota es de todo el proyecto: se espera y se reintenta todo lo que falta
+                        fallos_cuota += 1; self.stats["cuota"] += 1; cuota = True
+                        self.espera_hasta = time.monotonic() + min(ESPERA_MAX, ESPERA_BASE * 2 ** (fallos_cuota - 1)) * (1 + random.random() * 0.25)
+                        resto += ops[j:]
+                        break
+                    op.intentos += 1; self.stats["reintentos"] += 1
+                    if op.intentos >= MAX_REINTENTOS:
+                        self._descartar(op, error)
+                        continue
+                    self.espera_hasta = time.monotonic() + min(ESPERA_MAX, ESPERA_BASE * 2 ** (op.intentos - 1))
+                    resto += ops[j:]  # el orden dentro de la hoja se respeta
+                    break
+                if cuota:
+                    resto += [op for h in hojas[n + 1:] for op in lote if op.hoja == h]
+                    break
+            with self._lock:
+                self._pendientes = resto + self._pendientes
+                self._en_curso = 0
+                self._subiendo = []
+                if not self._pendientes: self._vacia.notify_all()
+
+    def _subir(self, op):
+        backend = self._backend_fn()
+        if op.tipo == "save": backend.write_table(op.hoja, op.df)
+        elif op.tipo == "append": backend.append_rows(op.hoja, self._sin_repetidas(backend, op))
+        elif op.tipo == "upsert": backend.upsert_rows(op.hoja, op.df, key=op.key)
+        else: backend.delete_rows(op.hoja, op.valores, key=op.key)
+        with self._lock:
+            self._con.execute(f"DELETE FROM cola WHERE id IN ({','.join('?' * len(op.ids))})", op.ids)
+            self.stats["llamadas"] += 1; self.stats["subidas"] += len(op.ids)
+
+    def _sin_repetidas(self, backend, op):
+        """Filas del append que faltan en la hoja: si la operación pudo haber llegado, no se duplica."""
+        if not (op.reenvio or op.intentos) or op.key not in op.df.columns: return op.df
+        claves = normalizar_clave(op.df[op.key])
+        return op.df[op.df[op.key].isna() | ~claves.isin(backend.read_keys(op.hoja, op.key))]
+
+    def _descartar(self, op, error):
+        with self._lock:
+            self._con.execute(f"UPDATE cola SET estado = 'fallida', intentos = ?, error = ? WHERE id IN ({','.join('?' * len(op.ids))})",
+                              [op.intentos, str(error)[:500]] + op.ids)
+            self.stats["fallidas"] += len(op.ids)
+        if self._al_fallar is not None: self._al_fallar(op.hoja)
@@ -1,30 +1,426 @@
+import os
+import time
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
 import pandas as pd
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from utils.backends import GSheetsBackend, SQLiteBackend
+from utils.cache import SheetCache
+from utils.esquemas import aplicar_esquema
+from utils.lecturas_store import LecturasStore, a_filas_hoja
+from utils.perfil import span, en_hilo, bytes_df
+from utils.cola_escrituras import ColaEscrituras
+from utils.snapshots import SnapshotStore, DISPONIBLE as SNAPSHOTS_DISPONIBLES
+
+# --- BACKEND DE ALMACENAMIENTO ---
+# Se elige en .streamlit/secrets.toml:
+#   [storage]
+#   backend = "sqlite"          # "gsheets" (por defecto) o "sqlite"
+#                               # gsheets: un solo proceso por libro. IDs y escrituras por fila se coordinan en la
+#                               # memoria del proceso (todas sus sesiones); dos réplicas de la app repartirían los mismos IDs.
+#                               # sqlite: el contador está en la base (_secuencias), válido entre procesos que la compartan.
+#   sqlite_path = "data/cmms.db"
+#   cache_ttl = 600             # segundos; cubre cambios hechos directo en el Sheet
+#   lecturas_path = ":memory:"  # réplica local de la hoja 'lecturas' para gráficos y alarmas (ver get_lecturas_store);
+#                               # con una ruta (ej: "data/lecturas.db") persiste entre reinicios. La sincronización
+#                               # pide al backend las filas con id nuevo: sqlite solo devuelve esas; gsheets no filtra en
+#                               # el origen y baja la hoja entera (sin guardarla en el caché del proceso).
+#                               # Las lecturas siempre se guardan en el backend: la réplica no es la fuente de verdad.
+#   write_behind = true         # los "Guardar" no esperan a la red (ver utils/cola_escrituras.py)
+#   cola_path = "data/cola_escrituras.db"
+#   snapshots = true            # foto local de cada hoja (por defecto solo con gsheets; ver utils/snapshots.py)
+#   snapshot_dir = "data/snapshots"
+# Las variables de entorno CMMS_BACKEND / CMMS_SQLITE_PATH / CMMS_CACHE_TTL / CMMS_WRITE_BEHIND tienen prioridad (útil sin Streamlit).
+_BACKEND = None
+_LOCK = threading.Lock()
+_CACHE = None
+_LECTURAS = None
+_LECTURAS_SYNC = [None, 0.0]  # [token de la hoja 'lecturas' ya volcado a la réplica, cuándo]
+_LOCK_LECTURAS = threading.Lock()
+VENTANA_SYNC = 1000  # IDs reservados que llegan tarde a la hoja (otra instancia, cola diferida); los repetidos se ignoran
+_COLA = None
+_COLA_LISTA = False
+_SNAPSHOTS = None
+_SNAPSHOTS_LISTO = False
+_ORIGEN = {}  # hoja -> ("red" | "foto" | "sin_red", antigüedad de la foto en s)
+_CTX_COLA = [None]  # último contexto de Streamlit que encoló (el hilo de subida lo necesita para st.connection)
+_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="cmms-io")
+
+
+def _config_storage():
+    cfg = {}
+    try: cfg = dict(st.secrets.get("storage", {}))
+    except Exception: pass
+    return {
+        "backend": os.environ.get("CMMS_BACKEND", cfg.get("backend", "gsheets")).lower(),
+        "sqlite_path": os.environ.get("CMMS_SQLITE_PATH", cfg.get("sqlite_path", "data/cmms.db")),
+        "cache_ttl": float(os.environ.get("CMMS_CACHE_TTL", cfg.get("cache_ttl", 600))),
+        "lecturas_path": os.environ.get("CMMS_LECTURAS_PATH", cfg.get("lecturas_path", ":memory:")),
+        "write_behind": str(os.environ.get("CMMS_WRITE_BEHIND", cfg.get("write_behind", False))).strip().lower() in ("1", "true", "si", "yes"),
+        "cola_path": os.environ.get("CMMS_COLA_PATH", cfg.get("cola_path", "data/cola_escrituras.db")),
+        "snapshots": os.environ.get("CMMS_SNAPSHOTS", cfg.get("snapshots", "")),
+        "snapshot_dir": os.environ.get("CMMS_SNAPSHOT_DIR", cfg.get("snapshot_dir", "data/snapshots")),
+    }
+
+
+def get_backend():
+    """Devuelve el backend activo (uno por proceso)."""
+    global _BACKEND
+    if _BACKEND is None:
+        with _LOCK:
+            if _BACKEND is None:
+                cfg = _config_storage()
+                if cfg["backend"] == "sqlite": _BACKEND = SQLiteBackend(cfg["sqlite_path"])
+                else: _BACKEND = GSheetsBackend()
+    return _BACKEND
+
+
+def set_backend(backend):
+    """Fuerza un backend concreto (pruebas, scripts sin Streamlit)."""
+    global _BACKEND
+    with _LOCK: _BACKEND = backend
+    get_cache().invalidate()
+
+
+def get_lecturas_store():
+    """
+    Réplica local de la hoja 'lecturas' (series de tiempo indexadas por componente y fecha).
+    La fuente de verdad es el backend: se escribe con guardar_lecturas() y lo que agreguen
+    otras instancias se trae con sincronizar_lecturas() (solo las filas con id nuevo).
+    """
+    global _LECTURAS
+    if _LECTURAS is None:
+        with _LOCK:
+            if _LECTURAS is None: _LECTURAS = LecturasStore(_config_storage()["lecturas_path"])
+    sincronizar_lecturas()
+    return _LECTURAS
+
+
+def set_lecturas_store(store):
+    global _LECTURAS
+    with _LOCK:
+        _LECTURAS = store
+        _LECTURAS_SYNC[:] = [None, 0.0]
+
+
+def sincronizar_lecturas(forzar=False):
+    """
+    Copia al almacén local las lecturas del backend con id mayor al último sincronizado.
+    Se salta mientras la hoja no cambió y no pasó cache_ttl (cubre lo que guardan otras instancias).
+    Lee directo del backend: la hoja 'lecturas' no pasa por el caché del proceso (la réplica ya es su copia).
+    """
+    store, cache = _LECTURAS, get_cache()
+    if store is None: return 0
+    token, hecho = _LECTURAS_SYNC
+    if not forzar and token == cache.token("lecturas") and (cache.ttl is None or time.monotonic() - hecho < cache.ttl): return 0
+    with _LOCK_LECTURAS:
+        token = cache.token("lecturas")
+        marca = store.marca("lecturas_sync")
+        # Filas sin id (cargadas a mano en la hoja) solo en la primera sincronización: esa lee la hoja completa
+        desde = None if store.marca("lecturas_sync_sin_id") == 0 else marca - VENTANA_SYNC
+        n = 0
+        try:
+            with span("backend.read", hoja="lecturas", desde=desde) as r:
+                df = get_backend().read_rows_after("lecturas", desde)
+                r["filas"] = len(df); r["bytes"] = bytes_df(df)
+            df = aplicar_esquema("lecturas", df)
+        except Exception:
+            df = pd.DataFrame()  # hoja inexistente o sin red: se reintenta al vencer cache_ttl
+        if not df.empty:
+            n = store.append(df)
+            store.fijar_marca("lecturas_sync_sin_id", 1)
+            ids = pd.to_numeric(df["id"], errors="coerce") if "id" in df.columns else pd.Series(dtype=float)
+            if ids.notna().any(): store.fijar_marca("lecturas_sync", max(marca, int(ids.max())))
+        _LECTURAS_SYNC[:] = [token, time.monotonic()]
+        return n
+
+
+def guardar_lecturas(df):
+    """
+    Guarda lecturas nuevas (componente_id, parametro, valor, tecnico y ts o fecha/hora):
+    primero en el backend (hoja 'lecturas', con IDs reservados) y luego en la réplica local.
+    Devuelve la cantidad guardada.
+    """
+    store = get_lecturas_store()
+    filas = a_filas_hoja(df)
+    if filas.empty: return 0
+    filas.insert(0, "id", list(reserve_ids("lecturas", len(filas))))
+    with _LOCK_LECTURAS:
+        al_dia = _LECTURAS_SYNC[0] == get_cache().token("lecturas")
+        append_rows(filas, "lecturas")
+        n = store.append(filas)
+        # Lo propio ya está en la réplica: esta escritura no obliga a volver a bajar la hoja
+        if al_dia: _LECTURAS_SYNC[0] = get_cache().token("lecturas")
+    return n
+
+
+def _adjuntar_contexto():
+    if _CTX_COLA[0] is not None: add_script_run_ctx(threading.current_thread(), _CTX_COLA[0])
+
+
+def get_cola():
+    """Cola de escrituras diferidas (None si storage.write_behind está apagado)."""
+    global _COLA, _COLA_LISTA
+    if not _COLA_LISTA:
+        with _LOCK:
+            if not _COLA_LISTA:
+                cfg = _config_storage()
+                if cfg["write_behind"]:
+                    _COLA = ColaEscrituras(get_backend, cfg["cola_path"], al_fallar=invalidate_cache, contexto=_adjuntar_contexto)
+                    atexit.register(_COLA.vaciar, 10)  # al apagar se intenta subir lo pendiente (el resto queda en disco)
+                _COLA_LISTA = True
+    return _COLA
+
+
+def estado_escrituras():
+    """Profundidad y contadores de la cola (None si no hay write-behind)."""
+    cola = get_cola()
+    return None if cola is None else cola.estado()
+
+
+def _diferir(tipo, worksheet_name, df=None, valores=None, key=None):
+    """Encola la escritura y la aplica al caché. False si no hay write-behind (escritura directa)."""
+    cola = get_cola()
+    if cola is None: return False
+    ctx = get_script_run_ctx()
+    if ctx is not None: _CTX_COLA[0] = ctx
+    with span("encolar", hoja=worksheet_name, tipo=tipo, filas=0 if df is None else len(df)):
+        op = cola.encolar(tipo, worksheet_name, df, valores, key)
+        get_cache().actualizar(worksheet_name, op.aplicar)
+    return True
+
+
+def get_snapshots():
+    """Fotos locales de las hojas (None si están apagadas o falta pyarrow)."""
+    global _SNAPSHOTS, _SNAPSHOTS_LISTO
+    if not _SNAPSHOTS_LISTO:
+        with _LOCK:
+            if not _SNAPSHOTS_LISTO:
+                cfg = _config_storage()
+                activas = str(cfg["snapshots"]).strip().lower()
+                # Por defecto solo con Google Sheets: SQLite ya es local
+                activas = activas in ("1", "true", "si", "yes") if activas else cfg["backend"] != "sqlite"
+                if activas and SNAPSHOTS_DISPONIBLES: _SNAPSHOTS = SnapshotStore(cfg["snapshot_dir"])
+                _SNAPSHOTS_LISTO = True
+    return _SNAPSHOTS
+
+
+def set_snapshots(store):
+    """Fuerza un almacén de fotos (None = sin fotos) y olvida el origen de cada hoja, como tras un reinicio."""
+    global _SNAPSHOTS, _SNAPSHOTS_LISTO
+    with _LOCK:
+        _SNAPSHOTS, _SNAPSHOTS_LISTO = store, True
+        _ORIGEN.clear()
+
+
+def origen_datos():
+    """{hoja: (origen, antigüedad s)} de la última carga: 'red', 'foto' (arranque) o 'sin_red' (backend caído)."""
+    with _LOCK: return dict(_ORIGEN)
+
+
+def _marcar(hoja, origen, edad=0.0):
+    with _LOCK: _ORIGEN[hoja] = (origen, edad)
+
+
+def _leer_backend(worksheet_name):
+    with span("backend.read", hoja=worksheet_name) as r:
+        df = get_backend().read_table(worksheet_name)
+        r["filas"] = len(df); r["bytes"] = bytes_df(df)
+    return aplicar_esquema(worksheet_name, df)
+
+
+def _con_pendientes(worksheet_name, df):
+    # Lo que aún está en la cola de escritura no llegó al backend: se vuelve a aplicar
+    cola = get_cola()
+    for op in cola.pendientes(worksheet_name) if cola is not None else []: df = op.aplicar(df)
+    return df
+
+
+def _guardar_foto(fotos, worksheet_name, df):
+    try:
+        with span("snapshot.guardar", hoja=worksheet_name, filas=len(df)): fotos.guardar(worksheet_name, df)
+    except Exception:
+        pass  # la foto es una optimización: un disco lleno no debe romper la lectura
+
+
+def _refrescar(worksheet_name, version, fotos):
+    """Descarga en segundo plano la hoja que se sirvió desde la foto y la reemplaza en el caché."""
+    try:
+        df = _leer_backend(worksheet_name)
+    except Exception:
+        _marcar(worksheet_name, "sin_red", _ORIGEN.get(worksheet_name, (None, 0.0))[1])
+        return
+    _guardar_foto(fotos, worksheet_name, df)
+    if get_cache().reemplazar(worksheet_name, _con_pendientes(worksheet_name, df), version): _marcar(worksheet_name, "red")
+
+
+def _cargar_hoja(worksheet_name):
+    """
+    Carga de una hoja que no está en caché:
+      1ª vez en el proceso y hay foto -> la foto al instante + descarga en segundo plano
+      si no                            -> descarga (y la foto se actualiza en segundo plano)
+      backend caído                     -> la foto, si existe
+    Devuelve (df, origen).
+    """
+    fotos = get_snapshots()
+    if fotos is not None and worksheet_name not in _ORIGEN:
+        foto = fotos.cargar(worksheet_name)
+        if foto is not None:
+            _marcar(worksheet_name, "foto", foto[1])
+            ctx = get_script_run_ctx()
+            version = get_cache().version(worksheet_name)
+
+            def _tarea():
+                if ctx is not None: add_script_run_ctx(threading.current_thread(), ctx)
+                _refrescar(worksheet_name, version, fotos)
+            _POOL.submit(_tarea)
+            return _con_pendientes(worksheet_name, foto[0]), "foto"
+    try:
+        df = _leer_backend(worksheet_name)
+    except Exception:
+        foto = fotos.cargar(worksheet_name) if fotos is not None else None
+        if foto is None: raise
+        _marcar(worksheet_name, "sin_red", foto[1])
+        return _con_pendientes(worksheet_name, foto[0]), "sin_red"
+    _marcar(worksheet_name, "red")
+    if fotos is not None: _POOL.submit(_guardar_foto, fotos, worksheet_name, df)
+    return _con_pendientes(worksheet_name, df), "red"
+
+
+def get_cache():
+    """Caché de lecturas compartido por todas las sesiones del proceso."""
+    global _CACHE
+    if _CACHE is None:
+        with _LOCK:
+            if _CACHE is None: _CACHE = SheetCache(ttl=_config_storage()["cache_ttl"])
+    return _CACHE
+
+
+def cache_stats():
+    return get_cache().stats()
+
+
+def invalidate_cache(worksheet_name=None):
+    """Descarta una hoja (o todas) del caché; la próxima lectura va al backend."""
+    get_cache().invalidate(worksheet_name)
+
+
+def data_version(worksheet_name):
+    """
+    Versión de los datos de la hoja: cambia cada vez que se escribe, invalida o recarga.
+    Sirve de clave para estructuras derivadas (índices) que deben reconstruirse solo si la hoja cambió.
+    """
+    return get_cache().token(worksheet_name)
+
 
 def get_data(worksheet_name):
     """
     Lee los datos de la hoja especificada.
-    TTL=0 evita que se quede pegado con datos viejos (Caché).
+    Pasa por el caché del proceso: si la hoja no cambió, no hay llamada a red.
+    El esquema (tipos, TAGs normalizados) se aplica una sola vez, al cargar.
+    Tras un reinicio (o sin red) la hoja sale de la foto local; ver _cargar_hoja().
     """
-    conn = st.connection("gsheets", type=GSheetsConnection)
-    try:
-        df = conn.read(worksheet=worksheet_name, ttl=0)
+    with span("get_data", hoja=worksheet_name, cache="hit") as s:
+        def _cargar():
+            df, s["cache"] = _cargar_hoja(worksheet_name)
+            return df
+        try:
+            df = get_cache().get(worksheet_name, _cargar)
+        except Exception:
+            # Si falla (ej: hoja vacía), retornamos un DF vacío
+            s["cache"] = "error"
+            df = pd.DataFrame()
+        s["filas"] = len(df)
         return df
-    except Exception:
-        # Si falla (ej: hoja vacía), retornamos un DF vacío
-        return pd.DataFrame()
+
+
+def get_many(worksheet_names):
+    """
+    Lee varias hojas en paralelo y devuelve {hoja: DataFrame}.
+    Las que ya están en caché no generan llamada; el resto se descarga a la vez,
+    así la carga en frío cuesta ~1 viaje de red en vez de N.
+    """
+    nombres = list(dict.fromkeys(worksheet_names))
+    pendientes = [n for n in nombres if not get_cache().vigente(n)]
+    if len(pendientes) <= 1:
+        return {n: get_data(n) for n in nombres}
+
+    ctx = get_script_run_ctx()
+
+    def _leer(nombre):
+        # Los hilos del pool necesitan el contexto de la sesión para st.connection / st.secrets
+        if ctx is not None: add_script_run_ctx(threading.current_thread(), ctx)
+        return get_data(nombre)
+
+    with span("get_many", hojas=len(nombres), pendientes=len(pendientes)):
+        futuros = {n: _POOL.submit(en_hilo(_leer), n) for n in pendientes}
+        return {n: futuros[n].result() if n in futuros else get_data(n) for n in nombres}
+
+
+def reserve_ids(worksheet_name, n):
+    """
+    Reserva un bloque de n IDs para inserciones masivas (range de IDs consecutivos).
+    Con write-behind, los IDs de filas encoladas que aún no llegaron a la hoja también cuentan como usados.
+    """
+    cola = get_cola()
+    pendientes = (lambda: cola.max_id(worksheet_name)) if cola is not None else None
+    with span("reserve_ids", hoja=worksheet_name, filas=n):
+        return get_backend().reserve_ids(worksheet_name, n, pendientes=pendientes)
+
+
+def next_id(worksheet_name):
+    """
+    Siguiente ID libre de la hoja, en O(1) y sin choques entre sesiones (con gsheets, del mismo proceso).
+    """
+    return reserve_ids(worksheet_name, 1)[0]
+
 
 def save_data(df, worksheet_name):
     """
-    Guarda los datos en Google Sheets.
-    IMPORTANTE: Limpia los NaN para evitar APIError.
-    """
-    conn = st.connection("gsheets", type=GSheetsConnection)
-    
-    # --- LA SOLUCIÓN AL ERROR ---
-    # Convertimos todos los valores nulos/NaN a cadenas vacías ""
-    # Google Sheets NO acepta NaN.
-    df_clean = df.fillna("")
-    
-    conn.update(worksheet=worksheet_name, data=df_clean)
+    Guarda (reemplaza) la hoja completa.
+    """
+    if _diferir("save", worksheet_name, df=df): return
+    try:
+        with span("save_data", hoja=worksheet_name, filas=len(df), bytes=bytes_df(df)):
+            get_backend().write_table(worksheet_name, df)
+    finally:
+        get_cache().invalidate(worksheet_name)
+
+
+def append_rows(df, worksheet_name):
+    """
+    Agrega filas al final de la hoja (solo viajan las filas nuevas).
+    """
+    if _diferir("append", worksheet_name, df=df): return
+    try:
+        with span("append_rows", hoja=worksheet_name, filas=len(df), bytes=bytes_df(df)):
+            get_backend().append_rows(worksheet_name, df)
+    finally:
+        get_cache().invalidate(worksheet_name)
+
+
+def update_rows(df, worksheet_name, key=None):
+    """
+    Actualiza por clave (id / sku) solo las filas y columnas que trae el DF.
+    Las claves que no existan se agregan (upsert).
+    """
+    if _diferir("upsert", worksheet_name, df=df, key=key): return
+    try:
+        with span("update_rows", hoja=worksheet_name, filas=len(df), bytes=bytes_df(df)):
+            get_backend().upsert_rows(worksheet_name, df, key=key)
+    finally:
+        get_cache().invalidate(worksheet_name)
+
+
+def delete_rows(valores, worksheet_name, key=None):
+    """
+    Elimina las filas cuya clave esté en 'valores'.
+    """
+    if _diferir("delete", worksheet_name, valores=valores, key=key): return
+    try:
+        with span("delete_rows", hoja=worksheet_name):
+            get_backend().delete_rows(worksheet_name, valores, key=key)
+    finally:
+        get_cache().invalidate(worksheet_name)
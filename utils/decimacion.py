@@ -0,0 +1,71 @@
+import os
+import numpy as np
+
+# --- REDUCCIÓN DE SERIES PARA GRÁFICOS ---
+# El gráfico recibe a lo sumo PUNTOS puntos sin importar cuánta historia haya.
+#   "minmax" -> mínimo y máximo de cada tramo (nunca pierde un pico)
+#   "lttb"   -> Largest-Triangle-Three-Buckets (conserva la forma visual)
+# Por encima de UMBRAL_WEBGL puntos el trazo se dibuja con WebGL (scattergl).
+PUNTOS = int(os.environ.get("CMMS_TREND_POINTS", 2000))
+METODO = os.environ.get("CMMS_TREND_METODO", "minmax").lower()
+UMBRAL_WEBGL = int(os.environ.get("CMMS_WEBGL_THRESHOLD", 1000))
+
+
+def _tramos(n, k):
+    """Bordes de k tramos contiguos de tamaño parejo sobre n puntos."""
+    return np.linspace(0, n, k + 1).astype(np.int64)
+
+
+def minmax(y, puntos):
+    """Posiciones del mínimo y del máximo de cada tramo (puntos/2 tramos), en orden."""
+    n = len(y)
+    if n <= puntos: return np.arange(n)
+    k = max(puntos // 2, 1)
+    bordes = _tramos(n, k)
+    tramo = np.repeat(np.arange(k), np.diff(bordes))
+    # Orden por (tramo, valor): el primero de cada tramo es el mínimo y el último el máximo
+    orden = np.lexsort((y, tramo))
+    pos = np.concatenate([orden[bordes[:-1]], orden[bordes[1:] - 1], [0, n - 1]])
+    return np.unique(pos)
+
+
+def lttb(x, y, puntos):
+    """Largest-Triangle-Three-Buckets: un punto por tramo, el que forma el triángulo más grande."""
+    n = len(y)
+    if n <= puntos or puntos < 3: return np.arange(n)
+    bordes = np.linspace(1, n - 1, puntos - 1).astype(np.int64)
+    sel = np.empty(puntos, dtype=np.int64)
+    sel[0], sel[-1] = 0, n - 1
+    a = 0
+    for i in range(puntos - 2):
+        lo, hi = bordes[i], bordes[i + 1]
+        # Promedio del tramo siguiente (el último tramo apunta al punto final)
+        if i + 2 < len(bordes): nlo, nhi = bordes[i + 1], bordes[i + 2]
+        else: nlo, nhi = n - 1, n
+        mx, my = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - mx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (my - y[a]))
+        a = lo + int(area.argmax())
+        sel[i + 1] = a
+    return sel
+
+
+def decimar(df, x="ts", y="valor", puntos=None, metodo=None):
+    """
+    Reduce una serie ordenada por x a ~puntos filas (las filas sin valor se descartan).
+    Devuelve el DataFrame reducido; si ya es chico se devuelve tal cual.
+    """
+    puntos = puntos or PUNTOS
+    metodo = (metodo or METODO).lower()
+    df = df[df[y].notna()]
+    if len(df) <= puntos: return df
+    vals = df[y].to_numpy(dtype="float64")
+    if metodo == "lttb":
+        xs = (df[x] - df[x].iloc[0]).dt.total_seconds().to_numpy()
+        pos = lttb(xs, vals, puntos)
+    else:
+        pos = minmax(vals, puntos)
+    return df.iloc[pos]
+
+
+def usar_webgl(n):
+    return n > UMBRAL_WEBGL
@@ -0,0 +1,273 @@
+import copy
+import json
+import numpy as np
+import pandas as pd
+from utils.jerarquia import indice_activos, IndiceCompartido
+from utils.familias import registro_familias
+from utils.perfil import perfilar
+
+# --- ÍNDICE DE ESPECIFICACIONES TÉCNICAS ---
+# componentes.specs_json se aplana una vez por versión de datos en una tabla larga y columnar:
+#   componente_id | familia | campo | valor_num | unidad | valor_txt
+# ordenada por (campo, valor_num). Un filtro por rango es un searchsorted sobre el tramo del campo;
+# una igualdad de texto, una máscara sobre ese tramo. Ninguna consulta hace json.loads.
+# Las unidades salen de la definición de la familia (familias_config).
+HOJAS_SPECS = ["equipos", "sistemas", "componentes", "familias_config"]
+OPERADORES = ["=", "!=", ">", ">=", "<", "<=", "entre", "contiene"]
+COLS_COMP = ["componente_id", "componente", "familia", "sistema_id", "equipo_tag", "equipo", "planta", "area"]
+COLS_TABLA = ["componente_id", "familia", "campo", "valor_num", "unidad", "valor_txt", "clave"]
+
+# "1800", "1800.5", "1,5" o "50 HP" (número seguido de una sola palabra de unidad)
+_NUM_CON_UNIDAD = r"^\s*(-?\d+(?:\.\d+)?)\s*[^\d\s]*\s*$"
+
+
+def _norm(valor):
+    return str(valor).strip().upper()
+
+
+def _a_numero(txt):
+    """Serie de textos -> float64 (NaN si no es un número)."""
+    limpio = txt.str.strip().str.replace(",", ".", regex=False)
+    num = pd.to_numeric(limpio, errors="coerce")
+    falta = num.isna() & (limpio != "")
+    if falta.any(): num[falta] = pd.to_numeric(limpio[falta].str.extract(_NUM_CON_UNIDAD)[0], errors="coerce")
+    return num.astype("float64")
+
+
+def _unidades():
+    """{(FAMILIA, CAMPO): unidad} de todas las familias configuradas."""
+    reg = registro_familias()
+    unidades = {}
+    for clave in reg.claves():
+        fam = reg.get(*clave)
+        for c in fam.campos:
+            if c.unidad: unidades.setdefault((clave[0], _norm(c.nombre)), c.unidad)
+    return unidades
+
+
+def _aplanar(ids, familias, specs):
+    """
+    Filas largas de un lote de componentes. Cada specs_json distinto se parsea una sola vez
+    (es habitual que muchos componentes compartan la misma ficha).
+    """
+    codigos, unicos = pd.factorize(pd.Series(specs, dtype=object).fillna(""))
+    p_unico, p_campo, p_valor = [], [], []
+    for u, txt in enumerate(unicos):
+        try: d = json.loads(txt) if txt.strip() else {}
+        except ValueError: d = {}
+        if not isinstance(d, dict): continue
+        for k, v in d.items():
+            if str(k).strip() == "" or v is None: continue
+            p_unico.append(u); p_campo.append(str(k).strip()); p_valor.append(str(v))
+    vacio = pd.DataFrame({"componente_id": pd.Series(dtype="int64"), "familia": pd.Series(dtype=object),
+                          "campo": pd.Series(dtype=object), "valor_txt": pd.Series(dtype=object)})
+    if not p_unico: return vacio
+
+    # Expandir pares por componente sin bucles: repetir el tramo de pares de su ficha
+    p_unico = np.asarray(p_unico)
+    cuenta = np.bincount(p_unico, minlength=len(unicos))
+    inicio = np.concatenate([[0], np.cumsum(cuenta)[:-1]])
+    rep = cuenta[codigos]
+    total = int(rep.sum())
+    if total == 0: return vacio
+    fila = np.repeat(np.arange(len(codigos)), rep)
+    par = np.repeat(inicio[codigos], rep) + (np.arange(total) - np.repeat(np.cumsum(rep) - rep, rep))
+    return pd.DataFrame({"componente_id": np.asarray(ids, dtype="int64")[fila],
+                         "familia": np.asarray(familias, dtype=object)[fila],
+                         "campo": np.asarray(p_campo, dtype=object)[par],
+                         "valor_txt": np.asarray(p_valor, dtype=object)[par]})
+
+
+class IndiceSpecs:
+    def __init__(self, idx, unidades):
+        eq = idx.df_eq[["tag", "nombre", "planta", "area"]].rename(columns={"tag": "equipo_tag", "nombre": "equipo"})
+        sis = idx.df_sys[["id", "equipo_tag"]].rename(columns={"id": "sistema_id"})
+        comp = idx.df_comp[["id", "sistema_id", "nombre", "categoria", "specs_json"]].rename(columns={"id": "componente_id", "nombre": "componente", "categoria": "familia"})
+        comp = comp[comp["componente_id"].notna()].merge(sis, on="sistema_id", how="left").merge(eq, on="equipo_tag", how="left")
+        comp["componente_id"] = comp["componente_id"].astype("int64")
+        for c in ["familia", "planta", "area"]: comp[c] = comp[c].astype(object)
+        comp = comp.drop_duplicates("componente_id", keep="last")
+        con_id = sis.dropna(subset=["sistema_id"])
+        self.sys_eq = dict(zip(con_id["sistema_id"].astype(int), con_id["equipo_tag"]))
+        self.eq_info = {t: {"equipo": n, "planta": p, "area": a} for t, n, p, a in eq.itertuples(index=False)}
+        self.unidades = unidades
+        self.comp = comp[COLS_COMP].set_index("componente_id", drop=False)
+        self._fijar(_aplanar(comp["componente_id"], comp["familia"].fillna("").map(_norm), comp["specs_json"]))
+
+    def _preparar(self, largo):
+        """Clave normalizada, valor numérico, texto de comparación y unidad; devuelve (filas, código de clave, claves)."""
+        # Normalización y conversión sobre los valores distintos (se repiten mucho), no por fila
+        c_campo, u_campo = pd.factorize(largo["campo"].astype(object))
+        u_clave = np.array([_norm(c) for c in u_campo], dtype=object)
+        c_valor, u_valor = pd.factorize(largo["valor_txt"].astype(object))
+        u_txt = pd.Series(u_valor, dtype=object).astype(str)
+        largo = largo.assign(clave=u_clave[c_campo], valor_num=_a_numero(u_txt).to_numpy()[c_valor],
+                             _txt=u_txt.str.strip().str.upper().to_numpy(dtype=object)[c_valor])
+        largo = largo.drop_duplicates(["componente_id", "clave"], keep="last")
+        c_fam, u_fam = pd.factorize(largo["familia"].astype(object))
+        c_clave, u_claves = pd.factorize(largo["clave"])
+        u_unidad = np.array([self.unidades.get((f, k), "") for f in u_fam for k in u_claves], dtype=object).reshape(len(u_fam), len(u_claves))
+        largo["unidad"] = u_unidad[c_fam, c_clave] if len(largo) else np.array([], dtype=object)
+        return largo, c_clave, np.asarray(u_claves, dtype=object)
+
+    def _fijar(self, largo):
+        """Tipa, ordena por (campo, valor) y arma los tramos por campo."""
+        largo, c_clave, self._claves = self._preparar(largo)
+        orden = np.lexsort((largo["valor_num"].to_numpy(), c_clave))
+        largo = largo.iloc[orden].reset_index(drop=True)
+        self._asignar(largo[COLS_TABLA], largo["_txt"].to_numpy(), c_clave[orden])
+
+    def _asignar(self, tabla, txt, cod):
+        # cod: código de la clave de cada fila (ordenado); cada campo ocupa un tramo contiguo
+        self.tabla = tabla
+        self._ids = tabla["componente_id"].to_numpy()
+        self._num = tabla["valor_num"].to_numpy()
+        self._txt = txt
+        self._cod = cod
+        todos = np.arange(len(self._claves))
+        ini, fin = np.searchsorted(cod, todos, "left"), np.searchsorted(cod, todos, "right")
+        self._tramos = {self._claves[i]: (int(ini[i]), int(fin[i])) for i in todos if fin[i] > ini[i]}
+
+    def __len__(self):
+        return len(self.tabla)
+
+    # --- MANTENIMIENTO INCREMENTAL ---
+    def aplicar(self, cambio):
+        """
+        Índice nuevo con las filas de un componente guardado reemplazadas (dict con 'id' y las columnas que cambiaron).
+        No reordena la tabla: saca las filas del componente e inserta las nuevas en su tramo con searchsorted.
+        El índice actual no se modifica (lo pueden estar leyendo otras sesiones).
+        """
+        comp_id = int(cambio["id"])
+        previo = self.comp.loc[comp_id].to_dict() if comp_id in self.comp.index else dict.fromkeys(COLS_COMP)
+        fila = dict(previo, componente_id=comp_id)
+        if "nombre" in cambio: fila["componente"] = cambio["nombre"]
+        if "categoria" in cambio: fila["familia"] = cambio["categoria"]
+        if "sistema_id" in cambio and pd.notna(cambio["sistema_id"]):
+            fila["sistema_id"] = int(cambio["sistema_id"])
+            tag = self.sys_eq.get(fila["sistema_id"])
+            fila.update(equipo_tag=tag, **self.eq_info.get(tag, {"equipo": None, "planta": None, "area": None}))
+        nuevo = copy.copy(self)
+        nuevo.comp = self.comp.copy()
+        nuevo.comp.loc[comp_id] = pd.Series(fila)[COLS_COMP]
+        if "specs_json" not in cambio and "categoria" not in cambio: return nuevo
+        mias = self._ids == comp_id
+        specs = cambio.get("specs_json")
+        if specs is None:  # cambió solo la familia: se reconstruyen sus filas con la misma ficha
+            previas = self.tabla[mias]
+            specs = json.dumps(dict(zip(previas["campo"], previas["valor_txt"])), ensure_ascii=False)
+        familia = "" if fila["familia"] is None or pd.isna(fila["familia"]) else _norm(fila["familia"])
+        largo, _, claves = self._preparar(_aplanar([comp_id], [familia], [specs]))
+
+        resto = ~mias
+        cod, num = self._cod[resto], self._num[resto]
+        # Campos que el índice no tenía: código nuevo al final (su tramo queda al final de la tabla)
+        pos_clave = {k: i for i, k in enumerate(self._claves)}
+        faltan = [k for k in claves if k not in pos_clave]
+        nuevo._claves = np.concatenate([self._claves, np.asarray(faltan, dtype=object)]) if faltan else self._claves
+        pos_clave.update({k: len(self._claves) + i for i, k in enumerate(faltan)})
+        c_nuevas = largo["clave"].map(pos_clave).to_numpy(dtype=np.intp)
+        orden = np.lexsort((largo["valor_num"].to_numpy(), c_nuevas))
+        largo, c_nuevas = largo.iloc[orden], c_nuevas[orden]
+        donde = []
+        for c, v in zip(c_nuevas, largo["valor_num"].to_numpy()):
+            lo, hi = np.searchsorted(cod, c, "left"), np.searchsorted(cod, c, "right")
+            donde.append(lo + np.searchsorted(num[lo:hi], v, "right"))
+        perm = np.insert(np.arange(int(resto.sum())), donde, int(resto.sum()) + np.arange(len(largo)))
+        tabla = pd.concat([self.tabla[resto], largo[COLS_TABLA]], ignore_index=True).iloc[perm].reset_index(drop=True)
+        nuevo._asignar(tabla, np.insert(self._txt[resto], donde, largo["_txt"].to_numpy()), np.insert(cod, donde, c_nuevas))
+        return nuevo
+
+    # --- CONSULTAS ---
+    def campos(self, familia=None):
+        """Campos disponibles: unidad, cuántos componentes y rango numérico."""
+        t = self.tabla if familia is None else self.tabla[self.tabla["familia"] == _norm(familia)]
+        if t.empty: return pd.DataFrame(columns=["campo", "unidad", "componentes", "numericos", "min", "max"])
+        g = t.groupby("clave", sort=True)
+        return pd.DataFrame({"campo": g["campo"].first(), "unidad": g["unidad"].first(), "componentes": g.size(),
+                             "numericos": g["valor_num"].count(), "min": g["valor_num"].min(), "max": g["valor_num"].max()}).reset_index(drop=True)
+
+    def valores(self, campo):
+        """Valores de texto distintos de un campo (para listas de selección)."""
+        ini, fin = self._tramos.get(_norm(campo), (0, 0))
+        return sorted(set(self.tabla["valor_txt"].iloc[ini:fin].astype(str).str.strip()))
+
+    def _condicion(self, campo, op, valor):
+        ini, fin = self._tramos.get(_norm(campo), (0, 0))
+        num = self._num[ini:fin]
+        ids = self._ids[ini:fin]
+        if op in (">", ">=", "<", "<=", "entre"):
+            # num está ordenado (NaN al final): el rango es un tramo contiguo
+            if op == "entre": lo, hi = valor; lado_lo, lado_hi = "left", "right"
+            elif op in (">", ">="): lo, hi = valor, None; lado_lo = "right" if op == ">" else "left"
+            else: lo, hi = None, valor; lado_hi = "left" if op == "<" else "right"
+            a = 0 if lo is None else np.searchsorted(num, float(lo), side=lado_lo)
+            b = np.count_nonzero(~np.isnan(num)) if hi is None else np.searchsorted(num, float(hi), side=lado_hi)
+            return ids[a:b]
+        txt = self._txt[ini:fin]
+        objetivo = _norm(valor)
+        if op == "contiene": return ids[np.char.find(txt.astype(str), objetivo) >= 0] if len(txt) else ids[:0]
+        try: v = float(str(valor).replace(",", "."))
+        except ValueError: v = None
+        igual = (txt == objetivo) if v is None else ((num == v) | (txt == objetivo))
+        if op == "=": return ids[igual]
+        if op == "!=": return ids[~igual]
+        raise ValueError(f"Operador inválido: {op} (válidos: {', '.join(OPERADORES)})")
+
+    def filtrar(self, condiciones=(), familia=None, planta=None, area=None, equipo=None):
+        """
+        IDs de componentes que cumplen todas las condiciones (AND).
+        condiciones: [(campo, operador, valor)], p.ej. [("Potencia", ">", 50), ("RPM", "=", 1800)];
+        para 'entre' el valor es (mínimo, máximo).
+        """
+        ids = None
+        for campo, op, valor in condiciones:
+            r = np.unique(self._condicion(campo, op, valor))
+            ids = r if ids is None else np.intersect1d(ids, r, assume_unique=True)
+            if not len(ids): return ids
+        comp = self.comp
+        mask = np.ones(len(comp), dtype=bool)
+        for col, v in (("familia", familia), ("planta", planta), ("area", area), ("equipo_tag", equipo)):
+            if v: mask &= comp[col].fillna("").astype(str).str.upper().to_numpy() == _norm(v)
+        base = comp.index.to_numpy()[mask]
+        return np.sort(base) if ids is None else np.intersect1d(ids, base)
+
+    def resultados(self, ids, campos=None):
+        """Tabla ancha: ubicación del componente + una columna por campo (con unidad)."""
+        ids = np.asarray(ids, dtype="int64")
+        base = self.comp.loc[self.comp.index.intersection(ids)].reset_index(drop=True)
+        t = self.tabla[np.isin(self._ids, ids)]
+        if campos: t = t[t["clave"].isin([_norm(c) for c in campos])]
+        if t.empty or base.empty: return base
+        t = t.assign(valor=t["valor_num"].astype(object).where(t["valor_num"].notna(), t["valor_txt"]),
+                     col=np.where(t["unidad"] != "", t["campo"] + " (" + t["unidad"] + ")", t["campo"]))
+        t = t.drop_duplicates(["componente_id", "clave"])
+        primera = t.drop_duplicates("clave").set_index("clave")["col"]
+        t["col"] = t["clave"].map(primera)
+        ancha = t.pivot(index="componente_id", columns="col", values="valor").reset_index()
+        return base.merge(ancha, on="componente_id", how="left")
+
+
+_INDICE = IndiceCompartido(HOJAS_SPECS)
+
+
+@perfilar("indice_specs")
+def indice_specs():
+    """Índice compartido; se reconstruye si cambió alguna hoja fuera de actualizar_specs()."""
+    antes = _INDICE.versiones()
+    idx = indice_activos()
+    unidades = _unidades()
+    clave = _INDICE.clave()
+    specs = _INDICE.vigente(clave)
+    if specs is None:
+        specs = IndiceSpecs(idx, unidades)
+        _INDICE.publicar(clave, specs, antes)
+    return specs
+
+
+def actualizar_specs(cambio):
+    """
+    Llamar después de guardar un componente: reemplaza solo sus filas en el índice.
+    Igual que bom.actualizar_componente(): si hubo otras escrituras entre medio, se reconstruye al consultar.
+    """
+    _INDICE.parchar(lambda specs: specs.aplicar(dict(cambio)))
@@ -0,0 +1,67 @@
+import pandas as pd
+
+# --- REGISTRO DE ESQUEMAS POR HOJA ---
+# Tipos:
+#   id     -> Int64 (acepta 5, 5.0, '5'; vacío = <NA>)
+#   entero -> Int64
+#   numero -> float64
+#   tag    -> texto normalizado (sin espacios, MAYÚSCULAS)
+#   cat    -> categórico (pocas variantes, ahorra memoria)
+#   texto  -> texto ('' en vez de NaN, listo para widgets)
+ESQUEMAS = {
+    "equipos": {"id": "id", "tag": "tag", "nombre": "texto", "planta": "cat", "area": "cat",
+                "tipo": "texto", "criticidad": "cat", "estado": "texto"},
+    "sistemas": {"id": "id", "equipo_tag": "tag", "nombre": "texto", "descripcion": "texto"},
+    "componentes": {"id": "id", "sistema_id": "id", "nombre": "texto", "marca": "texto", "modelo": "texto",
+                    "cantidad": "entero", "categoria": "cat", "repuesto_sku": "tag", "specs_json": "texto"},
+    "sistemas_config": {"id": "id", "nombre_sistema": "texto", "descripcion": "texto"},
+    "familias_config": {"id": "id", "nombre_familia": "texto", "sistema_asociado": "texto", "config_json": "texto"},
+    "lecturas": {"id": "id", "componente_id": "id", "fecha": "texto", "hora": "texto",
+                 "parametro": "cat", "valor": "numero", "tecnico": "texto"},
+    "limites_alarma": {"id": "id", "familia": "tag", "componente_id": "id", "parametro": "texto",
+                       "alerta": "numero", "peligro": "numero"},
+    "movimientos": {"id": "id", "fecha": "texto", "sku": "tag", "tipo": "cat", "cantidad": "numero",
+                    "costo_unitario": "numero", "saldo": "numero", "costo_promedio": "numero",
+                    "componente_id": "id", "orden_trabajo": "texto", "responsable": "texto"},
+    "almacen": {"sku": "tag", "descripcion": "texto", "marca": "texto", "stock_actual": "numero",
+                "unidad": "cat", "ubicacion_fisica": "texto", "precio_promedio": "numero", "en_kardex": "entero"},
+}
+
+
+def columnas(hoja):
+    return list(ESQUEMAS.get(hoja, {}))
+
+
+def _entero(serie):
+    num = pd.to_numeric(serie, errors="coerce")
+    # Solo valores enteros (5.0 sí, 5.5 no)
+    return num.where(num == num.round()).astype("Int64")
+
+
+def _texto(serie):
+    return serie.astype(object).where(serie.notna(), "").astype(str)
+
+
+_CONVERSORES = {
+    "id": _entero,
+    "entero": _entero,
+    "numero": lambda s: pd.to_numeric(s, errors="coerce").astype("float64"),
+    "tag": lambda s: _texto(s).str.strip().str.upper(),
+    "cat": lambda s: s.astype(object).where(s.notna() & (s.astype(str).str.strip() != ""), None).astype("category"),
+    "texto": _texto,
+}
+
+
+def aplicar_esquema(hoja, df):
+    """
+    Tipa y normaliza una hoja recién leída (se hace una sola vez, al entrar al caché).
+    Agrega las columnas declaradas que falten; las columnas extra se dejan tal cual.
+    """
+    esquema = ESQUEMAS.get(hoja)
+    if esquema is None or df is None: return df
+    df = df.copy() if not df.empty else pd.DataFrame(columns=list(esquema))
+    for col, tipo in esquema.items():
+        if col not in df.columns: df[col] = None
+        df[col] = _CONVERSORES[tipo](df[col])
+    orden = list(esquema) + [c for c in df.columns if c not in esquema]
+    return df[orden]
@@ -0,0 +1,161 @@
+import time
+import numpy as np
+import pandas as pd
+from utils.db_con import get_data, get_lecturas_store
+from utils.jerarquia import indice_activos
+from utils.especificaciones import indice_specs
+from utils.bom import indice_bom
+from utils.alarmas import NIVELES
+from utils.perfil import span, perfilar
+
+# --- EXPORTACIÓN DEL REGISTRO DE ACTIVOS A EXCEL ---
+# xlsxwriter en modo constant_memory: cada fila se escribe a disco al pasar a la siguiente,
+# así que la memoria no crece con el tamaño de la planta (solo el bloque de CHUNK filas en curso).
+# Hojas: Activos (equipo -> sistema -> componente + un campo técnico por columna), Almacén y Lecturas.
+CHUNK = 5000
+MAX_FILAS = 1_048_575  # límite de Excel menos el encabezado
+
+COLS_ACTIVOS = ["planta", "area", "equipo_tag", "equipo", "tipo", "criticidad", "estado", "sistema_id", "sistema",
+                "componente_id", "componente", "familia", "marca", "modelo", "cantidad", "repuesto_sku"]
+COLS_ALMACEN = ["sku", "descripcion", "marca", "unidad", "ubicacion_fisica", "stock_actual", "precio_promedio",
+                "valor_stock", "requerido", "equipos", "faltante", "cobertura", "en_catalogo"]
+COLS_LECTURAS = ["componente_id", "componente", "equipo_tag", "equipo", "parametro", "lecturas", "primera", "ultima",
+                 "ultimo_valor", "minimo", "maximo", "promedio", "nivel_alarma"]
+
+
+def _jerarquia(idx):
+    """Una fila por componente; equipos sin sistemas y sistemas sin componentes también tienen su fila."""
+    eq = idx.df_eq.drop_duplicates("tag", keep="last").rename(columns={"tag": "equipo_tag", "nombre": "equipo"})
+    sis = idx.df_sys.dropna(subset=["id"]).drop_duplicates("id", keep="last").rename(columns={"id": "sistema_id", "nombre": "sistema"})
+    comp = idx.df_comp.dropna(subset=["id"]).drop_duplicates("id", keep="last").rename(columns={"id": "componente_id", "nombre": "componente", "categoria": "familia"})
+    df = (eq.drop(columns=["id"], errors="ignore")
+          .merge(sis[["sistema_id", "equipo_tag", "sistema"]], on="equipo_tag", how="left")
+          .merge(comp.drop(columns=["specs_json"], errors="ignore"), on="sistema_id", how="left"))
+    for c in COLS_ACTIVOS:
+        if c not in df.columns: df[c] = None
+    return df.sort_values(["planta", "area", "equipo_tag", "sistema_id", "componente_id"], kind="stable", na_position="last")[COLS_ACTIVOS]
+
+
+def _specs_por_componente(specs):
+    """(ids ordenados, índice de columna, valor) de la tabla larga de specs + nombres de columna 'campo (unidad)'."""
+    t = specs.tabla
+    etiqueta = np.where(t["unidad"].to_numpy() != "", t["campo"] + " (" + t["unidad"] + ")", t["campo"]) if len(t) else np.array([], dtype=object)
+    # Un encabezado por campo normalizado (el primero que aparece), columnas en orden alfabético
+    primera = pd.Series(etiqueta, index=t.index).groupby(t["clave"].to_numpy(), sort=False).first()
+    columnas = sorted(set(primera))
+    pos = {c: i for i, c in enumerate(columnas)}
+    col = primera.map(pos).reindex(t["clave"]).to_numpy(dtype=np.intp)
+    valor = t["valor_num"].astype(object).where(t["valor_num"].notna(), t["valor_txt"]).to_numpy(dtype=object)
+    orden = np.argsort(t["componente_id"].to_numpy(), kind="stable")
+    return t["componente_id"].to_numpy()[orden], col[orden], valor[orden], columnas
+
+
+def _matriz_specs(ids_bloque, ids, col, valor, n_cols):
+    """Bloque ancho (filas x campos, None donde no hay dato) sin pivot: searchsorted sobre los ids ordenados."""
+    mat = np.full((len(ids_bloque), n_cols), None, dtype=object)
+    lo = np.searchsorted(ids, ids_bloque, "left"); hi = np.searchsorted(ids, ids_bloque, "right")
+    n = hi - lo
+    if n.sum():
+        filas = np.repeat(np.arange(len(ids_bloque)), n)
+        pos = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n) + np.repeat(lo, n)
+        mat[filas, col[pos]] = valor[pos]
+    return mat
+
+
+def _celdas(df):
+    """Bloque listo para write_row: objetos Python, None en vez de NaN/NA (celda vacía)."""
+    return df.astype(object).where(df.notna(), None).to_numpy(dtype=object)
+
+
+class _Hoja:
+    """Hoja en modo streaming: encabezado, anchos y formatos primero; después solo filas en orden."""
+
+    def __init__(self, wb, nombre, columnas, fmts, fechas=()):
+        self.ws = wb.add_worksheet(nombre)
+        self.n_cols = len(columnas)
+        for i, c in enumerate(columnas):
+            self.ws.set_column(i, i, max(10, min(40, len(str(c)) + 2)), fmts["fecha"] if c in fechas else None)
+        self.ws.write_row(0, 0, columnas, fmts["encabezado"])
+        self.ws.freeze_panes(1, 0)
+        self.fila = 1
+
+    def escribir(self, celdas):
+        for valores in celdas:
+            if self.fila > MAX_FILAS: raise ValueError("La hoja supera el máximo de filas de Excel.")
+            self.ws.write_row(self.fila, 0, valores)
+            self.fila += 1
+
+    def cerrar(self):
+        if self.fila > 1: self.ws.autofilter(0, 0, self.fila - 1, self.n_cols - 1)
+        return self.fila - 1
+
+
+def _almacen():
+    alm = get_data("almacen").drop_duplicates("sku", keep="last")
+    dem = indice_bom().demanda_total().rename(columns={"repuesto_sku": "sku"})
+    dem = dem.astype({"sku": alm["sku"].dtype})  # sin BOM la columna vacía llega como float
+    df = alm.merge(dem[["sku", "requerido", "equipos", "faltante", "cobertura", "en_catalogo", "descripcion"]],
+                   on="sku", how="outer", suffixes=("", "_bom"))
+    # SKUs usados en la BOM que no están en el catálogo también se listan (stock 0)
+    df["descripcion"] = df["descripcion"].where(df["descripcion"].notna() & (df["descripcion"] != ""), df["descripcion_bom"])
+    df["en_catalogo"] = df["sku"].isin(alm["sku"])
+    df["stock_actual"] = df["stock_actual"].fillna(0.0)
+    df["valor_stock"] = df["stock_actual"] * df["precio_promedio"]
+    for c in ["requerido", "faltante"]: df[c] = df[c].fillna(0.0)
+    df["equipos"] = df["equipos"].fillna(0).astype(int)
+    return df.sort_values("sku", kind="stable")[COLS_ALMACEN]
+
+
+def _lecturas(specs):
+    store = get_lecturas_store()
+    df = store.resumen()
+    est = store.estado_alarmas()
+    df = df.merge(est[["componente_id", "parametro", "nivel"]], on=["componente_id", "parametro"], how="left")
+    df["nivel_alarma"] = df["nivel"].map(NIVELES)
+    info = specs.comp[["componente_id", "componente", "equipo_tag", "equipo"]].reset_index(drop=True)
+    df = df.merge(info, on="componente_id", how="left")
+    return df.sort_values(["componente_id", "parametro"], kind="stable")[COLS_LECTURAS]
+
+
+@perfilar("exportar_activos")
+def exportar_activos(destino, chunk=CHUNK):
+    """
+    Escribe el registro completo en destino (ruta o archivo binario abierto).
+    Devuelve {'activos': filas, 'campos': n, 'almacen': filas, 'lecturas': filas, 'segundos': s}.
+    """
+    import xlsxwriter  # solo al exportar
+    t0 = time.perf_counter()
+    idx = indice_activos()
+    specs = indice_specs()
+    res = {}
+    wb = xlsxwriter.Workbook(destino, {"constant_memory": True, "strings_to_formulas": False})
+    try:
+        fmts = {"encabezado": wb.add_format({"bold": True, "bg_color": "#DDEBF7", "border": 1}),
+                "fecha": wb.add_format({"num_format": "yyyy-mm-dd hh:mm"})}
+
+        with span("exportar.activos") as s:
+            base = _jerarquia(idx)
+            ids, col, valor, campos = _specs_por_componente(specs)
+            hoja = _Hoja(wb, "Activos", COLS_ACTIVOS + campos, fmts)
+            comp_ids = base["componente_id"].astype("float64").fillna(-1).astype("int64").to_numpy()
+            for i in range(0, len(base), chunk):
+                bloque = _celdas(base.iloc[i:i + chunk])
+                hoja.escribir(np.hstack([bloque, _matriz_specs(comp_ids[i:i + chunk], ids, col, valor, len(campos))]).tolist())
+            res["activos"] = s["filas"] = hoja.cerrar()
+            res["campos"] = len(campos)
+
+        with span("exportar.almacen") as s:
+            df = _almacen()
+            hoja = _Hoja(wb, "Almacén", COLS_ALMACEN, fmts)
+            hoja.escribir(_celdas(df).tolist())
+            res["almacen"] = s["filas"] = hoja.cerrar()
+
+        with span("exportar.lecturas") as s:
+            df = _lecturas(specs)
+            hoja = _Hoja(wb, "Lecturas", COLS_LECTURAS, fmts, fechas=("primera", "ultima"))
+            for i in range(0, len(df), chunk): hoja.escribir(_celdas(df.iloc[i:i + chunk]).tolist())
+            res["lecturas"] = s["filas"] = hoja.cerrar()
+    finally:
+        wb.close()
+    res["segundos"] = round(time.perf_counter() - t0, 2)
+    return res
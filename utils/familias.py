@@ -0,0 +1,126 @@
+import json
+import threading
+import pandas as pd
+from utils.db_con import get_data, get_cache, data_version
+from utils.perfil import perfilar
+
+# --- REGISTRO COMPILADO DE FAMILIAS ---
+# Cada config_json de familias_config (lista de campos) se compila una vez por versión de la hoja.
+# Campo: {"nombre": "Potencia", "unidad": "kW", "tipo": "numero", "min": 0, "max": 500,
+#         "opciones": ["A", "B"], "requerido": true}
+#   tipo: "numero" | "texto" | "opcion". Si falta (familias anteriores al tipo) es texto, o lista si trae opciones:
+#   la validación numérica solo aplica a campos marcados "numero" (una unidad no basta, ej: "220/440" V).
+TIPOS_CAMPO = {"texto": "Texto", "numero": "Número", "opcion": "Lista"}
+
+
+def _num(valor):
+    if valor is None or isinstance(valor, bool): return None
+    try: return float(str(valor).strip().replace(",", "."))
+    except ValueError: return None
+
+
+class CampoSpec:
+    def __init__(self, cfg):
+        self.nombre = str(cfg.get("nombre", "")).strip()
+        self.unidad = str(cfg.get("unidad", "") or "").strip()
+        tipo = str(cfg.get("tipo", "") or "").strip().lower()
+        self.opciones = [str(o) for o in cfg.get("opciones", []) or []]
+        self.tipo = tipo if tipo in TIPOS_CAMPO else ("opcion" if self.opciones else "texto")
+        self.min = _num(cfg.get("min"))
+        self.max = _num(cfg.get("max"))
+        self.requerido = bool(cfg.get("requerido", False))
+
+    @property
+    def etiqueta(self):
+        return f"{self.nombre} ({self.unidad})" if self.unidad else self.nombre
+
+    def validar(self, valor):
+        """(valor normalizado, error o None). Los números se guardan como número (int si es entero)."""
+        txt = "" if valor is None or (not isinstance(valor, str) and pd.isna(valor)) else str(valor).strip()
+        if txt == "":
+            return "", (f"'{self.nombre}' es obligatorio" if self.requerido else None)
+        if self.tipo == "numero":
+            num = _num(txt)
+            if num is None: return txt, f"'{self.nombre}' debe ser numérico"
+            if self.min is not None and num < self.min: return num, f"'{self.nombre}' debe ser ≥ {self.min:g}"
+            if self.max is not None and num > self.max: return num, f"'{self.nombre}' debe ser ≤ {self.max:g}"
+            return (int(num) if num.is_integer() else num), None
+        if self.tipo == "opcion" and self.opciones and txt not in self.opciones:
+            return txt, f"'{self.nombre}' debe ser uno de: {', '.join(self.opciones)}"
+        return txt, None
+
+
+class Familia:
+    def __init__(self, nombre, sistema, campos):
+        self.nombre = nombre
+        self.sistema = sistema
+        self.campos = campos
+
+    def validar(self, specs):
+        """Valida y convierte un dict de specs. Devuelve (specs limpias, lista de errores)."""
+        limpio, errores = {}, []
+        for campo in self.campos:
+            valor, error = campo.validar(specs.get(campo.nombre))
+            limpio[campo.nombre] = valor
+            if error: errores.append(error)
+        # Claves que ya no están en la configuración se conservan tal cual
+        for k, v in specs.items():
+            if k not in limpio: limpio[k] = v
+        return limpio, errores
+
+
+def _clave(familia, sistema):
+    return (str(familia).strip().upper(), str(sistema).strip().upper())
+
+
+class RegistroFamilias:
+    def __init__(self, df):
+        self._familias = {}
+        self.errores = {}  # clave -> motivo (config_json ilegible)
+        if df is None or df.empty: return
+        for nombre, sistema, cfg in df[["nombre_familia", "sistema_asociado", "config_json"]].itertuples(index=False):
+            try: campos = json.loads(cfg) if isinstance(cfg, str) and cfg.strip() else []
+            except ValueError as e:
+                self.errores[_clave(nombre, sistema)] = str(e); campos = []
+            if not isinstance(campos, list): campos = []
+            compilados = [CampoSpec(c) for c in campos if isinstance(c, dict) and str(c.get("nombre", "")).strip()]
+            self._familias[_clave(nombre, sistema)] = Familia(nombre, sistema, compilados)
+
+    def get(self, familia, sistema):
+        return self._familias.get(_clave(familia, sistema))
+
+    def __contains__(self, clave):
+        return _clave(*clave) in self._familias
+
+    def claves(self):
+        return set(self._familias)
+
+    def familias_de(self, sistema):
+        s = str(sistema).strip().upper()
+        return [f.nombre for (_, sis), f in self._familias.items() if sis == s]
+
+
+_REGISTRO = None  # (versión, RegistroFamilias)
+_LOCK = threading.Lock()
+
+
+@perfilar("registro_familias")
+def registro_familias():
+    """Registro compartido; se recompila solo si familias_config cambió."""
+    global _REGISTRO
+    if get_cache().vigente("familias_config"):
+        with _LOCK:
+            if _REGISTRO is not None and _REGISTRO[0] == data_version("familias_config"): return _REGISTRO[1]
+    antes = get_cache().version("familias_config")  # antes de leer: una escritura durante la carga no se publica
+    df = get_data("familias_config")
+    version = data_version("familias_config")
+    registro = RegistroFamilias(df)
+    if version[0] == antes:
+        with _LOCK: _REGISTRO = (version, registro)
+    return registro
+
+
+def invalidar_registro():
+    """El Configurador la llama al guardar una familia."""
+    global _REGISTRO
+    with _LOCK: _REGISTRO = None
@@ -0,0 +1,192 @@
+import csv
+import time
+import pandas as pd
+from utils.db_con import guardar_lecturas
+from utils.jerarquia import indice_activos
+from utils.lecturas_store import a_timestamp
+
+# --- PARÁMETROS DE MONITOREO ---
+# Nombre canónico -> unidad base, rango físico válido y conversiones aceptadas
+# (unidad en minúsculas -> (factor, desplazamiento): valor_base = valor * factor + desplazamiento).
+# Unidades base (las que se guardan): mm/s, °C y dB. Las lecturas en in/s o °F se convierten a estas.
+PARAMETROS = {
+    "Vibración (mm/s)": {"unidad": "mm/s", "rango": (0, 100), "conversiones": {"mm/s": (1, 0), "in/s": (25.4, 0), "ips": (25.4, 0)}},
+    "Temperatura (°C)": {"unidad": "°C", "rango": (-40, 300), "conversiones": {"°c": (1, 0), "c": (1, 0), "°f": (5 / 9, -160 / 9), "f": (5 / 9, -160 / 9)}},
+    "Ruido (dB)": {"unidad": "dB", "rango": (0, 150), "conversiones": {"db": (1, 0), "dba": (1, 0)}},
+}
+
+# --- FORMATO DEL CSV ---
+# Columnas: tag, componente, parametro, valor y ts (o fecha + hora). Opcionales: sistema
+# (desempata componentes con el mismo nombre en un equipo), unidad, tecnico, componente_id.
+ALIAS_COLUMNAS = {"equipo": "tag", "equipo_tag": "tag", "nombre": "componente", "fecha_hora": "ts", "timestamp": "ts"}
+CHUNK = 50000
+_SEP = "\x1f"
+
+
+def _sin_tildes(txt):
+    return txt.translate(str.maketrans("áéíóúÁÉÍÓÚ", "aeiouAEIOU"))
+
+
+def _alias_parametros():
+    # "Vibración (mm/s)", "vibración", "vibracion" -> "Vibración (mm/s)"
+    alias = {}
+    for nombre in PARAMETROS:
+        base = nombre.split(" (")[0]
+        for a in (nombre, base): alias[a.lower()] = alias[_sin_tildes(a).lower()] = nombre
+    return alias
+
+
+_ALIAS_PARAM = _alias_parametros()
+
+
+def _txt(serie):
+    return serie.astype(object).where(serie.notna(), "").astype(str).str.strip()
+
+
+def _separador(archivo):
+    """',' o ';' según el encabezado (los CSV de Excel en español usan ';')."""
+    if hasattr(archivo, "read"):
+        inicio = archivo.read(4096); archivo.seek(0)
+        if isinstance(inicio, bytes): inicio = inicio.decode("utf-8", errors="ignore")
+    else:
+        with open(archivo, encoding="utf-8", errors="ignore") as f: inicio = f.read(4096)
+    primera = inicio.splitlines()[0] if inicio else ""
+    try: return csv.Sniffer().sniff(primera, delimiters=",;\t").delimiter
+    except csv.Error: return ","
+
+
+class IngestaLecturas:
+    """
+    Valida un CSV de lecturas (exportación de colectores) por bloques y lo guarda con una sola escritura.
+    Uso: ing = IngestaLecturas(); ing.analizar(archivo); ing.confirmar()
+    """
+
+    def __init__(self, tecnico=""):
+        self.tecnico = tecnico
+        idx = indice_activos()
+        sis = idx.df_sys[["id", "equipo_tag", "nombre"]].rename(columns={"id": "sistema_id", "nombre": "sistema"})
+        comp = idx.df_comp[["id", "sistema_id", "nombre"]].rename(columns={"id": "componente_id", "nombre": "componente"})
+        mapa = comp.merge(sis, on="sistema_id", how="inner")
+        tag = _txt(mapa["equipo_tag"]).str.upper()
+        nombre = _txt(mapa["componente"]).str.upper()
+        sistema = _txt(mapa["sistema"]).str.upper()
+        ids = mapa["componente_id"].astype("Int64").to_numpy()
+        # Mapas hash (TAG, componente) y (TAG, sistema, componente) -> componente_id
+        clave2 = tag + _SEP + nombre
+        clave3 = tag + _SEP + sistema + _SEP + nombre
+        dup2 = clave2.duplicated(keep=False)
+        self.ambiguas = set(clave2[dup2])
+        self.por_nombre = pd.Series(ids, index=clave2)[~dup2.to_numpy()]
+        self.por_sistema = pd.Series(ids, index=clave3)[~clave3.duplicated(keep="first").to_numpy()]
+        self.ids_validos = set(ids[pd.notna(ids)].tolist())
+
+        self.validos = []
+        self.errores = []
+        self.leidas = 0
+        self.segundos = 0.0
+        self.guardadas = 0
+        self.segundos_escritura = 0.0
+
+    # --- VALIDACIÓN ---
+    def _error(self, df, mask, msg):
+        if mask.any(): self.errores.append(pd.DataFrame({"fila": df.index[mask], "error": msg}))
+
+    def _componente(self, df):
+        """componente_id por join vectorizado; usa la columna componente_id si viene en el archivo."""
+        tag = _txt(df["tag"]).str.upper() if "tag" in df.columns else pd.Series("", index=df.index)
+        nombre = _txt(df["componente"]).str.upper() if "componente" in df.columns else pd.Series("", index=df.index)
+        sistema = _txt(df["sistema"]).str.upper() if "sistema" in df.columns else pd.Series("", index=df.index)
+        clave2 = tag + _SEP + nombre
+        comp_id = (tag + _SEP + sistema + _SEP + nombre).map(self.por_sistema).where(sistema != "", clave2.map(self.por_nombre))
+        comp_id = pd.to_numeric(comp_id, errors="coerce")
+        ambigua = (sistema == "") & clave2.isin(self.ambiguas)
+        if "componente_id" in df.columns:
+            directo = pd.to_numeric(df["componente_id"], errors="coerce")
+            directo = directo.where(directo.isin(self.ids_validos))
+            comp_id = directo.where(directo.notna(), comp_id)
+            ambigua &= directo.isna()
+        self._error(df, ambigua, "Componente ambiguo en el equipo: indique 'sistema'")
+        self._error(df, comp_id.isna() & ~ambigua, "Componente no encontrado (TAG/componente)")
+        return comp_id.where(~ambigua)
+
+    def _bloque(self, df):
+        df.columns = [ALIAS_COLUMNAS.get(c, c) for c in (str(c).strip().lower() for c in df.columns)]
+        comp_id = self._componente(df)
+
+        param = _txt(df["parametro"]).str.lower().map(_ALIAS_PARAM) if "parametro" in df.columns else pd.Series(None, index=df.index, dtype=object)
+        self._error(df, param.isna(), f"Parámetro no reconocido (válidos: {', '.join(PARAMETROS)})")
+
+        crudo = _txt(df["valor"]).str.replace(",", ".", regex=False) if "valor" in df.columns else pd.Series("", index=df.index)
+        valor = pd.to_numeric(crudo, errors="coerce")
+        self._error(df, valor.isna(), "Valor no numérico")
+
+        # Unidades: se convierten a la unidad base del parámetro
+        factor = pd.Series(1.0, index=df.index); desplaz = pd.Series(0.0, index=df.index)
+        mala_unidad = pd.Series(False, index=df.index)
+        if "unidad" in df.columns:
+            unidad = _txt(df["unidad"]).str.lower()
+            for nombre, p in PARAMETROS.items():
+                es = (param == nombre) & (unidad != "")
+                if not es.any(): continue
+                f = unidad[es].map({u: c[0] for u, c in p["conversiones"].items()})
+                mala_unidad[es] = f.isna()
+                factor[es] = f.fillna(1.0)
+                desplaz[es] = unidad[es].map({u: c[1] for u, c in p["conversiones"].items()}).fillna(0.0)
+            self._error(df, mala_unidad & param.notna(), "Unidad no soportada para el parámetro")
+        valor = valor * factor + desplaz
+
+        minimo = param.map({n: p["rango"][0] for n, p in PARAMETROS.items()})
+        maximo = param.map({n: p["rango"][1] for n, p in PARAMETROS.items()})
+        fuera = valor.notna() & param.notna() & ((valor < minimo) | (valor > maximo))
+        self._error(df, fuera, "Valor fuera de rango físico")
+
+        ts = a_timestamp(df) if ("ts" in df.columns or "fecha" in df.columns) else pd.Series(pd.NaT, index=df.index)
+        self._error(df, ts.isna(), "Fecha/hora inválida")
+
+        tecnico = _txt(df["tecnico"]) if "tecnico" in df.columns else pd.Series("", index=df.index)
+        tecnico = tecnico.where(tecnico != "", self.tecnico)
+
+        ok = comp_id.notna() & param.notna() & valor.notna() & ~mala_unidad & ~fuera & ts.notna()
+        return pd.DataFrame({"componente_id": comp_id[ok].astype("int64"), "ts": ts[ok], "parametro": param[ok],
+                             "valor": valor[ok], "tecnico": tecnico[ok]})
+
+    def analizar(self, archivo, chunk=CHUNK):
+        """Lee el CSV por bloques (memoria acotada) y valida cada bloque de forma vectorizada."""
+        t0 = time.perf_counter()
+        sep = _separador(archivo)
+        inicio = 2  # fila 1 = encabezado
+        for df in pd.read_csv(archivo, sep=sep, dtype=str, chunksize=chunk, skip_blank_lines=True, encoding="utf-8-sig"):
+            df.index = pd.RangeIndex(inicio, inicio + len(df), name="fila")
+            inicio += len(df)
+            self.leidas += len(df)
+            ok = self._bloque(df)
+            if not ok.empty: self.validos.append(ok)
+        self.segundos = time.perf_counter() - t0
+        return self
+
+    # --- RESULTADOS ---
+    def df_validos(self):
+        return pd.concat(self.validos) if self.validos else pd.DataFrame(columns=["componente_id", "ts", "parametro", "valor", "tecnico"])
+
+    def df_errores(self):
+        if not self.errores: return pd.DataFrame(columns=["fila", "error"])
+        return pd.concat(self.errores, ignore_index=True).sort_values("fila", kind="stable")
+
+    def resumen(self):
+        return {
+            "leidas": self.leidas,
+            "validas": sum(len(v) for v in self.validos),
+            "errores": sum(len(e) for e in self.errores),
+            "segundos": round(self.segundos, 2),
+            "filas_por_seg": round(self.leidas / self.segundos) if self.segundos else 0,
+            "guardadas": self.guardadas,
+            "escritura_filas_por_seg": round(self.guardadas / self.segundos_escritura) if self.segundos_escritura else 0,
+        }
+
+    # --- CONFIRMACIÓN ---
+    def confirmar(self):
+        """Guarda todas las lecturas válidas en el backend (una sola escritura) y en la réplica local."""
+        t0 = time.perf_counter()
+        self.guardadas = guardar_lecturas(self.df_validos())
+        self.segundos_escritura = time.perf_counter() - t0
+        return self.guardadas
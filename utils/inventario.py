@@ -0,0 +1,175 @@
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from utils.db_con import get_data, append_rows, update_rows, reserve_ids
+
+# --- KARDEX (MOVIMIENTOS DE ALMACÉN) ---
+# La hoja 'movimientos' es solo de agregado: cada fila es una entrada, salida o ajuste.
+# El saldo (stock_actual) y el costo promedio ponderado (precio_promedio) quedan
+# materializados en 'almacen' y se actualizan con cada movimiento; consultar stock
+# nunca suma la historia. conciliar() los recalcula desde el kardex completo.
+#   ENTRADA -> suma stock y recalcula el promedio: (stock * promedio + cant * costo) / stock nuevo
+#   SALIDA  -> resta stock al promedio vigente (a un componente y/u orden de trabajo)
+#   AJUSTE  -> cantidad con signo (conteo físico); no cambia el promedio
+# Orden de escritura: primero el kardex (la fuente de verdad), después el saldo. Si la segunda falla
+# (o el proceso muere entre ambas) el kardex queda adelantado; antes del primer movimiento del proceso
+# y del siguiente a una falla, el saldo de 'almacen' se reconstruye desde el kardex.
+TIPOS = {"ENTRADA": 1, "SALIDA": -1, "AJUSTE": 1}
+COLS_MOV = ["id", "fecha", "sku", "tipo", "cantidad", "costo_unitario", "saldo", "costo_promedio",
+            "componente_id", "orden_trabajo", "responsable"]
+_LOCK = threading.Lock()  # un movimiento a la vez por proceso: el saldo se lee y se escribe sin carreras
+_VERIFICAR = [True]  # reconstruir el saldo desde el kardex antes del próximo movimiento
+
+
+def _kardex(mov, inicial=None):
+    """
+    Saldo y costo promedio después de cada movimiento (mov ordenado por sku, id).
+    inicial: DataFrame indexado por sku con stock_actual / precio_promedio de partida (None = desde cero).
+    Vectorizado entre SKUs: el único bucle recorre el n-ésimo ingreso de todos los SKUs a la vez.
+    """
+    sku = mov["sku"]
+    delta = mov["cantidad"].to_numpy(dtype="float64") * mov["tipo"].map(TIPOS).to_numpy(dtype="float64")
+    stock0 = sku.map(inicial["stock_actual"]).fillna(0).to_numpy(dtype="float64") if inicial is not None else np.zeros(len(mov))
+    costo0 = sku.map(inicial["precio_promedio"]).fillna(0).to_numpy(dtype="float64") if inicial is not None else np.zeros(len(mov))
+    despues = stock0 + pd.Series(delta, index=mov.index).groupby(sku.to_numpy(), sort=False).cumsum().to_numpy()
+    antes = despues - delta
+
+    codigos, unicos = pd.factorize(sku)
+    promedio = np.zeros(len(unicos))
+    promedio[codigos] = costo0  # mismo valor para todas las filas de un SKU
+    por_mov = np.full(len(mov), np.nan)
+    entrada = (mov["tipo"] == "ENTRADA").to_numpy()
+    if entrada.any():
+        rango = pd.Series(entrada.astype(int), index=mov.index).groupby(codigos).cumsum().to_numpy() - 1
+        pos_e = np.flatnonzero(entrada)
+        cant = mov["cantidad"].to_numpy(dtype="float64")
+        costo = mov["costo_unitario"].fillna(0).to_numpy(dtype="float64")
+        for pos in pd.Series(pos_e).groupby(rango[pos_e]).indices.values():
+            p = pos_e[pos]; c = codigos[p]
+            base = np.maximum(antes[p], 0)
+            nuevo = np.where(despues[p] > 0, (base * promedio[c] + cant[p] * costo[p]) / np.where(despues[p] > 0, despues[p], 1), costo[p])
+            promedio[c] = nuevo
+            por_mov[p] = nuevo
+    # Salidas y ajustes conservan el promedio vigente
+    prom = pd.Series(por_mov).groupby(codigos).ffill().to_numpy()
+    prom = np.where(np.isnan(prom), costo0, prom)
+    return despues, prom
+
+
+def _validar(df, almacen):
+    df = df.copy()
+    df["sku"] = df["sku"].astype(str).str.strip().str.upper()
+    df["tipo"] = df["tipo"].astype(str).str.strip().str.upper()
+    df["cantidad"] = pd.to_numeric(df["cantidad"], errors="coerce")
+    df["costo_unitario"] = pd.to_numeric(df["costo_unitario"], errors="coerce") if "costo_unitario" in df.columns else np.nan
+    if not df["tipo"].isin(list(TIPOS)).all(): raise ValueError(f"Tipo de movimiento inválido (válidos: {', '.join(TIPOS)}).")
+    if not df["sku"].isin(almacen["sku"]).all():
+        raise ValueError(f"SKU inexistente: {', '.join(sorted(set(df.loc[~df['sku'].isin(almacen['sku']), 'sku']))[:5])}")
+    malo = df["cantidad"].isna() | (df["cantidad"] == 0) | ((df["tipo"] != "AJUSTE") & (df["cantidad"] < 0))
+    if malo.any(): raise ValueError("Cantidad inválida (debe ser positiva; solo los ajustes pueden ser negativos).")
+    if ((df["tipo"] == "ENTRADA") & (df["costo_unitario"].isna() | (df["costo_unitario"] < 0))).any():
+        raise ValueError("Las entradas requieren costo unitario.")
+    return df
+
+
+def registrar_movimientos(df):
+    """
+    Registra movimientos (sku, tipo, cantidad, costo_unitario y opcional componente_id,
+    orden_trabajo, responsable, fecha) y actualiza el saldo materializado de los SKUs tocados.
+    Dos escrituras sin importar cuántos movimientos: una al kardex y otra a 'almacen'.
+    """
+    with _LOCK:
+        if _VERIFICAR[0]:
+            _conciliar(aplicar=True)
+            _VERIFICAR[0] = False
+        almacen = get_data("almacen")
+        mov = _validar(df, almacen)
+        inicial = almacen.drop_duplicates("sku", keep="last").set_index("sku")[["stock_actual", "precio_promedio", "en_kardex"]]
+        # SKUs con stock cargado antes del kardex: primero se asienta su saldo inicial,
+        # así conciliar() (que parte de cero) llega al mismo resultado.
+        # 'en_kardex' = 1 marca los que ya tienen movimientos; solo los SKUs sin marca y con stock
+        # (almacén anterior a la columna) obligan a mirar el kardex, y quedan marcados con este registro.
+        tocados = inicial[inicial.index.isin(list(mov["sku"])) & (inicial["stock_actual"].fillna(0) > 0)]
+        sin_marca = tocados.index[tocados["en_kardex"].isna()]
+        con_historia = set(tocados.index[tocados["en_kardex"] == 1])
+        if len(sin_marca):
+            previos = get_data("movimientos")
+            if not previos.empty: con_historia |= set(sin_marca) & set(previos["sku"])
+        abrir = tocados[~tocados.index.isin(list(con_historia))]
+        if not abrir.empty:
+            apertura = pd.DataFrame({"sku": abrir.index, "tipo": "ENTRADA", "cantidad": abrir["stock_actual"].to_numpy(),
+                                     "costo_unitario": abrir["precio_promedio"].fillna(0).to_numpy(), "orden_trabajo": "", "responsable": "SALDO INICIAL"})
+            mov = pd.concat([apertura, mov], ignore_index=True)
+            inicial.loc[abrir.index, ["stock_actual", "precio_promedio"]] = 0.0
+        mov = mov.reset_index(drop=True)
+        mov["id"] = list(reserve_ids("movimientos", len(mov)))
+        mov = mov.sort_values(["sku", "id"], kind="stable").reset_index(drop=True)
+        saldos, promedios = _kardex(mov, inicial)
+        if (saldos < -1e-9).any():
+            sin = sorted(set(mov.loc[saldos < -1e-9, "sku"]))
+            raise ValueError(f"Stock insuficiente para: {', '.join(sin[:5])}")
+        mov["saldo"] = saldos
+        mov["costo_promedio"] = promedios
+        if "fecha" not in mov.columns: mov["fecha"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        mov["fecha"] = mov["fecha"].fillna(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        for c in COLS_MOV:
+            if c not in mov.columns: mov[c] = None
+        mov = mov.sort_values("id")
+        append_rows(mov[COLS_MOV], "movimientos")
+
+        # Saldo materializado: la última fila de cada SKU
+        final = mov.drop_duplicates("sku", keep="last")
+        try:
+            update_rows(pd.DataFrame({"sku": final["sku"], "stock_actual": final["saldo"], "precio_promedio": final["costo_promedio"].round(4),
+                                      "en_kardex": 1}), "almacen")
+        except Exception:
+            _VERIFICAR[0] = True  # el kardex ya quedó escrito: el próximo movimiento repara el saldo
+            raise
+        return mov[COLS_MOV]
+
+
+def registrar_movimiento(sku, tipo, cantidad, costo_unitario=None, componente_id=None, orden_trabajo="", responsable=""):
+    return registrar_movimientos(pd.DataFrame([{"sku": sku, "tipo": tipo, "cantidad": cantidad, "costo_unitario": costo_unitario,
+                                                "componente_id": componente_id, "orden_trabajo": orden_trabajo, "responsable": responsable}]))
+
+
+def saldo(sku):
+    """(stock_actual, precio_promedio) leídos del saldo materializado."""
+    almacen = get_data("almacen")
+    fila = almacen[almacen["sku"] == str(sku).strip().upper()]
+    if fila.empty: return None
+    fila = fila[["stock_actual", "precio_promedio"]].iloc[-1].fillna(0)
+    return float(fila["stock_actual"]), float(fila["precio_promedio"])
+
+
+def kardex(sku=None):
+    mov = get_data("movimientos")
+    if sku is not None: mov = mov[mov["sku"] == str(sku).strip().upper()]
+    return mov.sort_values("id", ascending=False)
+
+
+def conciliar(aplicar=True, tolerancia=1e-6):
+    """
+    Recalcula saldo y costo promedio de cada SKU desde el kardex completo (una pasada vectorizada)
+    y los compara con los materializados. Con aplicar=True corrige las diferencias en una escritura.
+    Los SKUs sin movimientos no se tocan (su stock es el saldo inicial cargado a mano).
+    """
+    with _LOCK:
+        return _conciliar(aplicar, tolerancia)
+
+
+def _conciliar(aplicar=True, tolerancia=1e-6):
+    mov = get_data("movimientos")
+    almacen = get_data("almacen")
+    if mov.empty or almacen.empty: return pd.DataFrame(columns=["sku", "stock_actual", "stock_kardex", "precio_promedio", "promedio_kardex"])
+    mov = mov[mov["tipo"].astype(str).isin(list(TIPOS))].sort_values(["sku", "id"], kind="stable").reset_index(drop=True)
+    saldo_k, prom_k = _kardex(mov.assign(tipo=mov["tipo"].astype(str)))
+    calc = pd.DataFrame({"sku": mov["sku"], "stock_kardex": saldo_k, "promedio_kardex": prom_k}).drop_duplicates("sku", keep="last")
+    comp = almacen[["sku", "stock_actual", "precio_promedio"]].merge(calc, on="sku", how="inner")
+    difiere = ((comp["stock_actual"].fillna(0) - comp["stock_kardex"]).abs() > tolerancia) | \
+              ((comp["precio_promedio"].fillna(0) - comp["promedio_kardex"].round(4)).abs() > 1e-4)
+    dif = comp[difiere]
+    if aplicar and not dif.empty:
+        update_rows(pd.DataFrame({"sku": dif["sku"], "stock_actual": dif["stock_kardex"], "precio_promedio": dif["promedio_kardex"].round(4)}), "almacen")
+    return dif
@@ -0,0 +1,156 @@
+import threading
+import numpy as np
+import pandas as pd
+from utils.esquemas import aplicar_esquema
+from utils.db_con import get_many, get_cache, data_version
+from utils.perfil import perfilar
+
+# Planta -> Área -> Equipo -> Sistema -> Componente
+HOJAS_JERARQUIA = ["equipos", "sistemas", "componentes"]
+
+_VACIO = np.array([], dtype=np.intp)
+
+
+def _grupos(df, por):
+    """{clave: posiciones} en una sola pasada (groupby), para búsquedas O(1)."""
+    if df.empty: return {}
+    return df.groupby(por, sort=False, observed=True).indices
+
+
+def _id(valor):
+    """5, 5.0, '5' y '5.0' -> 5 (None si no es un id válido)."""
+    try: return int(float(valor))
+    except (TypeError, ValueError): return None
+
+
+class IndiceJerarquia:
+    """
+    Índice de la planta construido una vez por versión de datos.
+    Los hijos de un nodo se obtienen por hash (sin recorrer las tablas completas).
+    Recibe las hojas ya tipadas por el esquema (get_data): IDs Int64 y TAGs normalizados.
+    """
+
+    def __init__(self, df_eq, df_sys, df_comp):
+        eq = aplicar_esquema("equipos", pd.DataFrame()) if df_eq is None or df_eq.empty else df_eq
+        sys = aplicar_esquema("sistemas", pd.DataFrame()) if df_sys is None or df_sys.empty else df_sys
+        comp = aplicar_esquema("componentes", pd.DataFrame()) if df_comp is None or df_comp.empty else df_comp
+        self.df_eq, self.df_sys, self.df_comp = eq, sys, comp
+
+        # Plantas / áreas en orden de aparición (igual que .unique())
+        self._plantas = [p for p in eq["planta"].unique() if pd.notna(p)] if not eq.empty else []
+        self._areas = {}
+        if not eq.empty:
+            for p, a in eq[["planta", "area"]].dropna().drop_duplicates().itertuples(index=False):
+                self._areas.setdefault(p, []).append(a)
+
+        self._eq_por_area = _grupos(eq, ["planta", "area"])
+        self._eq_por_tag = dict(zip(eq["tag"], range(len(eq))))
+        self._sys_por_eq = _grupos(sys, "equipo_tag")
+        self._comp_por_sys = _grupos(comp, "sistema_id")
+
+    def plantas(self):
+        return list(self._plantas)
+
+    def areas(self, planta):
+        return list(self._areas.get(planta, []))
+
+    def equipos(self, planta, area):
+        return self.df_eq.iloc[self._eq_por_area.get((planta, area), _VACIO)]
+
+    def equipo(self, tag):
+        pos = self._eq_por_tag.get(str(tag).strip().upper())
+        return None if pos is None else self.df_eq.iloc[pos]
+
+    def sistemas(self, tag):
+        return self.df_sys.iloc[self._sys_por_eq.get(str(tag).strip().upper(), _VACIO)]
+
+    def componentes(self, sistema_id):
+        return self.df_comp.iloc[self._comp_por_sys.get(_id(sistema_id), _VACIO)]
+
+    def componentes_de_equipo(self, tag):
+        ids = [_id(i) for i in self.sistemas(tag)["id"].dropna()]
+        pos = [self._comp_por_sys[i] for i in ids if i in self._comp_por_sys]
+        return self.df_comp.iloc[np.concatenate(pos) if pos else _VACIO]
+
+
+_INDICE = None  # (versiones, IndiceJerarquia)
+_LOCK = threading.Lock()
+
+
+@perfilar("indice_activos")
+def indice_activos():
+    """Índice compartido por todas las páginas; se reconstruye solo si cambió alguna hoja."""
+    global _INDICE
+    if all(get_cache().vigente(h) for h in HOJAS_JERARQUIA):
+        clave = tuple(data_version(h) for h in HOJAS_JERARQUIA)
+        with _LOCK:
+            if _INDICE is not None and _INDICE[0] == clave: return _INDICE[1]
+    # Versiones antes de leer (como SheetCache.get): si alguien escribe mientras tanto, el índice
+    # se usa en esta llamada pero no se publica con la clave nueva
+    antes = tuple(get_cache().version(h) for h in HOJAS_JERARQUIA)
+    datos = get_many(HOJAS_JERARQUIA)
+    clave = tuple(data_version(h) for h in HOJAS_JERARQUIA)
+    indice = IndiceJerarquia(datos["equipos"], datos["sistemas"], datos["componentes"])
+    if tuple(v for v, _ in clave) == antes:
+        with _LOCK: _INDICE = (clave, indice)
+    return indice
+
+
+class IndiceCompartido:
+    """
+    Índice derivado de unas hojas, compartido por las sesiones y atado a sus versiones (bom, especificaciones).
+    Un guardado de componente lo parcha en vez de reconstruirlo, con copy-on-write: el parche arma un
+    índice nuevo y se publica cambiando la referencia, así quien lee el anterior nunca ve un estado a medias.
+    """
+
+    def __init__(self, hojas, parchable="componentes"):
+        self.hojas = list(hojas)
+        self._pos = self.hojas.index(parchable)
+        self._parchable = parchable
+        self._actual = None  # (clave, índice); tras un parche la clave de 'parchable' queda (versión, None)
+        self._lock = threading.Lock()
+
+    def clave(self):
+        return tuple(data_version(h) for h in self.hojas)
+
+    def vigente(self, clave):
+        """El índice publicado si corresponde a 'clave'; None si hay que reconstruir."""
+        with self._lock:
+            if self._actual is None: return None
+            guardada, indice = self._actual
+            if guardada == clave: return indice
+            # Después de un parche, la primera carga de la versión escrita es lo que el índice ya refleja
+            v, carga = guardada[self._pos]
+            if carga is None and clave[self._pos][0] == v and \
+                    all(guardada[i] == clave[i] for i in range(len(clave)) if i != self._pos):
+                self._actual = (clave, indice)
+                return indice
+        return None
+
+    def versiones(self):
+        """Versiones de las hojas: se toman antes de leer y se pasan a publicar()."""
+        return tuple(get_cache().version(h) for h in self.hojas)
+
+    def publicar(self, clave, indice, versiones=None):
+        """Si alguna hoja se escribió después de 'versiones' (durante la carga), el índice no se publica."""
+        if versiones is not None and tuple(v for v, _ in clave) != versiones: return
+        with self._lock: self._actual = (clave, indice)
+
+    def parchar(self, aplicar):
+        """
+        Llamar después de escribir la hoja parchable: aplicar(índice) devuelve el índice nuevo.
+        Solo si esa escritura es la única desde que se armó (su versión subió exactamente 1 y el resto
+        no cambió); si no, se descarta y se reconstruye al consultar.
+        """
+        with self._lock:
+            if self._actual is None: return
+            guardada, indice = self._actual
+        v = get_cache().version(self._parchable)
+        solo_una = v == guardada[self._pos][0] + 1 and \
+            all(data_version(h) == guardada[i] for i, h in enumerate(self.hojas) if i != self._pos)
+        nuevo = aplicar(indice) if solo_una else None
+        clave = tuple((v, None) if i == self._pos else c for i, c in enumerate(guardada))
+        with self._lock:
+            # Si otro lo cambió mientras tanto, no se sabe qué refleja: se reconstruye al consultar
+            cambio = self._actual is not None and self._actual[1] is not indice
+            self._actual = (clave, nuevo) if nuevo is not None and not cambio else None
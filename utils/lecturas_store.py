@@ -0,0 +1,249 @@
+import os
+import sqlite3
+import threading
+import pandas as pd
+from utils.perfil import perfilar
+
+# --- ALMACÉN DE SERIES DE TIEMPO (LECTURAS) ---
+# Tabla WITHOUT ROWID agrupada físicamente por (componente_id, parametro, ts): las lecturas de
+# un componente/variable quedan contiguas en disco y un gráfico lee solo las filas que dibuja.
+# 'mes' (AAAAMM) particiona lógicamente por mes (estadísticas, depuración de historia vieja).
+_DDL = [
+    """CREATE TABLE IF NOT EXISTS lecturas_ts (
+        componente_id INTEGER NOT NULL,
+        parametro TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        id INTEGER NOT NULL,
+        mes INTEGER NOT NULL,
+        valor REAL,
+        tecnico TEXT,
+        PRIMARY KEY (componente_id, parametro, ts, id)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS ix_lecturas_ts_mes ON lecturas_ts (mes, componente_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_lecturas_ts_id ON lecturas_ts (id)",
+    # Resultado del motor de alarmas: último nivel por componente/variable, historial de cambios
+    # y marcas de avance (sincronización con el backend) para procesar solo lo nuevo.
+    """CREATE TABLE IF NOT EXISTS alarmas_estado (
+        componente_id INTEGER NOT NULL,
+        parametro TEXT NOT NULL,
+        nivel INTEGER NOT NULL,
+        valor REAL,
+        alerta REAL,
+        peligro REAL,
+        ts INTEGER NOT NULL,
+        desde INTEGER NOT NULL,
+        lectura_id INTEGER NOT NULL,
+        PRIMARY KEY (componente_id, parametro)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS alarmas_eventos (
+        lectura_id INTEGER PRIMARY KEY,
+        componente_id INTEGER NOT NULL,
+        parametro TEXT NOT NULL,
+        nivel_anterior INTEGER NOT NULL,
+        nivel INTEGER NOT NULL,
+        valor REAL,
+        ts INTEGER NOT NULL
+    )""",
+    "CREATE TABLE IF NOT EXISTS marcas (nombre TEXT PRIMARY KEY, valor INTEGER NOT NULL)",
+    # Cola de lecturas que el motor de alarmas aún no evaluó. La llena el trigger con cada fila que de verdad
+    # entra (INSERT OR IGNORE no lo dispara): un id que llega tarde (otra instancia, cola diferida) se evalúa
+    # igual aunque sea menor que los ya procesados.
+    "CREATE TABLE IF NOT EXISTS alarmas_pendientes (id INTEGER PRIMARY KEY)",
+    """CREATE TRIGGER IF NOT EXISTS tr_alarmas_pendientes AFTER INSERT ON lecturas_ts
+        BEGIN INSERT OR IGNORE INTO alarmas_pendientes (id) VALUES (NEW.id); END""",
+]
+
+
+def a_timestamp(df):
+    """
+    Serie datetime64 a partir de 'ts' o de las columnas de texto 'fecha' + 'hora' (formato de la hoja).
+    """
+    if "ts" in df.columns: return pd.to_datetime(df["ts"], errors="coerce")
+    fecha = df["fecha"].astype(str).str.strip() if "fecha" in df.columns else pd.Series("", index=df.index)
+    hora = df["hora"].astype(object).where(df["hora"].notna(), "").astype(str).str.strip() if "hora" in df.columns else ""
+    return pd.to_datetime(fecha + " " + hora, errors="coerce", format="mixed")
+
+
+def a_filas_hoja(df):
+    """Lecturas válidas con las columnas de la hoja 'lecturas' (fecha y hora como texto, sin id)."""
+    ts = a_timestamp(df)
+    comp = pd.to_numeric(df["componente_id"], errors="coerce")
+    ok = ts.notna() & comp.notna() & df["parametro"].notna()
+    return pd.DataFrame({
+        "componente_id": comp[ok].astype("int64"),
+        "fecha": ts[ok].dt.strftime("%Y-%m-%d"),
+        "hora": ts[ok].dt.strftime("%H:%M:%S"),
+        "parametro": df.loc[ok, "parametro"].astype(str),
+        "valor": pd.to_numeric(df.loc[ok, "valor"], errors="coerce") if "valor" in df.columns else float("nan"),
+        "tecnico": df.loc[ok, "tecnico"] if "tecnico" in df.columns else None,
+    }).reset_index(drop=True)
+
+
+_EPOCH = pd.Timestamp("1970-01-01")
+
+
+def _epoch(ts):
+    # Hora local sin zona -> segundos (se guarda "tal cual", sin conversión de zona)
+    return ((ts - _EPOCH) // pd.Timedelta(seconds=1)).astype("int64")
+
+
+def _epoch_1(valor):
+    return int((pd.Timestamp(valor) - _EPOCH) // pd.Timedelta(seconds=1))
+
+
+class LecturasStore:
+    """Lecturas indexadas por componente y tiempo, en un SQLite local."""
+
+    def __init__(self, path="data/lecturas.db"):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.RLock()
+        self._con = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        nueva = not self._con.execute("SELECT 1 FROM sqlite_master WHERE name = 'alarmas_pendientes'").fetchone()
+        for sql in _DDL: self._con.execute(sql)
+        if nueva:
+            # Base anterior a la cola: el motor avanzaba con la marca 'alarmas' (último id evaluado)
+            self._con.execute("INSERT OR IGNORE INTO alarmas_pendientes (id) SELECT id FROM lecturas_ts "
+                              "WHERE id > COALESCE((SELECT valor FROM marcas WHERE nombre = 'alarmas'), 0)")
+
+    # --- ESCRITURA ---
+    def append(self, df):
+        """
+        Agrega lecturas (componente_id, parametro, valor, tecnico y ts o fecha/hora) en una sola transacción.
+        Si traen 'id' (el del backend) se respeta y una fila ya guardada no se duplica; sin id se numeran aquí.
+        Devuelve la cantidad de filas guardadas; las que no tienen fecha/componente válidos se descartan.
+        """
+        if df is None or df.empty: return 0
+        ts = a_timestamp(df)
+        comp = pd.to_numeric(df["componente_id"], errors="coerce")
+        ok = ts.notna() & comp.notna() & df["parametro"].notna()
+        if not ok.any(): return 0
+        ts, comp = ts[ok], comp[ok].astype("int64")
+        segs = _epoch(ts)
+        mes = (ts.dt.year * 100 + ts.dt.month).astype("int64")
+        valor = pd.to_numeric(df.loc[ok, "valor"], errors="coerce") if "valor" in df.columns else pd.Series(float("nan"), index=ts.index)
+        tecnico = df.loc[ok, "tecnico"].astype(object).where(df.loc[ok, "tecnico"].notna(), None) if "tecnico" in df.columns else pd.Series(None, index=ts.index, dtype=object)
+        ids = pd.to_numeric(df.loc[ok, "id"], errors="coerce") if "id" in df.columns else pd.Series(float("nan"), index=ts.index)
+        faltan = ids.isna()
+        with self._lock:
+            self._con.execute("BEGIN IMMEDIATE")
+            try:
+                if faltan.any():
+                    ultimo = max(self._con.execute("SELECT COALESCE(MAX(id), 0) FROM lecturas_ts").fetchone()[0], int(ids.max()) if not faltan.all() else 0)
+                    ids[faltan] = range(ultimo + 1, ultimo + int(faltan.sum()) + 1)
+                filas = zip(comp.tolist(), df.loc[ok, "parametro"].astype(str).tolist(), segs.tolist(),
+                            ids.astype("int64").tolist(), mes.tolist(),
+                            valor.astype(object).where(valor.notna(), None).tolist(), tecnico.tolist())
+                # rowcount: solo las filas insertadas (total_changes sumaría también las del trigger)
+                n = self._con.executemany("INSERT OR IGNORE INTO lecturas_ts (componente_id, parametro, ts, id, mes, valor, tecnico) VALUES (?, ?, ?, ?, ?, ?, ?)", filas).rowcount
+                self._con.execute("COMMIT")
+            except Exception:
+                self._con.execute("ROLLBACK")
+                raise
+        return n
+
+    # --- CONSULTAS ---
+    def _df(self, sql, params):
+        with self._lock:
+            df = pd.read_sql_query(sql, self._con, params=params)
+        if "ts" in df.columns: df["ts"] = pd.to_datetime(df["ts"], unit="s")
+        return df
+
+    @perfilar("lecturas.query")
+    def query(self, componente_id, parametro=None, desde=None, hasta=None):
+        """Lecturas de un componente (y variable) en un rango de tiempo, ordenadas por ts."""
+        sql = "SELECT id, componente_id, ts, parametro, valor, tecnico FROM lecturas_ts WHERE componente_id = ?"
+        params = [int(componente_id)]
+        if parametro is not None: sql += " AND parametro = ?"; params.append(str(parametro))
+        if desde is not None: sql += " AND ts >= ?"; params.append(_epoch_1(desde))
+        if hasta is not None: sql += " AND ts <= ?"; params.append(_epoch_1(hasta))
+        return self._df(sql + " ORDER BY ts, id", params)
+
+    def parametros(self, componente_id):
+        with self._lock:
+            filas = self._con.execute("SELECT DISTINCT parametro FROM lecturas_ts WHERE componente_id = ?", [int(componente_id)]).fetchall()
+        return [f[0] for f in filas]
+
+    def desde_id(self, ultimo_id, limite=None):
+        """Lecturas con id > ultimo_id (para procesos incrementales)."""
+        sql = "SELECT id, componente_id, ts, parametro, valor, tecnico FROM lecturas_ts WHERE id > ? ORDER BY id"
+        params = [int(ultimo_id)]
+        if limite: sql += " LIMIT ?"; params.append(int(limite))
+        return self._df(sql, params)
+
+    def por_evaluar(self, limite=None):
+        """Lecturas que el motor de alarmas aún no evaluó, por id (ver alarmas_pendientes)."""
+        sql = ("SELECT l.id, l.componente_id, l.ts, l.parametro, l.valor, l.tecnico FROM alarmas_pendientes p "
+               "JOIN lecturas_ts l ON l.id = p.id ORDER BY p.id")
+        params = []
+        if limite: sql += " LIMIT ?"; params.append(int(limite))
+        return self._df(sql, params)
+
+    def total(self):
+        with self._lock:
+            return self._con.execute("SELECT COUNT(*) FROM lecturas_ts").fetchone()[0]
+
+    def resumen(self):
+        """Por componente/variable: cantidad, primera y última lectura, mín/máx/promedio y último valor."""
+        agg = self._df("SELECT componente_id, parametro, COUNT(*) AS lecturas, MIN(ts) AS primera, MIN(valor) AS minimo, "
+                       "MAX(valor) AS maximo, AVG(valor) AS promedio FROM lecturas_ts GROUP BY componente_id, parametro", [])
+        # Con MAX() como único agregado, SQLite toma 'valor' de la fila con el ts máximo
+        ult = self._df("SELECT componente_id, parametro, MAX(ts) AS ultima, valor AS ultimo_valor FROM lecturas_ts GROUP BY componente_id, parametro", [])
+        df = agg.merge(ult, on=["componente_id", "parametro"], how="left")
+        for c in ["primera", "ultima"]: df[c] = pd.to_datetime(df[c], unit="s")
+        return df
+
+    def particiones(self):
+        """Filas por mes (AAAAMM)."""
+        return self._df("SELECT mes, COUNT(*) AS filas, COUNT(DISTINCT componente_id) AS componentes FROM lecturas_ts GROUP BY mes ORDER BY mes", [])
+
+    # --- ALARMAS (resultado del motor, ver utils/alarmas.py) ---
+    def marca(self, nombre):
+        with self._lock:
+            fila = self._con.execute("SELECT valor FROM marcas WHERE nombre = ?", [nombre]).fetchone()
+        return fila[0] if fila else 0
+
+    def fijar_marca(self, nombre, valor):
+        with self._lock:
+            self._con.execute("INSERT OR REPLACE INTO marcas (nombre, valor) VALUES (?, ?)", [nombre, int(valor)])
+
+    def estado_alarmas(self):
+        df = self._df("SELECT componente_id, parametro, nivel, valor, alerta, peligro, ts, desde, lectura_id FROM alarmas_estado", [])
+        df["desde"] = pd.to_datetime(df["desde"], unit="s")
+        return df
+
+    def eventos_alarma(self, limite=500):
+        return self._df("SELECT lectura_id, componente_id, parametro, nivel_anterior, nivel, valor, ts FROM alarmas_eventos ORDER BY ts DESC, lectura_id DESC LIMIT ?", [int(limite)])
+
+    def guardar_alarmas(self, estado, eventos, ids):
+        """Estado nuevo, eventos y las lecturas evaluadas fuera de la cola, en una sola transacción (todo o nada)."""
+        est = estado.assign(ts=_epoch(estado["ts"]), desde=_epoch(estado["desde"])) if not estado.empty else estado
+        ev = eventos.assign(ts=_epoch(eventos["ts"])) if not eventos.empty else eventos
+        cols_est = ["componente_id", "parametro", "nivel", "valor", "alerta", "peligro", "ts", "desde", "lectura_id"]
+        cols_ev = ["lectura_id", "componente_id", "parametro", "nivel_anterior", "nivel", "valor", "ts"]
+        with self._lock:
+            self._con.execute("BEGIN IMMEDIATE")
+            try:
+                if not est.empty:
+                    self._con.executemany(f"INSERT OR REPLACE INTO alarmas_estado ({', '.join(cols_est)}) VALUES ({', '.join('?' * len(cols_est))})",
+                                          est[cols_est].astype(object).where(est[cols_est].notna(), None).itertuples(index=False, name=None))
+                if not ev.empty:
+                    self._con.executemany(f"INSERT OR REPLACE INTO alarmas_eventos ({', '.join(cols_ev)}) VALUES ({', '.join('?' * len(cols_ev))})",
+                                          ev[cols_ev].astype(object).where(ev[cols_ev].notna(), None).itertuples(index=False, name=None))
+                self._con.executemany("DELETE FROM alarmas_pendientes WHERE id = ?", [(int(i),) for i in ids])
+                self._con.execute("COMMIT")
+            except Exception:
+                self._con.execute("ROLLBACK")
+                raise
+
+    def reiniciar_alarmas(self):
+        """Borra el resultado del motor y vuelve a encolar toda la historia (ej: cambiaron los límites)."""
+        with self._lock:
+            self._con.execute("BEGIN IMMEDIATE")
+            self._con.execute("DELETE FROM alarmas_estado")
+            self._con.execute("DELETE FROM alarmas_eventos")
+            self._con.execute("INSERT OR IGNORE INTO alarmas_pendientes (id) SELECT id FROM lecturas_ts")
+            self._con.execute("COMMIT")
@@ -0,0 +1,41 @@
+import sys
+import time
+import threading
+import importlib
+from utils.perfil import span
+
+# --- REGISTRO DE PÁGINAS (IMPORTACIÓN DIFERIDA) ---
+# Cada entrada del menú apunta a (módulo, función). El módulo (y lo que arrastra: plotly, etc.)
+# se importa recién cuando alguien abre esa página por primera vez en el proceso;
+# las siguientes veces sale de sys.modules. El tiempo de cada import queda en la traza del rerun.
+PAGINAS = {
+    "Gestión de Activos": ("modules.gestion_activos", "render_gestion_activos"),
+    "Maestro de Clases": ("modules.configurador", "render_configurador"),
+    "Almacén": ("modules.almacen", "render_almacen_view"),
+    "Monitoreo": ("modules.monitoreo", "render_monitoreo_view"),
+    "Alarmas": ("modules.alarmas", "render_alarmas_view"),
+    "Especificaciones": ("modules.especificaciones", "render_especificaciones_view"),
+    "Alta de Equipos": ("modules.equipos", "render_equipos_view"),
+    "Alta de Componentes": ("modules.componentes", "render_componentes_view"),
+}
+
+_IMPORTS = {}  # módulo -> ms del primer import en este proceso
+_LOCK = threading.Lock()
+
+
+def cargar(titulo):
+    """Devuelve la función render de la página, importando su módulo si hace falta."""
+    modulo, funcion = PAGINAS[titulo]
+    if modulo not in sys.modules:
+        # Import de Python ya es seguro entre hilos; el lock solo evita medir dos veces
+        with _LOCK, span("pagina.import", modulo=modulo):
+            if modulo not in sys.modules:
+                t0 = time.perf_counter()
+                importlib.import_module(modulo)
+                _IMPORTS[modulo] = round((time.perf_counter() - t0) * 1000, 1)
+    return getattr(sys.modules[modulo], funcion)
+
+
+def tiempos_import():
+    """{módulo: ms} de las páginas importadas hasta ahora en este proceso."""
+    with _LOCK: return dict(_IMPORTS)
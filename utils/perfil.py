@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import atexit
+import threading
+import contextvars
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+# --- INSTRUMENTACIÓN (SPANS POR RERUN) ---
+# Cada ejecución del script (rerun) abre una traza; cada llamada a db_con y cada sección de página
+# registra un span (nombre, ms, atributos como hoja / filas / bytes / caché) dentro de ella.
+# La traza viaja en un ContextVar: cada sesión de Streamlit (y los hilos de get_many) ve la suya.
+# Al cerrar la traza:
+#   - se acumula en histogramas por página y por span (Prometheus, texto)
+#   - CMMS_PERFIL_JSONL=ruta  -> una línea JSON por rerun
+#   - CMMS_PERFIL_PROM=ruta   -> archivo de métricas para el textfile collector de node_exporter
+#     (lo reescribe un hilo de fondo cada CMMS_PERFIL_PROM_S segundos si hubo reruns, no cada rerun)
+# CMMS_PERFIL=0 apaga todo (los spans quedan en un perf_counter y nada más).
+ACTIVO = os.environ.get("CMMS_PERFIL", "1") != "0"
+RUTA_JSONL = os.environ.get("CMMS_PERFIL_JSONL", "")
+RUTA_PROM = os.environ.get("CMMS_PERFIL_PROM", "")
+PROM_CADA_S = float(os.environ.get("CMMS_PERFIL_PROM_S", "15"))  # el scrape de node_exporter no necesita más
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+HISTORIA = 200  # reruns recientes por página (p50 / p95 del panel)
+
+_TRAZA = contextvars.ContextVar("cmms_traza", default=None)
+_PADRE = contextvars.ContextVar("cmms_span_padre", default=None)
+_LOCK = threading.Lock()
+_PROM_PENDIENTE = threading.Event()  # hubo reruns desde la última escritura del archivo
+_PROM_HILO = []
+
+
+class Traza:
+    def __init__(self, pagina):
+        self.pagina = pagina
+        self.inicio = time.time()
+        self._t0 = time.perf_counter()
+        self.total_ms = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def agregar(self, span):
+        with self._lock: self.spans.append(span)
+
+    def a_dict(self):
+        return {"ts": round(self.inicio, 3), "pagina": self.pagina, "total_ms": self.total_ms, "spans": list(self.spans)}
+
+
+class _Histograma:
+    def __init__(self):
+        self.cuentas = [0] * len(BUCKETS_MS)
+        self.n = 0
+        self.suma = 0.0
+
+    def observar(self, ms):
+        self.n += 1; self.suma += ms
+        for i, b in enumerate(BUCKETS_MS):
+            if ms <= b: self.cuentas[i] += 1
+
+
+_HIST_PAGINA = defaultdict(_Histograma)
+_HIST_SPAN = defaultdict(_Histograma)  # (pagina, span)
+_RECIENTES = defaultdict(lambda: deque(maxlen=HISTORIA))
+_ULTIMA = {}  # pagina -> última traza cerrada
+
+
+# --- API ---
+def iniciar_traza(pagina):
+    """Abre la traza del rerun actual (la llama main.py al empezar el script)."""
+    traza = Traza(pagina)
+    if ACTIVO: _TRAZA.set(traza)
+    return traza
+
+
+def traza_actual():
+    return _TRAZA.get()
+
+
+@contextmanager
+def span(nombre, **attrs):
+    """
+    Mide un bloque. Los atributos se pueden completar adentro:
+        with span("get_data", hoja=h) as s: df = ...; s["filas"] = len(df)
+    """
+    traza = _TRAZA.get()
+    if traza is None:
+        yield attrs
+        return
+    padre = _PADRE.get()
+    token = _PADRE.set(nombre)
+    t0 = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        ms = (time.perf_counter() - t0) * 1000
+        _PADRE.reset(token)
+        traza.agregar({"nombre": nombre, "padre": padre, "inicio_ms": round((t0 - traza._t0) * 1000, 2), "ms": round(ms, 2), **attrs})
+
+
+def perfilar(nombre=None):
+    """Decorador: un span por llamada a la función."""
+    def deco(fn):
+        etiqueta = nombre or fn.__name__
+        @wraps(fn)
+        def envoltura(*args, **kwargs):
+            with span(etiqueta): return fn(*args, **kwargs)
+        return envoltura
+    return deco
+
+
+def en_hilo(fn):
+    """Envuelve fn para correr en otro hilo dentro de la traza (y span padre) actuales."""
+    ctx = contextvars.copy_context()
+    return lambda *a, **k: ctx.copy().run(fn, *a, **k)
+
+
+def bytes_df(df):
+    """Tamaño aproximado de un DataFrame (sin recorrer los textos: es para métricas, no exacto)."""
+    try: return int(df.memory_usage(index=False, deep=False).sum())
+    except Exception: return 0
+
+
+def terminar_traza(traza):
+    """Cierra la traza: histogramas, historial y exportación."""
+    if traza is None or traza.total_ms is not None: return
+    traza.total_ms = round((time.perf_counter() - traza._t0) * 1000, 2)
+    if _TRAZA.get() is traza: _TRAZA.set(None)
+    if not ACTIVO: return
+    with _LOCK:
+        _HIST_PAGINA[traza.pagina].observar(traza.total_ms)
+        por_span = defaultdict(float)
+        for s in traza.spans: por_span[s["nombre"]] += s["ms"]
+        for nombre, ms in por_span.items(): _HIST_SPAN[(traza.pagina, nombre)].observar(ms)
+        _RECIENTES[traza.pagina].append(traza.total_ms)
+        _ULTIMA[traza.pagina] = traza
+        if RUTA_JSONL:
+            with open(RUTA_JSONL, "a", encoding="utf-8") as f: f.write(json.dumps(traza.a_dict(), ensure_ascii=False, default=str) + "\n")
+        if RUTA_PROM and not _PROM_HILO:
+            _PROM_HILO.append(threading.Thread(target=_escritor_prom, name="cmms-perfil-prom", daemon=True))
+            _PROM_HILO[0].start()
+            atexit.register(escribir_prometheus)
+    if RUTA_PROM: _PROM_PENDIENTE.set()
+
+
+def ultima_traza(pagina):
+    return _ULTIMA.get(pagina)
+
+
+def percentiles(pagina):
+    """(n, p50, p95) en ms de los últimos reruns de la página."""
+    with _LOCK: datos = sorted(_RECIENTES.get(pagina, ()))
+    if not datos: return 0, None, None
+    pct = lambda q: datos[min(len(datos) - 1, int(q * len(datos)))]
+    return len(datos), pct(0.50), pct(0.95)
+
+
+# --- EXPORTACIÓN ---
+def _esc(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _serie(nombre, etiquetas, h):
+    lineas = []
+    for b, c in zip(BUCKETS_MS, h.cuentas):
+        lineas.append(f'{nombre}_bucket{{{etiquetas},le="{b / 1000:g}"}} {c}')
+    lineas.append(f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {h.n}')
+    lineas.append(f"{nombre}_sum{{{etiquetas}}} {h.suma / 1000:.6f}")
+    lineas.append(f"{nombre}_count{{{etiquetas}}} {h.n}")
+    return lineas
+
+
+def _prometheus():
+    lineas = ["# HELP cmms_rerun_seconds Duración de cada rerun por página.", "# TYPE cmms_rerun_seconds histogram"]
+    for pagina, h in sorted(_HIST_PAGINA.items()):
+        lineas += _serie("cmms_rerun_seconds", f'pagina="{_esc(pagina)}"', h)
+    lineas += ["# HELP cmms_span_seconds Tiempo por span (sumado dentro de cada rerun).", "# TYPE cmms_span_seconds histogram"]
+    for (pagina, nombre), h in sorted(_HIST_SPAN.items()):
+        lineas += _serie("cmms_span_seconds", f'pagina="{_esc(pagina)}",span="{_esc(nombre)}"', h)
+    return "\n".join(lineas) + "\n"
+
+
+def metricas_prometheus():
+    """Métricas acumuladas del proceso en formato de texto de Prometheus."""
+    with _LOCK: return _prometheus()
+
+
+def escribir_prometheus():
+    """Vuelca las métricas a RUTA_PROM; el lock solo se toma para armar el texto, no durante la escritura."""
+    if not RUTA_PROM: return
+    texto = metricas_prometheus()
+    tmp = RUTA_PROM + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f: f.write(texto)
+    os.replace(tmp, RUTA_PROM)  # el collector nunca lee un archivo a medio escribir
+
+
+def _escritor_prom():
+    # Un archivo por intervalo con todos los reruns del intervalo; sin reruns nuevos no se escribe
+    while True:
+        _PROM_PENDIENTE.wait()
+        time.sleep(PROM_CADA_S)
+        _PROM_PENDIENTE.clear()
+        try: escribir_prometheus()
+        except OSError: pass  # disco lleno / ruta inválida: se reintenta con el próximo rerun
@@ -0,0 +1,59 @@
+import os
+import time
+import threading
+import pandas as pd
+
+# --- FOTO LOCAL DE LAS HOJAS (ARRANQUE EN FRÍO / SIN RED) ---
+# Cada hoja descargada se guarda ya tipada en un archivo Arrow IPC (Feather v2, zstd) en snapshot_dir.
+# Al reiniciar el proceso, la primera lectura de cada hoja sale de la foto (milisegundos, sin red)
+# y la descarga real corre en segundo plano; si el backend no responde, se sigue sirviendo la foto.
+# Sin pyarrow las fotos se desactivan solas (la app funciona igual, solo sin esta optimización).
+try:
+    import pyarrow  # noqa: F401
+    DISPONIBLE = True
+except ImportError:
+    DISPONIBLE = False
+
+COMPRESION = "zstd"
+
+
+def _para_arrow(df):
+    """Columnas object con tipos mezclados (columnas extra de la hoja) pasan a texto; el resto queda igual."""
+    import pyarrow as pa
+    df = df.reset_index(drop=True)
+    for c in df.columns[df.dtypes == object]:
+        try: pa.array(df[c], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[c] = df[c].astype(str).where(df[c].notna(), None)
+    df.columns = [str(c) for c in df.columns]
+    return df
+
+
+class SnapshotStore:
+    def __init__(self, directorio="data/snapshots"):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _ruta(self, hoja):
+        return os.path.join(self.directorio, f"{hoja}.arrow")
+
+    def guardar(self, hoja, df):
+        """Escritura atómica: quien lea a la vez ve la foto anterior o la nueva, nunca una a medias."""
+        ruta = self._ruta(hoja)
+        tmp = f"{ruta}.{threading.get_ident()}.tmp"
+        with self._lock:
+            _para_arrow(df).to_feather(tmp, compression=COMPRESION)
+            os.replace(tmp, ruta)
+
+    def cargar(self, hoja):
+        """(DataFrame, antigüedad en segundos) o None si no hay foto legible."""
+        ruta = self._ruta(hoja)
+        try:
+            df = pd.read_feather(ruta)
+            return df, time.time() - os.path.getmtime(ruta)
+        except Exception:
+            return None
+
+    def hojas(self):
+        return sorted(os.path.splitext(f)[0] for f in os.listdir(self.directorio) if f.endswith(".arrow"))
@@ -0,0 +1,35 @@
+import os
+import json
+from utils.cache import LRUCache
+
+# Tamaños ajustables; revisar specs_cache_stats() para dimensionarlos
+_SPECS = LRUCache(int(os.environ.get("CMMS_SPECS_CACHE", 50000)))
+_TARJETAS = LRUCache(int(os.environ.get("CMMS_CARDS_CACHE", 50000)))
+
+
+def parse_specs(json_str):
+    """
+    json.loads de specs_json memorizado por contenido del texto.
+    Devuelve {} si está vacío y None si el JSON es inválido.
+    """
+    if not isinstance(json_str, str): return None
+    if not json_str.strip(): return {}
+
+    def _parse():
+        try:
+            data = json.loads(json_str)
+            return data if isinstance(data, dict) else None
+        except ValueError:
+            return None
+
+    data = _SPECS.get_or_build(json_str, _parse)
+    return None if data is None else dict(data)
+
+
+def tarjeta_html(clave, construir):
+    """Fragmento HTML memorizado: 'clave' es la tupla con todo lo que se muestra en la tarjeta."""
+    return _TARJETAS.get_or_build(clave, construir)
+
+
+def specs_cache_stats():
+    return {"specs": _SPECS.stats(), "tarjetas": _TARJETAS.stats()}